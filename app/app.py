@@ -1,16 +1,74 @@
 import streamlit as st
-import requests
-import os
+import json
 import datetime as dt
 import pandas as pd
+from collections import Counter
 
-# Backend URL
-BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+from client import BackendClient, fingerprint
 
-def prepare_files_payload(files):
-    for f in files:
-        f.seek(0)
-    return [("files", (f.name, f, f.type)) for f in files]
+FINISHED = ("done", "failed")
+
+
+@st.cache_resource
+def get_backend() -> BackendClient:
+    # One pooled session for every browser session this Streamlit process serves.
+    return BackendClient()
+
+
+def extract_once(backend, files, key):
+    """Extraction for this exact set of files (`key` is their fingerprint), asking the backend only the first time it is seen in this session."""
+    cache = st.session_state.setdefault("extractions", {})
+    if key not in cache:
+        with st.spinner("Reading your documents..."):
+            resp = backend.extract(files)
+        if resp.status_code != 200:
+            # Not cached, so the next interaction tries again.
+            raise RuntimeError(f"Extraction failed: {resp.text}")
+        cache[key] = resp.json()
+    return cache[key]
+
+
+def show_job(job):
+    if job["status"] == "done":
+        st.success("Application submitted successfully")
+        st.json(job["result"])
+    elif job["status"] == "failed":
+        st.error(f"Error: {job['error']}")
+    else:
+        position = f" (position {job['position']} in the queue)" if job.get("position") else ""
+        st.info(f"Application {job['app_id']} is being assessed{position}...")
+
+
+@st.fragment(run_every=2)
+def poll_job(backend, key):
+    """Refreshes only this part of the page while the queued /predict job runs; the form is never re-sent."""
+    jobs = st.session_state["jobs"]
+    try:
+        jobs[key] = {**jobs[key], **backend.job(jobs[key]["status_url"])}
+    except Exception as e:
+        st.warning(f"Could not check the application status: {e}")
+    if jobs[key]["status"] in FINISHED:
+        # A full rerun draws the result without registering this fragment again, which stops the polling.
+        st.rerun()
+    show_job(jobs[key])
+
+
+def sse_text(resp, timings):
+    """Yield answer chunks from the /explain/stream event stream; the final timings land in `timings`."""
+    event = None
+    for line in resp.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            payload = json.loads(line[len("data:"):])
+            if event == "done":
+                timings.update(payload)
+            elif event == "error":
+                raise RuntimeError(payload.get("detail"))
+            else:
+                yield payload["text"]
+        elif not line:
+            event = None
 
 
 st.set_page_config(page_title="Social Support Application Portal", layout="wide")
@@ -27,66 +85,93 @@ if page == "Applicant Form":
         accept_multiple_files=True
     )
 
+    # The client is shared by every browser session, so requests are counted per session and per set of documents.
+    calls = Counter()
     if uploaded_files:
-        files_payload = [("files", (f.name, f, f.type)) for f in uploaded_files]
+        key = fingerprint(uploaded_files)
+        calls = st.session_state.setdefault("backend_calls", {}).setdefault(key, Counter())
+        backend = get_backend().counting(calls)
         try:
-            resp = requests.post(f"{BACKEND_URL}/extract", files=files_payload)
-            if resp.status_code == 200:
-                extracted = resp.json()
-                st.success("Extracted information from documents")
-
-                with st.form("review_form"):
-                    name = st.text_input("Full Name", value=extracted["fields"].get("name", ""))
-                    dob_str = extracted["fields"].get("dob")
-                    default_dob = dt.date(1990, 1, 1)
-                    try:
-                        if dob_str:
-                            default_dob = dt.datetime.strptime(dob_str.split("T")[0], "%Y-%m-%d").date()
-                    except Exception:
-                        pass
-                    dob = st.date_input(
-                        "Date of Birth",
-                        value=default_dob,
-                        min_value=dt.date(1900, 1, 1),
-                        max_value=dt.date.today()
-                    )
-                    address = st.text_area("Address", value=extracted["fields"].get("address", ""))
-                    family_size = st.number_input(
-                        "Family Size",
-                        min_value=1,
-                        step=1,
-                        value=int(extracted["fields"].get("family_size", 1))
-                    )
-                    income = st.number_input(
-                        "Monthly Income (AED)",
-                        min_value=0,
-                        value=int(extracted["fields"].get("reported_income", 0))
-                    )
-                    confirmed = st.form_submit_button("Submit Application")
-                    if confirmed:
-                        data_payload = {
-                            "name": name,
-                            "dob": str(dob),
-                            "address": address,
-                            "family_size": family_size,
-                            "income": income
-                        }
-                        files_payload_predict = prepare_files_payload(uploaded_files)
-                        # print(files_payload_predict)
-                        resp2 = requests.post(f"{BACKEND_URL}/predict", data=data_payload, files=files_payload_predict)
-                        # print(resp2.json())
-                        if resp2.status_code == 200:
-                            st.success("Application submitted successfully")
-                            st.json(resp2.json())
-                        else:
-                            st.error(f"Error: {resp2.text}")
-            else:
-                st.error(f"Extraction failed: {resp.text}")
+            extracted = extract_once(backend, uploaded_files, key)
         except Exception as e:
             st.error(f"Failed to connect to backend: {e}")
+        else:
+            st.success("Extracted information from documents")
+            jobs = st.session_state.setdefault("jobs", {})
+            pending = key in jobs and jobs[key]["status"] not in FINISHED
+
+            with st.form("review_form"):
+                name = st.text_input("Full Name", value=extracted["fields"].get("name", ""))
+                dob_str = extracted["fields"].get("dob")
+                default_dob = dt.date(1990, 1, 1)
+                try:
+                    if dob_str:
+                        default_dob = dt.datetime.strptime(dob_str.split("T")[0], "%Y-%m-%d").date()
+                except Exception:
+                    pass
+                dob = st.date_input(
+                    "Date of Birth",
+                    value=default_dob,
+                    min_value=dt.date(1900, 1, 1),
+                    max_value=dt.date.today()
+                )
+                address = st.text_area("Address", value=extracted["fields"].get("address", ""))
+                family_size = st.number_input(
+                    "Family Size",
+                    min_value=1,
+                    step=1,
+                    value=int(extracted["fields"].get("family_size", 1))
+                )
+                income = st.number_input(
+                    "Monthly Income (AED)",
+                    min_value=0,
+                    value=int(extracted["fields"].get("reported_income", 0))
+                )
+                # Disabled while this application is queued, so a second click cannot submit it twice.
+                confirmed = st.form_submit_button("Submit Application", disabled=pending)
+
+            if confirmed:
+                data_payload = {
+                    "name": name,
+                    "dob": str(dob),
+                    "address": address,
+                    "family_size": family_size,
+                    "income": income
+                }
+                try:
+                    # The documents are already on the server from /extract; they are only re-sent if that session expired.
+                    resp = backend.submit(data_payload, upload_session=extracted["upload_session"], files=uploaded_files)
+                    if resp.status_code == 202:
+                        jobs[key] = resp.json()
+                    elif resp.status_code == 200:
+                        # The same application was already assessed; the backend returned that result.
+                        jobs[key] = {"status": "done", "result": resp.json()}
+                    elif resp.status_code == 429:
+                        st.warning(f"Too many applications are being processed; try again in {resp.headers.get('Retry-After', 'a few')} seconds.")
+                    else:
+                        st.error(f"Error: {resp.text}")
+                except Exception as e:
+                    st.error(f"Failed to connect to backend: {e}")
+
+            if key in jobs:
+                if jobs[key]["status"] in FINISHED:
+                    show_job(jobs[key])
+                else:
+                    poll_job(backend, key)
+
+    st.sidebar.caption("Backend requests for this application: " + (", ".join(f"{k} × {v}" for k, v in sorted(calls.items())) or "none"))
 
 elif page == "Chatbot":
     st.header("Ask the AI Assistant")
+    # The backend keeps the conversation; this page only remembers which one it is and shows it.
+    turns = st.session_state.setdefault("chat_turns", [])
+    if st.button("New conversation"):
+        st.session_state.pop("chat_session", None)
+        turns.clear()
+    for turn in turns:
+        st.markdown(f"**You:** {turn['query']}")
+        st.markdown(turn["answer"])
+
     query = st.text_input("Type your question about your application:")
     app_id = st.text_input("Application ID (optional)", "")
 
@@ -95,10 +180,17 @@ elif page == "Chatbot":
             st.warning("Please enter a question.")
         else:
             try:
-                resp = requests.post(f"{BACKEND_URL}/explain", json={"query": query, "app_id": app_id})
-                if resp.status_code == 200:
-                    st.write(resp.json().get("answer", "No response"))
-                else:
-                    st.error(f"Chatbot error: {resp.text}")
+                with get_backend().explain_stream(query, app_id, st.session_state.get("chat_session")) as resp:
+                    if resp.status_code == 200:
+                        timings = {}
+                        answer = st.write_stream(sse_text(resp, timings))
+                        if timings:
+                            st.session_state["chat_session"] = timings["session_id"]
+                            turns.append({"query": query, "answer": answer})
+                            tokens = timings.get("usage", {}).get("prompt_tokens")
+                            st.caption(f"First token after {timings['ttft_ms'] / 1000:.2f}s, complete in {timings['total_ms'] / 1000:.2f}s"
+                                       + (f", {tokens} prompt tokens" if tokens else ""))
+                    else:
+                        st.error(f"Chatbot error: {resp.text}")
             except Exception as e:
-                st.error(f"Failed to reach backend: {e}")
\ No newline at end of file
+                st.error(f"Failed to reach backend: {e}")
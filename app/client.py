@@ -0,0 +1,80 @@
+import os
+import copy
+import hashlib
+import threading
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+# (connect, read) seconds. Extraction runs OCR and PDF parsing inside the request, so it gets the longest read.
+CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", 5))
+EXTRACT_TIMEOUT = float(os.getenv("BACKEND_EXTRACT_TIMEOUT", 180))
+SUBMIT_TIMEOUT = float(os.getenv("BACKEND_SUBMIT_TIMEOUT", 60))
+STATUS_TIMEOUT = float(os.getenv("BACKEND_STATUS_TIMEOUT", 10))
+STREAM_TIMEOUT = float(os.getenv("BACKEND_STREAM_TIMEOUT", 120))
+POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", 10))
+
+
+def fingerprint(files) -> str:
+    """Identity of a set of uploaded files: same names and bytes, in any order, give the same value."""
+    digests = sorted(f"{f.name}\0{hashlib.sha256(f.getvalue()).hexdigest()}" for f in files)
+    return hashlib.sha256("\n".join(digests).encode()).hexdigest()
+
+
+def files_payload(files):
+    return [("files", (f.name, f.getvalue(), f.type)) for f in files]
+
+
+class BackendClient:
+    """One pooled, keep-alive HTTP session to the API, shared by every Streamlit session of this process.
+
+    Only the idempotent GETs are retried; a POST is sent once. `calls` counts
+    requests per endpoint so the page can show what a submission cost; since
+    the client is shared, pages count through `counting()` with a counter of
+    their own.
+    """
+
+    def __init__(self, base_url: str = BACKEND_URL, pool_size: int = POOL_SIZE, session: requests.Session = None):
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET"}))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def counting(self, calls: Counter) -> "BackendClient":
+        """This client, on the same pooled session, counting its requests into `calls` instead."""
+        view = copy.copy(self)
+        view.calls = calls
+        return view
+
+    def _request(self, method: str, path: str, endpoint: str = None, **kwargs) -> requests.Response:
+        with self._lock:
+            self.calls[f"{method} {endpoint or path}"] += 1
+        return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+
+    def extract(self, files) -> requests.Response:
+        return self._request("POST", "/extract", files=files_payload(files), timeout=(CONNECT_TIMEOUT, EXTRACT_TIMEOUT))
+
+    def submit(self, form: dict, upload_session: str = None, files=None) -> requests.Response:
+        """Queue the application; the documents are re-sent only when the upload session has expired."""
+        resp = None
+        if upload_session:
+            resp = self._request("POST", "/predict", data={**form, "upload_session": upload_session}, timeout=(CONNECT_TIMEOUT, SUBMIT_TIMEOUT))
+        if resp is None or (resp.status_code == 410 and files):
+            resp = self._request("POST", "/predict", data=form, files=files_payload(files or []), timeout=(CONNECT_TIMEOUT, SUBMIT_TIMEOUT))
+        return resp
+
+    def job(self, status_url: str) -> dict:
+        resp = self._request("GET", status_url, endpoint="/jobs/{id}", timeout=(CONNECT_TIMEOUT, STATUS_TIMEOUT))
+        resp.raise_for_status()
+        return resp.json()
+
+    def explain_stream(self, query: str, app_id: str = None, session_id: str = None) -> requests.Response:
+        body = {"query": query, "app_id": app_id, "session_id": session_id}
+        return self._request("POST", "/explain/stream", json=body, stream=True, timeout=(CONNECT_TIMEOUT, STREAM_TIMEOUT))
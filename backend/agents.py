@@ -1,53 +1,110 @@
-import joblib
 import os
 import re
 import json
+import time
+import contextvars
 import numpy as np
 import pandas as pd
-import pytesseract
-import pdfplumber
-from PIL import Image
 from pathlib import Path
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
-import google.generativeai as genai
+from backend.extraction_cache import extraction_cache
+from backend.application_store import get_application_store
+from backend.retrieval import RETRIEVAL_TOP_K, document_text, get_retrieval_index
+from backend.model_registry import ActiveModel, LoadedModel, ModelRegistry, load_initial_model, preload_initial_model
+from backend.salary_rules import salary_rules
+from backend.pdf_text import extract_pdf_text
+from backend.ocr import ocr_image
+from backend.ledger import LedgerSummary, parse_ledger
+from backend import chat
+from backend import llm
+from backend import explanations
+from backend import tracing
 
 load_dotenv()
-GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 MODEL_PATH = os.getenv("ELIGIBILITY_MODEL_PATH", 'models/eligibility_v1.joblib')
+COMPILED_MODEL_PATH = os.getenv("ELIGIBILITY_COMPILED_MODEL_PATH", 'models/eligibility_v1_compiled')
+ELIGIBILITY_ENGINE = os.getenv("ELIGIBILITY_ENGINE", "compiled")
+COMPILED_MAX_BATCH = int(os.getenv("COMPILED_MAX_BATCH", 64))
+MODEL_REFRESH_INTERVAL = float(os.getenv("MODEL_REFRESH_INTERVAL", 5))
+
+# Bump whenever parsing logic changes so cached extraction results are not reused.
+EXTRACTOR_VERSION = "5"
+
+DOCUMENT_WORKERS = int(os.getenv("DOCUMENT_WORKERS", 5))
+# Seconds a document may take; PDF pages, OCR passes and LLM calls are not started after that.
+DOCUMENT_TIMEOUT = float(os.getenv("DOCUMENT_TIMEOUT", 60))
+
+DEFAULT_FAMILY_SIZE = 4
+
+FEATURE_COLUMNS = ['age', 'family_size', 'monthly_income', 'employment_status', 'assets', 'liabilities', 'credit_score']
+
+REASONS_MAP = {
+    'approve':['meets_income_threshold', 'low_per_capita_income'],
+    'soft-decline':['marginal_income'],
+    'reject':['sufficient_income']
+}
+
+RECS_MAP = {
+    'approve':['upskill', 'job_match'],
+    'soft-decline':['counseling'],
+    'reject':[]
+}
+
+# Overrides the shared client's model for income extraction (the stage benchmark sets its stub here).
+_extraction_model = None
+
+def _get_extraction_model():
+    return _extraction_model or llm.get_llm_client().model
+
+# Deadline of the document being extracted on this thread (a time.monotonic() value).
+_document_deadline = contextvars.ContextVar("document_deadline", default=None)
+
+
+class DocumentTimeout(TimeoutError):
+    """A document ran past DOCUMENT_TIMEOUT; what was read of it is discarded, not cached."""
 
 class DataExtractionAgent:
     def __init__(self):
         pass
 
     def _extract_text_from_pdf(self, file_path: str) -> str:
-        text = []
-        try:
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    text.append(page.extract_text() or "")
-        except Exception as e:
-            print(f"[WARN] Could not extract text from PDF {file_path}: {e}")
-        return " ".join(text)
+        # Stop reading as soon as this document type's extractor has what it needs.
+        check = self._fields_found.get(self._document_kind(file_path))
+        result = extract_pdf_text(file_path, until=getattr(self, check) if check else None, deadline=_document_deadline.get())
+        if result.timed_out:
+            raise DocumentTimeout(f"timed out after {DOCUMENT_TIMEOUT}s, {len(result.pages)} of {result.page_count} pages read")
+        return result.text
 
     def _extract_text_from_image(self, file_path: str) -> str:
+        # Emirates ID cards have known field positions; other images are read whole.
+        regions = ["name_dob"] if "emirates_id" in os.path.basename(file_path).lower() else []
         try:
-            return pytesseract.image_to_string(Image.open(file_path))
+            result = ocr_image(file_path, regions=regions, until=self._has_name_and_dob, deadline=_document_deadline.get())
         except Exception as e:
             print(f"[WARN] Could not OCR {file_path}: {e}")
             return ""
+        if result.timed_out:
+            raise DocumentTimeout(f"timed out after {DOCUMENT_TIMEOUT}s, OCR passes read: {result.passes}")
+        return result.text
+
+    def _parse_ledger(self, file_path: str) -> LedgerSummary:
+        with tracing.span("xlsx.parse") as span:
+            summary = parse_ledger(file_path)
+            span.set(rows=summary.rows, malformed=summary.malformed)
+            if summary.error:
+                span.fail(ValueError(summary.error))
+                print(f"[WARN] Could not parse {file_path}: {summary.error}")
+            elif summary.malformed:
+                print(f"[WARN] {summary.malformed} malformed rows in {file_path}, first: {summary.issues[0]}")
+            return summary
 
     def _parse_assets_liabilities(self, file_path: str) -> tuple:
-        try:
-            df = pd.read_excel(file_path)
-            assets = df[df["Type"].str.lower() == "asset"]["Value"].sum()
-            liabilities = df[df["Type"].str.lower() == "liability"]["Value"].sum()
-            return float(assets), float(liabilities)
-        except Exception as e:
-            print(f"[WARN] Could not parse {file_path}: {e}")
-            return 0.0, 0.0
+        summary = self._parse_ledger(file_path)
+        return summary.assets, summary.liabilities
 
     def _extract_name_dob_from_text(self, text: str) -> tuple:
         name = None
@@ -60,31 +117,24 @@ class DataExtractionAgent:
             dob = dob_match.group(1)
         return name, dob
 
-    # def _extract_income_from_bank_statement(self, text: str) -> float:
-    #     print(text)
-    #     match = re.search(r"Salary\s+Deposit\s+([\d,]+)", text, re.IGNORECASE)
-    #     print(match)
-    #     if match:
-    #         return float(match.group(1).replace(",",""))
-    #     numbers = re.findall(r"\b\d+(?:\.\d+)?\b", text)
-    #     if numbers:
-    #         positive_numbers = [float(num) for num in numbers if not text.find(f"-{num}")!=-1]
-    #         print(positive_numbers)
-    #         if positive_numbers:
-    #             return max(positive_numbers)
-    #     return 0.0
+    def _has_name_and_dob(self, text: str) -> bool:
+        name, dob = self._extract_name_dob_from_text(text)
+        return bool(name and dob)
+
     def _extract_income_from_bank_statement(self, text: str) -> float:
         # print("Input text:\n", text)
-        model = genai.GenerativeModel("gemini-2.0-flash")
         prompt = f"""You are an information extraction assistant. From the following bank statement text, extract the salary deposit amount (the credited salary). If no salary deposit is found, return 0. Text:{text}"""
-        response = model.generate_content(prompt)
-        try:
-            extracted = response.text.strip()
-            salary = float("".join(ch for ch in extracted if ch.isdigit() or ch == "."))
-            return salary
-        except Exception as e:
-            print("Parsing error:", e)
-            return 0.0
+        with tracing.span("llm.salary") as span:
+            # LLMError goes to the caller, which leaves the field unresolved rather than caching a made-up 0.
+            answer = llm.get_llm_client().generate(prompt, model=_get_extraction_model())
+            try:
+                extracted = answer.strip()
+                salary = float("".join(ch for ch in extracted if ch.isdigit() or ch == "."))
+                return salary
+            except Exception as e:
+                span.fail(e)
+                print("Parsing error:", e)
+                return 0.0
 
     def _extract_credit_score(self, text: str) -> int:
         match = re.search(r"Credit\s*Score:\s*(\d{3})", text, re.IGNORECASE)
@@ -92,6 +142,23 @@ class DataExtractionAgent:
             return int(match.group(1))
         return 600
 
+    def _has_confident_salary(self, text: str) -> bool:
+        return salary_rules.confident_match(text) is not None
+
+    def _has_credit_score(self, text: str) -> bool:
+        return re.search(r"Credit\s*Score:\s*(\d{3})", text, re.IGNORECASE) is not None
+
+    def _has_employment_keyword(self, text: str) -> bool:
+        # Only the keywords that win in _infer_employment_status; later pages could not change the result.
+        lowered = text.lower()
+        return "experience" in lowered or "engineer" in lowered or "analyst" in lowered
+
+    _fields_found = {
+        "bank_statement": "_has_confident_salary",
+        "credit_report": "_has_credit_score",
+        "resume": "_has_employment_keyword",
+    }
+
     def _infer_employment_status(self, text: str) -> str:
         if "experience" in text.lower() or "engineer" in text.lower() or "analyst" in text.lower():
             return "employed"
@@ -99,42 +166,156 @@ class DataExtractionAgent:
             return "self-employed"
         return "unemployed"
 
-    def extract(self, application: dict) -> dict:
+    def _document_kind(self, f: str) -> str:
+        name = f.lower()
+        if name.endswith(".pdf"):
+            for kind in ("bank_statement", "resume", "credit_report"):
+                if kind in name:
+                    return kind
+            return "pdf"
+        if name.endswith((".jpg", ".jpeg", ".png")):
+            return "image"
+        if name.endswith((".xlsx", ".csv")):
+            return "xlsx"
+        return "other"
+
+    def _parse_document(self, f: str, kind: str) -> dict:
+        entry = {"parsed_text": "", "fields": {}, "pending_llm": [], "field_sources": {}}
+        fields = entry["fields"]
+        if kind in ("bank_statement", "resume", "credit_report", "pdf"):
+            text = self._extract_text_from_pdf(f)
+            # print(text)
+            entry["parsed_text"] = text
+
+            if kind == "bank_statement":
+                match = salary_rules.confident_match(text)
+                if match:
+                    fields["reported_income"] = match.amount
+                    entry["field_sources"]["reported_income"] = {"path": "rule", "rule": match.rule, "confidence": match.confidence}
+                else:
+                    entry["pending_llm"].append("reported_income")
+
+            elif kind == "resume":
+                fields["employment_status"] = self._infer_employment_status(text)
+
+            elif kind == "credit_report":
+                fields["credit_score"] = self._extract_credit_score(text)
+
+        elif kind == "image":
+            text = self._extract_text_from_image(f)
+            # print(text)
+            entry["parsed_text"] = text
+            name, dob = self._extract_name_dob_from_text(text)
+            if name:
+                fields["name"] = name
+            if dob:
+                fields["dob"] = dob
+
+        elif kind == "xlsx":
+            summary = self._parse_ledger(f)
+            fields["assets"] = summary.assets
+            fields["liabilities"] = summary.liabilities
+            # Subtotals and bad rows travel with the document so the applicant can see what was counted.
+            entry["ledger"] = summary.to_dict()
+
+        return entry
+
+    def _resolve_llm_field(self, field: str, text: str):
+        if field == "reported_income":
+            return self._extract_income_from_bank_statement(text)
+        raise ValueError(f"No LLM extractor for field '{field}'")
+
+    def _extract_document(self, f: str, defer_llm: bool = False, digest: str = None) -> Tuple[dict, dict, List[str]]:
+        kind = self._document_kind(f)
+        # extract() stops waiting at DOCUMENT_TIMEOUT; the deadline makes this thread stop working then too.
+        deadline = time.monotonic() + DOCUMENT_TIMEOUT
+        left = llm.remaining()
+        token = _document_deadline.set(deadline)
+        try:
+            with tracing.span("document", kind=kind) as span, llm.budget(deadline if left is None else min(deadline, time.monotonic() + left)):
+                doc_info, fields, pending = self._extract_document_traced(f, kind, defer_llm, digest)
+                span.set(cache=doc_info["cache"])
+        finally:
+            _document_deadline.reset(token)
+        return doc_info, fields, pending
+
+    def _extract_document_traced(self, f: str, kind: str, defer_llm: bool, digest: str) -> Tuple[dict, dict, List[str]]:
+        try:
+            cache_key = extraction_cache.key(f, kind, EXTRACTOR_VERSION, digest=digest)
+        except OSError:
+            cache_key = None
+
+        entry, tier = extraction_cache.get(cache_key) if cache_key else (None, "miss")
+        if entry is not None and entry["pending_llm"] and tier == "memory":
+            # Another process may have resolved the LLM fields since this copy was cached.
+            fresher, _ = extraction_cache.get(cache_key, memory=False)
+            entry = fresher or entry
+        if entry is None:
+            entry = self._parse_document(f, kind)
+            if cache_key:
+                extraction_cache.put(cache_key, entry)
+
+        doc_info = {"file_path": f, "parsed_text": entry["parsed_text"], "cache": tier}
+        if "ledger" in entry:
+            doc_info["ledger"] = entry["ledger"]
+        sources = dict(entry.get("field_sources", {}))
+        if cache_key:
+            doc_info["cache_key"] = cache_key
+        fields = dict(entry["fields"])
+        pending = list(entry["pending_llm"])
+        if pending and not defer_llm:
+            unresolved = []
+            for field in pending:
+                try:
+                    fields[field] = self._resolve_llm_field(field, entry["parsed_text"])
+                    sources[field] = {"path": "llm"}
+                except llm.LLMError as e:
+                    print(f"[WARN] Could not resolve {field} from {f}: {e}")
+                    sources[field] = {"path": "llm", "error": str(e)}
+                    unresolved.append(field)
+            if cache_key and len(unresolved) < len(pending):
+                cached_sources = {k: v for k, v in sources.items() if k not in unresolved}
+                extraction_cache.put(cache_key, {**entry, "fields": fields, "pending_llm": unresolved, "field_sources": cached_sources})
+            pending = []
+        if sources:
+            doc_info["field_sources"] = sources
+
+        return doc_info, fields, pending
+
+    def extract(self, application: dict, defer_llm: bool = False) -> dict:
         parsed = {"app_form": {}, "documents": []}
-        for f in application.get("files", []):
-            doc_info = {"file_path": f, "parsed_text": ""}
-            if f.lower().endswith(".pdf"):
-                text = self._extract_text_from_pdf(f)
-                # print(text)
-                doc_info["parsed_text"] = text
-
-                if "bank_statement" in f.lower():
-                    parsed["app_form"]["reported_income"] = self._extract_income_from_bank_statement(text)
-
-                elif "resume" in f.lower():
-                    parsed["app_form"]["employment_status"] = self._infer_employment_status(text)
-
-                elif "credit_report" in f.lower():
-                    parsed["app_form"]["credit_score"] = self._extract_credit_score(text)
-
-            elif f.lower().endswith((".jpg", ".jpeg", ".png")):
-                text = self._extract_text_from_image(f)
-                # print(text)
-                doc_info["parsed_text"] = text
-                name, dob = self._extract_name_dob_from_text(text)
-                if name:
-                    parsed["app_form"]["name"] = name
-                if dob:
-                    parsed["app_form"]["dob"] = dob
-
-            elif f.lower().endswith(".xlsx"):
-                assets, liabilities = self._parse_assets_liabilities(f)
-                parsed["app_form"]["assets"] = assets
-                parsed["app_form"]["liabilities"] = liabilities
-
-            parsed["documents"].append(doc_info)
-
-        parsed["app_form"].setdefault("family_size", 4)
+        if defer_llm:
+            parsed["deferred_llm"] = []
+        files = application.get("files", [])
+        digests = application.get("file_digests") or {}
+
+        # Documents are independent, so run them concurrently and merge in upload order.
+        workers = max(1, min(DOCUMENT_WORKERS, len(files)))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="document")
+        try:
+            # Each document thread gets a copy of the context so its spans land in this request's trace.
+            futures = [pool.submit(contextvars.copy_context().run, self._extract_document, f, defer_llm, digests.get(f)) for f in files]
+            waves = -(-len(files) // workers)
+            deadline = time.monotonic() + DOCUMENT_TIMEOUT * max(1, waves)
+            for f, future in zip(files, futures):
+                try:
+                    doc_info, fields, deferred = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    future.cancel()
+                    print(f"[WARN] Extraction of {f} timed out after {DOCUMENT_TIMEOUT}s")
+                    doc_info, fields, deferred = {"file_path": f, "parsed_text": "", "error": f"timed out after {DOCUMENT_TIMEOUT}s"}, {}, []
+                except Exception as e:
+                    print(f"[WARN] Could not extract {f}: {e}")
+                    doc_info, fields, deferred = {"file_path": f, "parsed_text": "", "error": str(e)}, {}, []
+
+                parsed["app_form"].update(fields)
+                for field in deferred:
+                    parsed["deferred_llm"].append({"field": field, "document": len(parsed["documents"])})
+                parsed["documents"].append(doc_info)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        parsed["app_form"].setdefault("family_size", DEFAULT_FAMILY_SIZE)
         parsed["app_form"].setdefault("reported_income", 0)
         parsed["app_form"].setdefault("employment_status", "unemployed")
         parsed["app_form"].setdefault("credit_score", 600)
@@ -143,6 +324,28 @@ class DataExtractionAgent:
         # print(parsed)
         return parsed
 
+    def resolve_deferred_llm(self, parsed: dict) -> dict:
+        for item in parsed.pop("deferred_llm", []):
+            doc_info = parsed["documents"][item["document"]]
+            try:
+                value = self._resolve_llm_field(item["field"], doc_info["parsed_text"])
+            except llm.LLMError as e:
+                # Out of budget or the LLM is down: the field keeps its default and stays pending in the cache.
+                print(f"[WARN] Could not resolve {item['field']} from {doc_info['file_path']}: {e}")
+                doc_info.setdefault("field_sources", {})[item["field"]] = {"path": "llm", "error": str(e)}
+                continue
+            parsed["app_form"][item["field"]] = value
+            doc_info.setdefault("field_sources", {})[item["field"]] = {"path": "llm"}
+
+            cache_key = doc_info.get("cache_key")
+            entry, _ = extraction_cache.get(cache_key) if cache_key else (None, "miss")
+            if entry is not None:
+                fields = {**entry["fields"], item["field"]: value}
+                pending = [p for p in entry["pending_llm"] if p != item["field"]]
+                sources = {**entry.get("field_sources", {}), item["field"]: {"path": "llm"}}
+                extraction_cache.put(cache_key, {**entry, "fields": fields, "pending_llm": pending, "field_sources": sources})
+        return parsed
+
 class ValidationAgent:
     def __init__(self):
         pass
@@ -156,99 +359,125 @@ class ValidationAgent:
         }
         return report
 
+def approximate_age(dob_str):
+    try:
+        from datetime import datetime
+        if not dob_str:
+            return 35
+        dob = datetime.strptime(dob_str.split('T')[0],'%Y-%m-%d')
+        today = datetime.today()
+        return today.year - dob.year - ((today.month, today.day)<(dob.month, dob.day))
+    except Exception:
+        return 35
+
+
+def build_feature_row(application: dict) -> dict:
+    """Model input for one application; training uses this too so features never drift from scoring."""
+    return {
+        'age': application.get('age') or approximate_age(application.get('dob')),
+        'family_size': application.get('family_size', DEFAULT_FAMILY_SIZE),
+        'monthly_income': application.get('reported_income', 0),
+        'employment_status': application.get('employment_status') or 'unemployed',
+        'assets': application.get('assets', 0),
+        'liabilities': application.get('liabilities', 0),
+        'credit_score': application.get('credit_score', 600),
+    }
+
+
+def preload_eligibility_model() -> LoadedModel:
+    """Load the model EligibilityAgent will start with, before worker processes are forked."""
+    return preload_initial_model(ModelRegistry(), MODEL_PATH, COMPILED_MODEL_PATH, compiled=ELIGIBILITY_ENGINE == "compiled")
+
+
 class EligibilityAgent:
     def __init__(self):
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model not found. Please run Scripts/train_eligibility_model.py to create it.")
-        self.pipeline = joblib.load(MODEL_PATH)
-    
-    def _build_feature_vector(self, application:dict, parsed_docs: dict):
-        age = application.get('age') or self._approximate_age_from_dob(application.get('dob'))
-        family_size = application.get('family_size', 1)
-        monthly_income = application.get('reported_income', 0)
-        employment_status = application.get('employment_status') or 'unemployed'
-        assets = application.get('assets', 0)
-        liabilities = application.get('liabilities', 0)
-        credit_score = application.get('credit_score', 600)
-
-        x_row = {
-            'age':age,
-            'family_size':family_size,
-            'monthly_income':monthly_income,
-            'employment_status':employment_status,
-            'assets':assets,
-            'liabilities':liabilities,
-            'credit_score':credit_score
-        }
+        registry = ModelRegistry()
+        compiled = ELIGIBILITY_ENGINE == "compiled"
+        model = load_initial_model(registry, MODEL_PATH, COMPILED_MODEL_PATH, compiled=compiled)
+        self.active_model = ActiveModel(registry, model, compiled=compiled, refresh_interval=MODEL_REFRESH_INTERVAL)
+
+    @property
+    def pipeline(self):
+        return self.active_model.current().pipeline
 
-        return x_row
+    @property
+    def model_version(self) -> str:
+        return self.active_model.current().version
+
+    def _build_feature_vector(self, application:dict, parsed_docs: dict):
+        return build_feature_row(application)
     
     def _approximate_age_from_dob(self, dob_str):
-        try:
-            from datetime import datetime
-            if not dob_str:
-                return 35
-            dob = datetime.strptime(dob_str.split('T')[0],'%Y-%m-%d')
-            today = datetime.today()
-            return today.year - dob.year - ((today.month, today.day)<(dob.month, dob.day))
-        except Exception:
-            return 35
-        
-    def assess(self, application:dict, parsed_docs:dict, validation_report:dict) -> Tuple[str, float, List[str], List[str]]:
-        x_row = self._build_feature_vector(application, parsed_docs)
-        try:
-            import pandas as pd
-            x_df = pd.DataFrame([x_row])
-        except Exception:
-            x_df = [[v for v in x_row.values()]]
+        return approximate_age(dob_str)
         
-        proba = None
-        try:
-            proba = self.pipeline.predict_proba(x_df)
-        except Exception:
-            pass
-
-        pred = self.pipeline.predict(x_df)[0]
-        unique_classes = None
-        if proba is not None:
-            class_index = list(self.pipeline.classes_).index(pred)
-            score = float(proba[0][class_index])
+    def _label_and_score(self, model: LoadedModel, x_rows: List[dict]) -> List[Tuple[str, float]]:
+        if model.engine is not None and len(x_rows) <= COMPILED_MAX_BATCH:
+            proba = model.engine.predict_proba(x_rows)
+            classes = model.engine.classes
         else:
-            score = 1.0 if pred == 'approve' else 0.5
-        # print(pred)
-        reasons_map = {
-            'approve':['meets_income_threshold', 'low_per_capita_income'],
-            'soft-decline':['marginal_income'],
-            'reject':['sufficient_income']
-        }
+            # sklearn's C tree traversal wins for large batches.
+            x_df = pd.DataFrame(x_rows, columns=FEATURE_COLUMNS)
+            try:
+                proba = model.pipeline.predict_proba(x_df)
+            except Exception:
+                preds = model.pipeline.predict(x_df)
+                return [(str(pred), 1.0 if pred == 'approve' else 0.5) for pred in preds]
+            classes = model.pipeline.classes_
 
-        recs_map = {
-            'approve':['upskill', 'job_match'],
-            'soft-decline':['counseling'],
-            'reject':[]
-        }
+        class_index = np.argmax(proba, axis=1)
+        return [(str(classes[i]), float(proba[row][i])) for row, i in enumerate(class_index)]
+
+    def assess_many_versioned(self, applications: List[dict], parsed_docs: List[dict] = None, validation_reports: List[dict] = None) -> Tuple[str, List[Tuple[str, float, List[str], List[str]]]]:
+        # Pin one model for the whole call so a concurrent hot swap cannot split a batch.
+        model = self.active_model.current()
+        if not applications:
+            return model.version, []
+        parsed_docs = parsed_docs or [{} for _ in applications]
+        x_rows = [self._build_feature_vector(a, p) for a, p in zip(applications, parsed_docs)]
+
+        results = []
+        with tracing.span("model.predict", rows=len(x_rows), version=model.version):
+            scored = self._label_and_score(model, x_rows)
+        for pred, score in scored:
+            reasons = list(REASONS_MAP.get(pred, []))
+            recommendations = list(RECS_MAP.get(pred, []))
+            results.append((pred, score, reasons, recommendations))
+        return model.version, results
+
+    def assess_many(self, applications: List[dict], parsed_docs: List[dict] = None, validation_reports: List[dict] = None) -> List[Tuple[str, float, List[str], List[str]]]:
+        return self.assess_many_versioned(applications, parsed_docs, validation_reports)[1]
 
-        reasons = reasons_map.get(pred,[])
-        recommendations = recs_map.get(pred,[])
-        # print(pred, score, reasons, recommendations)
-        return pred, score, reasons, recommendations
+    def assess(self, application:dict, parsed_docs:dict, validation_report:dict) -> Tuple[str, float, List[str], List[str]]:
+        return self.assess_many([application], [parsed_docs], [validation_report])[0]
+
+    def assess_versioned(self, application:dict, parsed_docs:dict, validation_report:dict) -> Tuple[str, Tuple[str, float, List[str], List[str]]]:
+        version, results = self.assess_many_versioned([application], [parsed_docs], [validation_report])
+        return version, results[0]
     
 
 class ExplanationAgent:
     def __init__(self):
-        if not GEMINI_API_KEY:
+        if llm.LLM_BACKEND == "gemini" and not GEMINI_API_KEY:
             raise ValueError("GEMINI API Key not found. Set the GOOGLE_API_KEY environment variable.")
-        genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.model = llm.get_llm_client().model
         self.processed_dir = Path("data/saved_applications")
 
-    def _load_app_context(self, app_id:str):
-        app_file = self.processed_dir/f"{app_id}.json"
-        if app_file.exists():
+    def _read_application(self, app_id:str) -> Optional[dict]:
+        data = get_application_store().get(app_id)
+        if data is None:
+            # Applications saved before the SQLite store may not have been migrated yet.
+            app_file = self.processed_dir/f"{app_id}.json"
+            if not app_file.exists():
+                return None
             with open(app_file) as f:
                 data = json.load(f)
-            return json.dumps(data, indent=2)
-        return ""
+        return data
+
+    def _load_app_context(self, app_id:str) -> str:
+        return chat.get_app_contexts().get(app_id, self._read_application)
+
+    def wants_llm(self, rich: bool = None) -> bool:
+        return explanations.EXPLAIN_MODE == "llm" if rich is None else bool(rich)
 
     def explain(
         self,
@@ -257,22 +486,101 @@ class ExplanationAgent:
         validation_report: dict,
         decision: str,
         score: float,
-        recommendations: List[str]
+        recommendations: List[str],
+        rich: bool = None,
     ) -> str:
+        """Explain a decision from the local templates, or with Gemini when `rich` (default: EXPLAIN_MODE == "llm")."""
+        if not self.wants_llm(rich):
+            start = time.perf_counter()
+            text = explanations.render_explanation(decision, score, REASONS_MAP.get(decision, []), recommendations, validation_report)
+            explanations.explanations_total.inc(source="template")
+            explanations.record("template", time.perf_counter() - start)
+            return text
+
         prompt = (f"Application {application.get('app_id')} was processed with the following results:\\n\Decision: {decision} (confidence {round(score,2)})\\n\Reasons: {', '.join(recommendations) if recommendations else 'None'}\\n\Validation Report: {validation_report}\\n""\Please explain in simple language what this means for the applicant, including any suggestions to improve their eligibility.\"\n")
 
-        try:
-            response = self.model.generate_content(contents=prompt)
-            return response.text
-        except Exception as e:
-            return f'[Error calling LLM: {e}]'
+        start = time.perf_counter()
+        explanations.explanation_llm_calls.inc(mode="single")
+        with tracing.span("llm.explain") as span:
+            try:
+                text = llm.get_llm_client().generate(prompt, model=self.model)
+                explanations.explanations_total.inc(source="llm")
+                return text
+            except Exception as e:
+                span.fail(e)
+                print(f"[WARN] Explanation LLM call failed, using the template: {e}")
+                explanations.explanations_total.inc(source="fallback")
+                return explanations.render_explanation(decision, score, REASONS_MAP.get(decision, []), recommendations, validation_report)
+            finally:
+                explanations.record("llm", time.perf_counter() - start)
+
+    def explain_many(self, items: List[tuple]) -> List[str]:
+        """Gemini explanations for many decisions in one request.
+
+        `items` are (application, validation_report, decision, score, recommendations).
+        Keep a call to EXPLAIN_LLM_BATCH_SIZE items; any the answer leaves out get the template text.
+        """
+        if not items:
+            return []
+        prompt = explanations.batch_prompt([
+            explanations.describe(application.get('app_id'), decision, score, recommendations, report)
+            for application, report, decision, score, recommendations in items
+        ])
+        start = time.perf_counter()
+        explanations.explanation_llm_calls.inc(mode="batch")
+        with tracing.span("llm.explain_batch", rows=len(items)) as span:
+            try:
+                texts = explanations.parse_batch(llm.get_llm_client().generate(prompt, model=self.model), len(items))
+            except Exception as e:
+                span.fail(e)
+                print(f"[WARN] Batched explanation failed, using templates: {e}")
+                texts = [None] * len(items)
+            explanations.record("llm_batch", time.perf_counter() - start, len(items))
+        results = []
+        for text, (application, report, decision, score, recommendations) in zip(texts, items):
+            if text is None:
+                explanations.explanations_total.inc(source="fallback")
+                text = explanations.render_explanation(decision, score, REASONS_MAP.get(decision, []), recommendations, report)
+            else:
+                explanations.explanations_total.inc(source="llm")
+            results.append(text)
+        return results
+
+    def _retrieve_context(self, query: str, app_id: str = None) -> List[str]:
+        with tracing.span("retrieval.search") as span:
+            try:
+                store = get_application_store()
+                index = get_retrieval_index()
+                index.maybe_sync(store)
+                hits = [h for h in index.search(query, k=RETRIEVAL_TOP_K + 1) if h["id"] != app_id][:RETRIEVAL_TOP_K]
+                texts = [(h["id"], document_text(h["id"], store)) for h in hits]
+            except Exception as e:
+                span.fail(e)
+                print(f"[WARN] Retrieval failed: {e}")
+                return []
+        return [f"- [{doc_id}] {text[:600]}" for doc_id, text in texts if text]
 
-    def answer_query(self, query: str, app_id: str = None) -> str:
+    def _query_prompt(self, query: str, app_id: str = None, history: List[dict] = (), usage: dict = None) -> str:
+        """Prompt for a chat question, within CHAT_PROMPT_TOKEN_BUDGET; token counts land in `usage`."""
         context = self._load_app_context(app_id) if app_id else ""
-        prompt = f"You are a social support eligibility assistant. Applicant ID: {app_id or '(unknown)'} Context: {context}\n asks: {query}\\n\ Please answer clearly, referencing what eligibility means and what they can do next."
-        
-        try:
-            response = self.model.generate_content(contents=prompt)
-            return response.text
-        except Exception as e:
-            return f'[Error calling LLM: {e}]'
\ No newline at end of file
+        related = self._retrieve_context(query, app_id)
+        return chat.build_prompt(query, app_id, context, related, history, usage=usage)
+
+    def answer_query(self, query: str, app_id: str = None, history: List[dict] = (), usage: dict = None) -> str:
+        prompt = self._query_prompt(query, app_id, history, usage)
+        with tracing.span("llm.query") as span:
+            try:
+                return llm.get_llm_client().generate(prompt, model=self.model)
+            except Exception as e:
+                span.fail(e)
+                return f'[Error calling LLM: {e}]'
+
+    def answer_query_stream(self, query: str, app_id: str = None, history: List[dict] = (), usage: dict = None) -> Iterator[str]:
+        """Yield the answer in chunks as Gemini generates them."""
+        prompt = self._query_prompt(query, app_id, history, usage)
+        with tracing.span("llm.query_stream") as span:
+            try:
+                yield from llm.get_llm_client().stream(prompt, model=self.model)
+            except Exception as e:
+                span.fail(e)
+                yield f'[Error calling LLM: {e}]'
@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+APPLICATION_DB_PATH = os.getenv("APPLICATION_DB_PATH", "data/applications.db")
+STORE_BATCH_SIZE = int(os.getenv("STORE_BATCH_SIZE", 200))
+STORE_FLUSH_INTERVAL = float(os.getenv("STORE_FLUSH_INTERVAL", 0.05))
+# A batch the database refuses (locked, disk full) is retried, backing off up to this many seconds between tries.
+STORE_RETRY_MAX_BACKOFF = float(os.getenv("STORE_RETRY_MAX_BACKOFF", 5))
+# Seconds shutdown waits for queued records to be committed.
+STORE_SHUTDOWN_TIMEOUT = float(os.getenv("STORE_SHUTDOWN_TIMEOUT", 30))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applications (
+    app_id TEXT PRIMARY KEY,
+    decision TEXT,
+    score REAL,
+    reported_income REAL,
+    family_size INTEGER,
+    model_version TEXT,
+    created_at TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_applications_created ON applications (created_at, app_id);
+CREATE INDEX IF NOT EXISTS idx_applications_decision_created ON applications (decision, created_at, app_id);
+CREATE INDEX IF NOT EXISTS idx_applications_score ON applications (score);
+CREATE INDEX IF NOT EXISTS idx_applications_income ON applications (reported_income);
+"""
+
+COLUMNS = ["app_id", "decision", "score", "reported_income", "family_size", "model_version", "created_at", "payload"]
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+class ApplicationStore:
+    """SQLite (WAL) store for scored applications.
+
+    Writes are queued and committed in batches by a background thread; reads
+    see queued records immediately so a lookup right after `save` still works.
+    A batch that fails is retried until it is committed, so a saved record is
+    never dropped. A record SQLite rejects outright is appended to
+    `<path>.failed.jsonl` instead.
+    """
+
+    def __init__(self, path: str = APPLICATION_DB_PATH, batch_size: int = STORE_BATCH_SIZE, flush_interval: float = STORE_FLUSH_INTERVAL):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._listeners = []
+        self.write_failures = 0
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, name="application-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _to_row(self, record: dict) -> tuple:
+        application = record.get("application") or {}
+        record = {**record, "created_at": record.get("created_at") or utc_now()}
+        return (
+            record["app_id"],
+            record.get("decision"),
+            record.get("score"),
+            application.get("reported_income", record.get("reported_income")),
+            application.get("family_size", record.get("family_size")),
+            record.get("model_version"),
+            record["created_at"],
+            json.dumps(record, separators=(",", ":")),
+        )
+
+    def save(self, record: dict):
+        if not record.get("app_id"):
+            raise ValueError("Application record needs an app_id")
+        row = self._to_row(record)
+        with self._pending_lock:
+            self._pending[row[0]] = row
+        self._queue.put(row)
+
+    def save_many(self, records: Iterable[dict]) -> int:
+        rows = [self._to_row(r) for r in records]
+        self._write(rows)
+        self._notify(rows)
+        return len(rows)
+
+    def add_listener(self, callback):
+        """Call `callback(records)` with every committed batch, on the writer thread."""
+        self._listeners.append(callback)
+
+    def _notify(self, rows: List[tuple]):
+        if not self._listeners or not rows:
+            return
+        records = [json.loads(row[-1]) for row in rows]
+        for callback in self._listeners:
+            try:
+                callback(records)
+            except Exception as e:
+                print(f"[WARN] Application store listener failed: {e}")
+
+    def _write(self, rows: List[tuple]):
+        if not rows:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO applications ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows,
+            )
+
+    def _dead_letter(self, row: tuple, error: Exception):
+        print(f"[WARN] Application {row[0]} was rejected by the database ({error}); kept in {self.path}.failed.jsonl")
+        with open(f"{self.path}.failed.jsonl", "a") as f:
+            f.write(json.dumps({"error": str(error), "record": json.loads(row[-1])}) + "\n")
+
+    def _write_batch(self, rows: List[tuple], attempt: int = 0) -> List[tuple]:
+        """Commit `rows`, retrying while the database is unavailable; returns the rows that were committed."""
+        while True:
+            try:
+                self._write(rows)
+                return rows
+            except sqlite3.OperationalError as e:
+                # Locked, busy or out of disk: the records are fine, so wait and try again.
+                attempt += 1
+                self.write_failures += 1
+                delay = min(STORE_RETRY_MAX_BACKOFF, 0.05 * 2 ** attempt)
+                print(f"[WARN] Could not write {len(rows)} applications (attempt {attempt}), retrying in {delay:.2f}s: {e}")
+                time.sleep(delay)
+            except Exception as e:
+                self.write_failures += 1
+                if len(rows) == 1:
+                    self._dead_letter(rows[0], e)
+                    return []
+                # Something in the batch itself is bad: write the rows one by one so only that record is set aside.
+                return [row for one in rows for row in self._write_batch([one], attempt)]
+
+    def _write_loop(self):
+        while True:
+            rows = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                written = self._write_batch(rows)
+                try:
+                    self._notify(written)
+                except Exception as e:
+                    print(f"[WARN] Committed {len(written)} applications but could not notify listeners: {e}")
+            finally:
+                with self._pending_lock:
+                    for row in rows:
+                        if self._pending.get(row[0]) is row:
+                            del self._pending[row[0]]
+                for _ in rows:
+                    self._queue.task_done()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued record is committed; False if `timeout` ran out first."""
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def pending(self) -> int:
+        with self._pending_lock:
+            return len(self._pending)
+
+    def get(self, app_id: str) -> Optional[dict]:
+        with self._pending_lock:
+            row = self._pending.get(app_id)
+        if row is not None:
+            return json.loads(row[-1])
+        found = self._connect().execute("SELECT payload FROM applications WHERE app_id = ?", (app_id,)).fetchone()
+        return json.loads(found["payload"]) if found else None
+
+    def query(
+        self,
+        decision: str = None,
+        min_score: float = None,
+        max_score: float = None,
+        min_income: float = None,
+        max_income: float = None,
+        since: str = None,
+        until: str = None,
+        limit: int = 50,
+        cursor: str = None,
+    ) -> dict:
+        """Newest-first page of applications; pass the returned `next_cursor` to continue.
+
+        Score and income bounds are inclusive at both ends; `since` is
+        inclusive and `until` exclusive, so consecutive date ranges do not
+        overlap. A cursor that is not one this method returned raises ValueError.
+        """
+        clauses, params = [], []
+        for column, op, value in [
+            ("decision", "=", decision),
+            ("score", ">=", min_score),
+            ("score", "<=", max_score),
+            ("reported_income", ">=", min_income),
+            ("reported_income", "<=", max_income),
+            ("created_at", ">=", since),
+            ("created_at", "<", until),
+        ]:
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        if cursor:
+            created_at, sep, app_id = cursor.partition("|")
+            if not sep or not created_at or not app_id:
+                raise ValueError(f"Malformed cursor {cursor!r}; pass the next_cursor of the previous page")
+            clauses.append("(created_at, app_id) < (?, ?)")
+            params.extend([created_at, app_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        limit = max(1, min(int(limit), 1000))
+        rows = self._connect().execute(
+            f"SELECT app_id, created_at, payload FROM applications {where} ORDER BY created_at DESC, app_id DESC LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+
+        items = [json.loads(r["payload"]) for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = f"{last['created_at']}|{last['app_id']}"
+        return {"items": items, "next_cursor": next_cursor}
+
+    def iter_since(self, created_at: str = "", batch_size: int = 1000):
+        """Oldest-first batches of applications created after `created_at`."""
+        cursor = (created_at or "", "")
+        while True:
+            rows = self._connect().execute(
+                "SELECT app_id, created_at, payload FROM applications WHERE (created_at, app_id) > (?, ?) "
+                "ORDER BY created_at, app_id LIMIT ?",
+                (*cursor, batch_size),
+            ).fetchall()
+            if not rows:
+                return
+            yield [json.loads(r["payload"]) for r in rows]
+            cursor = (rows[-1]["created_at"], rows[-1]["app_id"])
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM applications").fetchone()[0]
+
+
+def migrate_json_dir(store: ApplicationStore, directory: str, batch_size: int = 1000) -> int:
+    """Import one-file-per-application JSON records, using the file mtime as created_at."""
+    migrated = 0
+    batch = []
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Skipping {path}: {e}")
+            continue
+        record.setdefault("app_id", path.stem)
+        record.setdefault("created_at", datetime.fromtimestamp(path.stat().st_mtime, timezone.utc).isoformat(timespec="microseconds"))
+        batch.append(record)
+        if len(batch) >= batch_size:
+            migrated += store.save_many(batch)
+            batch = []
+    migrated += store.save_many(batch)
+    return migrated
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_application_store() -> ApplicationStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ApplicationStore()
+    return _store
@@ -0,0 +1,281 @@
+import os
+import json
+import math
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from backend import tracing
+from backend.latency import LatencyRecorder
+
+CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", "data/chat.db")
+# A chat session is forgotten this long after its last question.
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", 1800))
+# Question/answer pairs kept per session; older ones are dropped.
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", 6))
+# A stored answer is cut to this many characters, so one long reply cannot crowd out the rest of the history.
+CHAT_TURN_MAX_CHARS = int(os.getenv("CHAT_TURN_MAX_CHARS", 1200))
+# Estimated tokens per /explain prompt; history and related cases are added newest/best first until it is reached.
+CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", 1500))
+CHAT_CHARS_PER_TOKEN = float(os.getenv("CHAT_CHARS_PER_TOKEN", 4))
+CHAT_CONTEXT_CACHE_ITEMS = int(os.getenv("CHAT_CONTEXT_CACHE_ITEMS", 512))
+# Re-saves in this process evict a context at once; this bounds how long one saved by another worker stays stale.
+CHAT_CONTEXT_TTL = float(os.getenv("CHAT_CONTEXT_TTL", 60))
+# Characters of the decision explanation kept in the compact context.
+CHAT_EXPLANATION_CHARS = int(os.getenv("CHAT_EXPLANATION_CHARS", 600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    app_id TEXT,
+    turns TEXT NOT NULL,
+    updated_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_ts);
+"""
+
+INSTRUCTIONS = ("You are a social support eligibility assistant. Answer clearly, referencing what eligibility means "
+                "for the applicant and what they can do next.")
+
+context_lookups = tracing.metrics.counter("chat_context_cache_total", "Application contexts for /explain, by whether the in-memory cache had them.", ("result",))
+prompt_tokens = tracing.metrics.histogram("chat_prompt_tokens", "Estimated tokens sent per /explain query.",
+                                          buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000))
+prompt_usage = LatencyRecorder(fields=("prompt_tokens", "context_tokens", "history_tokens", "related_tokens"))
+
+
+def estimate_tokens(text: str) -> int:
+    # Gemini's own count is a network call; characters per token is close enough for a budget.
+    return math.ceil(len(text or "") / CHAT_CHARS_PER_TOKEN)
+
+
+def compact_context(record: dict) -> str:
+    """The parts of a saved application that answer questions about it, one short line each.
+
+    Identity fields (name, address, date of birth), file paths and bookkeeping
+    are left out: the model does not need them and they cost tokens.
+    """
+    application = record.get("application") or {}
+    lines = []
+    if record.get("decision"):
+        score = record.get("score")
+        lines.append(f"decision: {record['decision']}" + (f" (confidence {round(score, 2)})" if score is not None else ""))
+    for field in ("reasons", "recommendations"):
+        if record.get(field):
+            lines.append(f"{field}: {', '.join(record[field])}")
+    income = application.get("reported_income", record.get("reported_income"))
+    family_size = application.get("family_size", record.get("family_size"))
+    if income is not None:
+        household = f"monthly income: {income:g} AED"
+        if family_size:
+            household += f"; family size: {family_size} ({income / family_size:.0f} AED per member)"
+        lines.append(household)
+    if record.get("explanation"):
+        explanation = " ".join(record["explanation"].split())
+        if len(explanation) > CHAT_EXPLANATION_CHARS:
+            explanation = explanation[:CHAT_EXPLANATION_CHARS].rsplit(" ", 1)[0] + " ..."
+        lines.append(f"explanation given: {explanation}")
+    return "\n".join(lines)
+
+
+class AppContextCache:
+    """LRU of compact application contexts, so follow-up questions skip the store read and formatting.
+
+    The application store's writer calls `invalidate` with every committed
+    batch, so a re-saved application is re-read on its next question.
+    """
+
+    def __init__(self, max_items: int = CHAT_CONTEXT_CACHE_ITEMS, ttl: float = CHAT_CONTEXT_TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hit": 0, "miss": 0, "invalidated": 0}
+
+    def get(self, app_id: str, load: Callable[[str], Optional[dict]]) -> str:
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(app_id)
+            if item is not None and item[1] > now:
+                self._items.move_to_end(app_id)
+                self.counters["hit"] += 1
+                context_lookups.inc(result="hit")
+                return item[0]
+        self.counters["miss"] += 1
+        context_lookups.inc(result="miss")
+        record = load(app_id)
+        context = compact_context(record) if record else ""
+        if record:
+            with self._lock:
+                self._items[app_id] = (context, now + self.ttl)
+                self._items.move_to_end(app_id)
+                while len(self._items) > self.max_items:
+                    self._items.popitem(last=False)
+        return context
+
+    def invalidate(self, records: List[dict]):
+        with self._lock:
+            for record in records:
+                if self._items.pop(record.get("app_id"), None) is not None:
+                    self.counters["invalidated"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._items), "max_items": self.max_items, **self.counters}
+
+
+def build_prompt(query: str, app_id: str = None, context: str = "", related: List[str] = (), history: List[dict] = (),
+                 budget: int = None, usage: dict = None) -> str:
+    """Assemble the /explain prompt within `budget` estimated tokens.
+
+    The instructions, the applicant's context and the question always go in.
+    The remaining budget takes the most recent turns of the conversation
+    first, then related cases in rank order; whatever does not fit is left
+    out. Token counts land in `usage` when it is given.
+    """
+    budget = CHAT_PROMPT_TOKEN_BUDGET if budget is None else budget
+    header = f"{INSTRUCTIONS}\nApplicant ID: {app_id or '(unknown)'}"
+    if context:
+        header += f"\nApplicant's application:\n{context}"
+    question = f"Applicant asks: {query}"
+    used = estimate_tokens(header) + estimate_tokens("\n\n" + question)
+
+    # Each part is costed with its separator and section title, so the sum never undercounts the joined prompt.
+    history_title, related_title = "Conversation so far:", "Related policy and past cases:"
+    turns: List[str] = []
+    history_tokens = 0
+    for turn in reversed(list(history)):
+        text = f"Applicant: {turn['query']}\nAssistant: {turn['answer']}"
+        cost = estimate_tokens("\n" + text) + (0 if turns else estimate_tokens("\n\n" + history_title))
+        if used + history_tokens + cost > budget:
+            break
+        turns.insert(0, text)
+        history_tokens += cost
+    used += history_tokens
+
+    cases: List[str] = []
+    related_tokens = 0
+    for text in related:
+        cost = estimate_tokens("\n" + text) + (0 if cases else estimate_tokens("\n\n" + related_title))
+        if used + related_tokens + cost > budget:
+            continue
+        cases.append(text)
+        related_tokens += cost
+
+    sections = [header]
+    if cases:
+        sections.append(related_title + "\n" + "\n".join(cases))
+    if turns:
+        sections.append(history_title + "\n" + "\n".join(turns))
+    sections.append(question)
+    prompt = "\n\n".join(sections)
+
+    tokens = estimate_tokens(prompt)
+    counts = {
+        "prompt_tokens": tokens,
+        "context_tokens": estimate_tokens(context),
+        "history_tokens": history_tokens,
+        "related_tokens": related_tokens,
+    }
+    prompt_tokens.observe(tokens)
+    prompt_usage.record(**counts)
+    if usage is not None:
+        usage.update(counts, budget=budget, history_turns=len(turns), dropped_turns=len(history) - len(turns),
+                     related_cases=len(cases), dropped_cases=len(related) - len(cases))
+    return prompt
+
+
+class ChatSessions:
+    """Recent turns of each chat, in SQLite so every API worker process sees the same conversation."""
+
+    def __init__(self, path: str = CHAT_DB_PATH, ttl: float = CHAT_SESSION_TTL, max_turns: int = CHAT_HISTORY_TURNS):
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_turns = max_turns
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def open(self, session_id: str = None, app_id: str = None) -> dict:
+        """The session, or a new one when `session_id` is missing, unknown or expired.
+
+        A session keeps the app_id it was opened with unless the question names one.
+        """
+        row = None
+        if session_id:
+            with self._lock:
+                row = self._conn.execute("SELECT * FROM chat_sessions WHERE session_id = ? AND updated_ts >= ?",
+                                         (session_id, time.time() - self.ttl)).fetchone()
+        if row is None:
+            return {"session_id": uuid.uuid4().hex, "app_id": app_id, "turns": [], "new": True}
+        return {"session_id": row["session_id"], "app_id": app_id or row["app_id"], "turns": json.loads(row["turns"]), "new": False}
+
+    def append(self, session: dict, query: str, answer: str):
+        turn = {"query": query, "answer": answer[:CHAT_TURN_MAX_CHARS]}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-read inside the transaction: another worker may have added a turn since open().
+                row = self._conn.execute("SELECT turns FROM chat_sessions WHERE session_id = ?", (session["session_id"],)).fetchone()
+                turns = (json.loads(row["turns"]) if row else []) + [turn]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO chat_sessions (session_id, app_id, turns, updated_ts) VALUES (?, ?, ?, ?)",
+                    (session["session_id"], session.get("app_id"), json.dumps(turns[-self.max_turns:]), time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def prune(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM chat_sessions WHERE updated_ts < ?", (time.time() - self.ttl,)).rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = self._conn.execute("SELECT COUNT(*) FROM chat_sessions WHERE updated_ts >= ?", (time.time() - self.ttl,)).fetchone()[0]
+        return {"active_sessions": active, "ttl_s": self.ttl, "max_turns": self.max_turns}
+
+
+_contexts: Optional[AppContextCache] = None
+_sessions: Optional[ChatSessions] = None
+_lock = threading.Lock()
+
+
+def get_app_contexts() -> AppContextCache:
+    """Process-wide context cache, evicted by the application store's writer thread."""
+    global _contexts
+    if _contexts is None:
+        with _lock:
+            if _contexts is None:
+                from backend.application_store import get_application_store
+
+                cache = AppContextCache()
+                get_application_store().add_listener(cache.invalidate)
+                _contexts = cache
+    return _contexts
+
+
+def get_chat_sessions() -> ChatSessions:
+    global _sessions
+    if _sessions is None:
+        with _lock:
+            if _sessions is None:
+                _sessions = ChatSessions()
+    return _sessions
+
+
+def chat_stats() -> dict:
+    return {
+        "token_budget": CHAT_PROMPT_TOKEN_BUDGET,
+        "tokens": prompt_usage.stats(),
+        "context_cache": get_app_contexts().stats(),
+        "sessions": get_chat_sessions().stats(),
+    }
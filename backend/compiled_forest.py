@@ -0,0 +1,173 @@
+import os
+import json
+import numpy as np
+from pathlib import Path
+from typing import Dict, List
+
+ARRAY_NAMES = [
+    "num_fill", "num_mean", "num_scale",
+    "feature", "threshold", "left", "right", "value", "roots",
+]
+
+
+def _unwrap_steps(transformer) -> dict:
+    steps = dict(transformer.steps) if hasattr(transformer, "steps") else {"only": transformer}
+    return {type(step).__name__: step for step in steps.values() if step not in (None, "passthrough")}
+
+
+def compile_pipeline(pipeline) -> "CompiledForest":
+    """Flatten a fitted preprocessor + RandomForestClassifier pipeline into contiguous arrays."""
+    preprocessor = pipeline.named_steps["preprocessor"]
+    classifier = pipeline.named_steps["classifier"]
+    if getattr(preprocessor, "remainder", "drop") != "drop":
+        raise ValueError("Only ColumnTransformer(remainder='drop') pipelines can be compiled")
+
+    num_features, num_fill, num_mean, num_scale = [], [], [], []
+    cat_features, cat_fill, cat_categories = [], [], []
+    for name, transformer, columns in preprocessor.transformers_:
+        if name == "remainder" or transformer == "drop":
+            continue
+        steps = _unwrap_steps(transformer)
+        unknown = set(steps) - {"SimpleImputer", "StandardScaler", "OneHotEncoder"}
+        if unknown:
+            raise ValueError(f"Cannot compile transformer steps {sorted(unknown)}")
+        imputer = steps.get("SimpleImputer")
+        if "OneHotEncoder" in steps:
+            encoder = steps["OneHotEncoder"]
+            if encoder.handle_unknown != "ignore" or encoder.drop is not None:
+                raise ValueError("Only OneHotEncoder(handle_unknown='ignore', drop=None) can be compiled")
+            for i, column in enumerate(columns):
+                cat_features.append(column)
+                cat_fill.append(str(imputer.statistics_[i]) if imputer is not None else None)
+                cat_categories.append([str(c) for c in encoder.categories_[i]])
+        else:
+            scaler = steps.get("StandardScaler")
+            for i, column in enumerate(columns):
+                num_features.append(column)
+                num_fill.append(imputer.statistics_[i] if imputer is not None else np.nan)
+                num_mean.append(scaler.mean_[i] if scaler is not None and scaler.with_mean else 0.0)
+                num_scale.append(scaler.scale_[i] if scaler is not None and scaler.with_std else 1.0)
+
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in classifier.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(tree.node_count)
+        # Leaves point at themselves so every row can take the same number of steps.
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        left.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+        right.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+        leaf_value = tree.value[:, 0, :]
+        value.append(leaf_value / np.maximum(leaf_value.sum(axis=1, keepdims=True), 1e-12))
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        "num_fill": np.asarray(num_fill, dtype=np.float64),
+        "num_mean": np.asarray(num_mean, dtype=np.float64),
+        "num_scale": np.asarray(num_scale, dtype=np.float64),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "value": np.concatenate(value).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.int32),
+    }
+    meta = {
+        "num_features": num_features,
+        "cat_features": cat_features,
+        "cat_fill": cat_fill,
+        "cat_categories": cat_categories,
+        "classes": [str(c) for c in classifier.classes_],
+        "max_depth": int(max_depth),
+        "n_trees": len(classifier.estimators_),
+    }
+    return CompiledForest(arrays, meta)
+
+
+class CompiledForest:
+    """Pandas-free evaluator for a compiled eligibility pipeline."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: dict):
+        self.arrays = arrays
+        self.meta = meta
+        self.classes = meta["classes"]
+        self.num_features = meta["num_features"]
+        self.cat_features = meta["cat_features"]
+        self._num_fill = arrays["num_fill"]
+        self._num_mean = arrays["num_mean"]
+        self._num_scale = arrays["num_scale"]
+        self._cat_index = [{c: i for i, c in enumerate(cats)} for cats in meta["cat_categories"]]
+        self._cat_width = sum(len(cats) for cats in meta["cat_categories"])
+        self._feature = arrays["feature"]
+        self._threshold = arrays["threshold"]
+        # children[2 * node + go_left] gives the next node in a single gather.
+        self._children = np.stack([arrays["right"], arrays["left"]], axis=1).ravel()
+        self._value = arrays["value"]
+        self._roots = arrays["roots"]
+        self._max_depth = meta["max_depth"]
+
+    def transform(self, rows: List[dict]) -> np.ndarray:
+        n = len(rows)
+        num = np.empty((n, len(self.num_features)), dtype=np.float64)
+        for r, row in enumerate(rows):
+            for c, name in enumerate(self.num_features):
+                v = row.get(name)
+                num[r, c] = np.nan if v is None else v
+        num = np.where(np.isnan(num), self._num_fill, num)
+        num = (num - self._num_mean) / self._num_scale
+
+        cat = np.zeros((n, self._cat_width), dtype=np.float64)
+        base = 0
+        for c, name in enumerate(self.cat_features):
+            index = self._cat_index[c]
+            fill = self.meta["cat_fill"][c]
+            for r, row in enumerate(rows):
+                # Like SimpleImputer, only NaN (or an absent key) is missing; None is an unknown category.
+                v = row.get(name, np.nan)
+                if isinstance(v, float) and np.isnan(v):
+                    v = fill
+                i = index.get(v if v is None else str(v))
+                if i is not None:
+                    cat[r, base + i] = 1.0
+            base += len(index)
+        # sklearn trees compare float32 features against float64 thresholds.
+        return np.hstack([num, cat]).astype(np.float32)
+
+    def predict_proba_matrix(self, x: np.ndarray) -> np.ndarray:
+        n, width = x.shape
+        n_trees = len(self._roots)
+        flat_x = np.ascontiguousarray(x, dtype=np.float32).ravel()
+        row_base = np.repeat(np.arange(n) * width, n_trees)
+        node = np.tile(self._roots, n)
+        for _ in range(self._max_depth):
+            go_left = flat_x[row_base + self._feature[node]] <= self._threshold[node]
+            node = self._children[2 * node + go_left]
+        return self._value[node.reshape(n, n_trees)].mean(axis=1)
+
+    def predict_proba(self, rows: List[dict]) -> np.ndarray:
+        return self.predict_proba_matrix(self.transform(rows))
+
+    def save(self, directory: str):
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(path / f"{name}.npy", np.ascontiguousarray(self.arrays[name]))
+        with open(path / "meta.json", "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = None) -> "CompiledForest":
+        path = Path(directory)
+        with open(path / "meta.json") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls(arrays, meta)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "meta.json"))
@@ -0,0 +1,142 @@
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Tuple
+from backend import tracing
+from backend.ocr import warm_ocr
+
+# Each pipeline stage runs on its own executor so a slow OCR job or Gemini call
+# never blocks the event loop. Kinds: "process", "thread" or "inline".
+EXTRACTION_EXECUTOR = os.getenv("EXTRACTION_EXECUTOR", "process")
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+LLM_EXECUTOR = os.getenv("LLM_EXECUTOR", "thread")
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", 8))
+MODEL_EXECUTOR = os.getenv("MODEL_EXECUTOR", "inline")
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", 1))
+# Seconds a warm-up waits for every worker of a stage to have started.
+EXECUTOR_WARMUP_TIMEOUT = float(os.getenv("EXECUTOR_WARMUP_TIMEOUT", 120))
+
+
+def _on_worker(fn: Callable, hold: float) -> Tuple[Hashable, object]:
+    result = fn()
+    # Keep this worker busy for a moment, so the other calls of the round go to workers that have not answered yet.
+    time.sleep(hold)
+    return (os.getpid(), threading.get_ident()), result
+
+
+class StageExecutor:
+    def __init__(self, name: str, kind: str, max_workers: int, initializer: Callable = None):
+        if kind not in ("process", "thread", "inline"):
+            raise ValueError(f"Unknown executor kind '{kind}' for stage '{name}'")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        # Runs once in each worker process or thread as it starts.
+        self.initializer = initializer
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.kind == "process":
+                # spawn, not fork: the parent holds gRPC state from genai.configure
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"), initializer=self.initializer)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name, initializer=self.initializer)
+        return self._pool
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        self.queued += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        queue_wait.observe(time.perf_counter() - queued_at, stage=self.name)
+        self.running += 1
+        try:
+            # Worker threads and processes do not see the request's trace, so
+            # spans are collected there and merged back here.
+            if self.kind == "inline":
+                result, spans, error = tracing.run_traced(fn, args, kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                result, spans, error = await loop.run_in_executor(self._get_pool(), partial(tracing.run_traced, fn, args, kwargs))
+            tracing.absorb(spans)
+            if error is not None:
+                raise error
+            return result
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def run_on_every_worker(self, fn: Callable, timeout: float = EXECUTOR_WARMUP_TIMEOUT) -> Dict[Hashable, object]:
+        """Call `fn` until each of the stage's workers has run it, which also starts them all.
+
+        Pools start workers on demand, one per call that finds none idle, so
+        rounds of `max_workers` calls bring up the whole pool. Returns the
+        result per worker; fewer than `max_workers` entries means some had
+        not answered by `timeout`.
+        """
+        workers = 1 if self.kind == "inline" else self.max_workers
+        hold = 0.0 if self.kind == "inline" else 0.05
+        results = {}
+        deadline = time.monotonic() + timeout
+        while len(results) < workers and time.monotonic() < deadline:
+            for worker, result in await asyncio.gather(*(self.run(_on_worker, fn, hold) for _ in range(workers))):
+                results.setdefault(worker, result)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "queue_depth": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "saturated": self.running >= self.max_workers,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class ExecutorRegistry:
+    def __init__(self):
+        self.stages: Dict[str, StageExecutor] = {
+            # Extraction workers load their OCR engines as they start, not on a request.
+            "extraction": StageExecutor("extraction", EXTRACTION_EXECUTOR, EXTRACTION_WORKERS, initializer=warm_ocr),
+            "llm": StageExecutor("llm", LLM_EXECUTOR, LLM_WORKERS),
+            "model": StageExecutor("model", MODEL_EXECUTOR, MODEL_WORKERS),
+        }
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs):
+        return await self.stages[stage].run(fn, *args, **kwargs)
+
+    def stats(self) -> dict:
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+    def shutdown(self):
+        for stage in self.stages.values():
+            stage.shutdown()
+
+
+executors = ExecutorRegistry()
+
+queue_wait = tracing.metrics.histogram("executor_queue_wait_seconds", "Time a call waited for a free worker on each stage executor.", ("stage",))
+tracing.metrics.gauge("executor_queue_depth", "Calls waiting for a worker on each stage executor.", ("stage",),
+                      collect=lambda: {(name,): stage.queued for name, stage in executors.stages.items()})
+tracing.metrics.gauge("executor_running", "Calls running on each stage executor.", ("stage",),
+                      collect=lambda: {(name,): stage.running for name, stage in executors.stages.items()})
+tracing.metrics.gauge("executor_max_workers", "Worker slots on each stage executor.", ("stage",),
+                      collect=lambda: {(name,): stage.max_workers for name, stage in executors.stages.items()})
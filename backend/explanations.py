@@ -0,0 +1,110 @@
+import os
+import re
+import json
+from typing import List, Optional
+
+from backend import tracing
+from backend.latency import LatencyRecorder
+
+# "template" renders decision explanations locally; "llm" asks Gemini unless the caller says otherwise.
+EXPLAIN_MODE = os.getenv("EXPLAIN_MODE", "template")
+# Applications explained per Gemini request when prose is requested for a batch.
+EXPLAIN_LLM_BATCH_SIZE = int(os.getenv("EXPLAIN_LLM_BATCH_SIZE", 20))
+
+HEADLINES = {
+    "approve": "Your application has been approved for social support.",
+    "soft-decline": "Your application was not approved this time, but it is close to the eligibility threshold.",
+    "reject": "Your application was not approved for social support.",
+}
+REASON_TEXT = {
+    "meets_income_threshold": "your reported income is within the program's threshold",
+    "low_per_capita_income": "your income per family member is low",
+    "marginal_income": "your income per family member is just above the level the program supports",
+    "sufficient_income": "your income per family member is above the level the program supports",
+}
+RECOMMENDATION_TEXT = {
+    "upskill": "An upskilling or training program can raise your income over time.",
+    "job_match": "Our job-matching service can connect you with suitable openings.",
+    "counseling": "A career counseling session can help you strengthen a future application.",
+}
+NEXT_STEPS = {
+    "approve": "We will contact you about the next steps for receiving support.",
+    "soft-decline": "If your income drops or your family grows, you are welcome to apply again.",
+    "reject": "If your circumstances change, you are welcome to apply again.",
+}
+
+explanations_total = tracing.metrics.counter("explanations_total", "Decision explanations produced, by source (template, llm, or template fallback after a failed LLM call).", ("source",))
+explanation_llm_calls = tracing.metrics.counter("explanation_llm_calls_total", "Gemini requests made to explain decisions; a batch of applications is one request.", ("mode",))
+explanation_seconds = tracing.metrics.histogram("explanation_duration_seconds", "Time to explain one decision (a batched request's time is split across its applications).", ("source",))
+explanation_latency = {source: LatencyRecorder(fields=("ms",)) for source in ("template", "llm", "llm_batch")}
+
+
+def record(source: str, seconds: float, n: int = 1):
+    per_item = seconds / max(1, n)
+    for _ in range(n):
+        explanation_latency[source].record(ms=per_item * 1e3)
+        explanation_seconds.observe(per_item, source=source)
+
+
+def explanation_stats() -> dict:
+    return {
+        "mode": EXPLAIN_MODE,
+        "llm_calls": {mode: explanation_llm_calls.value(mode=mode) for mode in ("single", "batch")},
+        "explanations": {source: explanations_total.value(source=source) for source in ("template", "llm", "fallback")},
+        "latency": {source: recorder.stats() for source, recorder in explanation_latency.items()},
+    }
+
+
+def _join(parts: List[str]) -> str:
+    if len(parts) < 2:
+        return "".join(parts)
+    return ", ".join(parts[:-1]) + " and " + parts[-1]
+
+
+def render_explanation(decision: str, score: float, reasons: List[str], recommendations: List[str], validation_report: Optional[dict] = None) -> str:
+    """Plain-language explanation of a decision, built from fixed sentences in a few microseconds."""
+    sentences = [HEADLINES.get(decision, f"Your application was assessed with the result: {decision}.")]
+    because = [REASON_TEXT.get(r, r.replace("_", " ")) for r in reasons]
+    if because:
+        sentences.append(f"This is because {_join(because)}.")
+    if score is not None:
+        sentences.append(f"The assessment is {round(score * 100)}% confident in this outcome.")
+    report = validation_report or {}
+    if report.get("conflicts"):
+        sentences.append(f"We also found differences in your documents ({'; '.join(map(str, report['conflicts']))}); correcting them may change the outcome.")
+    elif report.get("address_match") is False or report.get("income_match") is False:
+        field = "address" if report.get("address_match") is False else "income"
+        sentences.append(f"The {field} on your form did not match your documents; please check it.")
+    sentences.extend(RECOMMENDATION_TEXT.get(r, f"Recommended: {r.replace('_', ' ')}.") for r in recommendations)
+    if decision in NEXT_STEPS:
+        sentences.append(NEXT_STEPS[decision])
+    return " ".join(sentences)
+
+
+def describe(app_id, decision: str, score: float, recommendations: List[str], validation_report: dict) -> str:
+    """The facts the LLM gets about one application."""
+    return (f"Application {app_id}: decision {decision} (confidence {round(score, 2)}); "
+            f"recommendations: {', '.join(recommendations) if recommendations else 'none'}; validation: {validation_report}")
+
+
+def batch_prompt(descriptions: List[str]) -> str:
+    numbered = "\n".join(f"{i}. {d}" for i, d in enumerate(descriptions, start=1))
+    return (
+        "Each line below is the result of a social support application. For each one, explain in simple language "
+        "what it means for the applicant, including any suggestions to improve their eligibility.\n"
+        f"{numbered}\n"
+        f"Answer with only a JSON array of {len(descriptions)} strings, one explanation per application, in the same order."
+    )
+
+
+def parse_batch(text: str, n: int) -> List[Optional[str]]:
+    """The explanations from a batched answer; None where one is missing or the answer is not a usable array."""
+    match = re.search(r"\[.*\]", text or "", re.S)
+    try:
+        items = json.loads(match.group(0)) if match else None
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        return [None] * n
+    items = [item.strip() if isinstance(item, str) and item.strip() else None for item in items[:n]]
+    return items + [None] * (n - len(items))
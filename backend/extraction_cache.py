@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "data/cache/extraction")
+CACHE_MEMORY_ITEMS = int(os.getenv("EXTRACTION_CACHE_MEMORY_ITEMS", 256))
+CACHE_DISK_BYTES = int(os.getenv("EXTRACTION_CACHE_DISK_BYTES", 256 * 1024 * 1024))
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Two-tier cache of per-document extraction results keyed by content hash.
+
+    Lookups never touch the counters; callers report the tier each document was
+    served from via `record`, because extraction may run in a worker process.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, memory_items: int = CACHE_MEMORY_ITEMS, disk_bytes: int = CACHE_DISK_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_used = None
+        self.counters = {"memory": 0, "disk": 0, "miss": 0, "evicted": 0}
+
+    def key(self, file_path: str, kind: str, version: str, digest: str = None) -> str:
+        """`digest` skips re-reading the file when the caller hashed it while writing it."""
+        return f"{digest or file_sha256(file_path)}-{kind}-v{version}"
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str, memory: bool = True) -> Tuple[Optional[dict], str]:
+        with self._lock:
+            if memory and key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key], "memory"
+
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None, "miss"
+        self._remember(key, entry)
+        return entry, "disk"
+
+    def put(self, key: str, entry: dict):
+        self._remember(key, entry)
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            try:
+                # Overwriting an entry (e.g. once its LLM fields resolve) frees the old file's bytes.
+                replaced = path.stat().st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp, path)
+            self._account(path.stat().st_size - replaced)
+        except OSError as e:
+            print(f"[WARN] Could not write extraction cache entry {key}: {e}")
+
+    def _remember(self, key: str, entry: dict):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _account(self, delta: int):
+        with self._lock:
+            if self._disk_used is None:
+                self._disk_used = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.json"))
+            else:
+                self._disk_used += delta
+            if self._disk_used > self.disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Other workers share the directory, so re-scan instead of trusting the running total.
+        entries = []
+        for p in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = p.stat()
+                entries.append((stat.st_mtime, stat.st_size, p))
+            except OSError:
+                continue
+        entries.sort()
+        used = sum(size for _, size, _ in entries)
+        target = int(self.disk_bytes * 0.9)
+        for _, size, p in entries:
+            if used <= target:
+                break
+            try:
+                p.unlink()
+                used -= size
+                self.counters["evicted"] += 1
+            except OSError:
+                continue
+        self._disk_used = used
+
+    def record(self, documents: list):
+        with self._lock:
+            for doc in documents:
+                tier = doc.get("cache")
+                if tier in self.counters:
+                    self.counters[tier] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters["memory"] + self.counters["disk"] + self.counters["miss"]
+            hits = self.counters["memory"] + self.counters["disk"]
+            return {
+                "memory_hits": self.counters["memory"],
+                "disk_hits": self.counters["disk"],
+                "misses": self.counters["miss"],
+                "evicted": self.counters["evicted"],
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_used,
+            }
+
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,407 @@
+import os
+import json
+import math
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from backend import tracing
+from backend.application_store import utc_now
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "data/jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# Queued plus running jobs; /predict answers 429 beyond this.
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", 100))
+# A job that was running when the process died is retried this many times in total, then marked failed.
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+# Finished jobs (and their results) are kept this long for /jobs/{id}.
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", 24 * 3600))
+# A running job's lease is renewed while its worker is alive; once it lapses another worker may take the job over.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 30))
+# A resubmission with the same idempotency key within this many seconds gets the original job instead of a new one.
+JOB_IDEMPOTENCY_WINDOW = float(os.getenv("JOB_IDEMPOTENCY_WINDOW", 3600))
+# Assumed job duration for Retry-After until a job has actually finished.
+JOB_DEFAULT_SECONDS = float(os.getenv("JOB_DEFAULT_SECONDS", 10))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    app_id TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    finished_ts REAL,
+    lease_expires REAL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    idempotency_key TEXT,
+    request_hash TEXT,
+    key_expires REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+# Added after the first release; databases created before them are migrated on open.
+LATER_COLUMNS = {"lease_expires": "REAL", "idempotency_key": "TEXT", "request_hash": "TEXT", "key_expires": "REAL"}
+
+job_counts = tracing.metrics.counter("jobs_total", "Jobs by how they ended (or were accepted, rejected, or answered by an earlier identical job).", ("status",))
+job_wait = tracing.metrics.histogram("job_queue_wait_seconds", "Time a job spent queued before a worker picked it up.")
+job_seconds = tracing.metrics.histogram("job_duration_seconds", "Time a worker spent running a job.")
+
+
+class QueueFull(Exception):
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Job queue is full ({depth} jobs waiting or running)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class IdempotencyConflict(Exception):
+    """The idempotency key was already used for a different request."""
+
+
+class JobQueue:
+    """Persistent job queue in SQLite, drained by asyncio workers in this process.
+
+    Jobs survive a restart: anything still queued is picked up again, and a job
+    that was running when the process stopped is queued again until it has
+    been attempted JOB_MAX_ATTEMPTS times. Several processes may share one
+    database; a job whose worker died is taken over once its lease lapses.
+    A job submitted with an idempotency key stands in for every later
+    submission with that key while it is pending or, once done, for
+    JOB_IDEMPOTENCY_WINDOW seconds; a failed job does not.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH, max_depth: int = JOB_QUEUE_MAX_DEPTH, workers: int = JOB_WORKERS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, retention: float = JOB_RETENTION):
+        self.path = str(path)
+        self.max_depth = max_depth
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.retention = retention
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in LATER_COLUMNS.items():
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_idempotency_key ON jobs (idempotency_key)")
+        # One connection, so every statement is serialized; they are all single-row and short.
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._avg_seconds = None
+        self.recovered = 0
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        """Run one write statement; returns the number of rows it changed."""
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    # Rows are fetched while the lock is held: the cursor shares the connection with every other thread.
+    def _fetchone(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _depth_by_status(self) -> dict:
+        rows = self._fetchall("SELECT status, COUNT(*) AS n FROM jobs WHERE status IN (?, ?) GROUP BY status", (QUEUED, RUNNING))
+        counts = {(QUEUED,): 0.0, (RUNNING,): 0.0}
+        counts.update({(row["status"],): float(row["n"]) for row in rows})
+        return counts
+
+    def depth(self) -> int:
+        return self._fetchone("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING))[0]
+
+    def retry_after(self, depth: int = None) -> int:
+        """Seconds until a slot is likely to free up, for the Retry-After header."""
+        depth = self.depth() if depth is None else depth
+        per_job = self._avg_seconds or JOB_DEFAULT_SECONDS
+        return max(1, min(600, math.ceil(per_job * max(1, depth - self.max_depth + 1) / self.workers)))
+
+    def check_capacity(self):
+        """Raise QueueFull now, so a caller can refuse work before accepting uploads for it."""
+        depth = self.depth()
+        if depth >= self.max_depth:
+            job_counts.inc(status="rejected")
+            raise QueueFull(depth, self.retry_after(depth))
+
+    def _duplicate(self, idempotency_key: str, request_hash: str = None) -> Optional[sqlite3.Row]:
+        row = self._conn.execute(
+            "SELECT * FROM jobs WHERE idempotency_key = ? AND (status IN (?, ?) OR (status = ? AND key_expires > ?)) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (idempotency_key, QUEUED, RUNNING, DONE, time.time()),
+        ).fetchone()
+        if row is not None and request_hash is not None and row["request_hash"] not in (None, request_hash):
+            raise IdempotencyConflict(f"Idempotency key was already used for a different request (job {row['job_id']})")
+        return row
+
+    def find(self, idempotency_key: str, request_hash: str = None) -> Optional[dict]:
+        """The job that stands for this key: pending, or done within the window; None if there is none."""
+        with self._lock:
+            row = self._duplicate(idempotency_key, request_hash)
+        return self.get(row["job_id"]) if row is not None else None
+
+    def submit(self, payload: dict, app_id: str = None, idempotency_key: str = None, request_hash: str = None,
+               window: float = None, run_here: bool = False) -> dict:
+        """Queue a job; with an idempotency key, an existing job for it is returned instead (marked `duplicate`).
+
+        With `run_here` the job is created already running, leased to the
+        caller, who must then run it with `run_reserved`. Duplicates from any
+        process see it from the moment it is committed.
+        """
+        job_id = f"job_{uuid.uuid4().hex[:12]}"
+        window = JOB_IDEMPOTENCY_WINDOW if window is None else window
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Looked up inside the write transaction, so concurrent duplicates from any process collapse into one job.
+                existing = self._duplicate(idempotency_key, request_hash) if idempotency_key else None
+                if existing is None:
+                    # Counted inside the write transaction, so concurrent submits cannot overshoot the bound.
+                    depth = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchone()[0]
+                    if depth >= self.max_depth:
+                        self._conn.execute("ROLLBACK")
+                        job_counts.inc(status="rejected")
+                        raise QueueFull(depth, self.retry_after(depth))
+                    self._conn.execute(
+                        "INSERT INTO jobs (job_id, app_id, status, attempts, created_at, started_at, lease_expires, payload, "
+                        "idempotency_key, request_hash, key_expires) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, app_id, RUNNING if run_here else QUEUED, int(run_here), utc_now(), utc_now() if run_here else None,
+                         now + JOB_LEASE_SECONDS if run_here else None, json.dumps(payload), idempotency_key, request_hash, now + window),
+                    )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            except IdempotencyConflict:
+                self._conn.execute("ROLLBACK")
+                raise
+        if existing is not None:
+            job_counts.inc(status="deduplicated")
+            return {**self.get(existing["job_id"]), "duplicate": True}
+        job_counts.inc(status="accepted")
+        if run_here:
+            return {"job_id": job_id, "app_id": app_id, "status": RUNNING, "position": None}
+        self._wake()
+        return {"job_id": job_id, "app_id": app_id, "status": QUEUED, "position": depth + 1}
+
+    def _wake(self):
+        if self._wakeup is not None:
+            # Called from threadpool threads; asyncio.Event is only safe to set from its loop.
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _to_dict(self, row: sqlite3.Row, position: int = None) -> dict:
+        job = {k: row[k] for k in ("job_id", "app_id", "status", "attempts", "created_at", "started_at", "finished_at", "error")}
+        job["result"] = json.loads(row["result"]) if row["result"] else None
+        if position is not None:
+            job["position"] = position
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._fetchone("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        if row is None:
+            return None
+        position = None
+        if row["status"] == QUEUED:
+            position = self._fetchone("SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at <= ?", (QUEUED, row["created_at"]))[0]
+        return self._to_dict(row, position)
+
+    def recover(self) -> int:
+        """Queue again the jobs a previous process left running; give up on those out of attempts."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, finished_ts = ?, error = ? WHERE status = ? AND attempts >= ?",
+                (FAILED, utc_now(), time.time(), "Interrupted too many times; giving up", RUNNING, self.max_attempts),
+            )
+            self.recovered = self._conn.execute("UPDATE jobs SET status = ?, started_at = NULL, lease_expires = NULL WHERE status = ?", (QUEUED, RUNNING)).rowcount
+        if self.recovered:
+            print(f"[WARN] Resuming {self.recovered} job(s) interrupted by the last shutdown")
+        return self.recovered
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A running job with a lapsed lease belongs to a worker process that died.
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, finished_ts = ?, error = ? WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                    (FAILED, utc_now(), now, "Interrupted too many times; giving up", RUNNING, now, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_expires = ? WHERE job_id = ?",
+                        (RUNNING, utc_now(), now + JOB_LEASE_SECONDS, row["job_id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _finish(self, job_id: str, status: str, result: dict = None, error: str = None):
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, finished_ts = ? WHERE job_id = ?",
+            (status, json.dumps(result) if result is not None else None, error, utc_now(), time.time(), job_id),
+        )
+        job_counts.inc(status=status)
+
+    def _renew(self, job_id: str):
+        self._execute("UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND status = ?", (time.time() + JOB_LEASE_SECONDS, job_id, RUNNING))
+
+    async def _keep_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self._renew, job_id)
+            except sqlite3.Error as e:
+                print(f"[WARN] Could not renew the lease on {job_id}: {e}")
+
+    def _release(self, job_id: str):
+        # Shutdown, not a failure: the attempt does not count against the job.
+        self._execute("UPDATE jobs SET status = ?, attempts = attempts - 1, started_at = NULL, lease_expires = NULL WHERE job_id = ?", (QUEUED, job_id))
+
+    async def run_reserved(self, job_id: str, handler: Callable[[dict], Awaitable[dict]], payload: dict) -> dict:
+        """Run a job reserved with `submit(run_here=True)` in the calling task and return its result.
+
+        The lease is kept while it runs. If the caller is cancelled the job goes
+        back to the queue for a worker; if this process dies, the lapsed lease
+        lets a worker anywhere take it over.
+        """
+        start = time.perf_counter()
+        lease = asyncio.create_task(self._keep_lease(job_id))
+        try:
+            result = await handler(payload)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self._release, job_id)
+            self._wake()
+            raise
+        except Exception as e:
+            await asyncio.to_thread(self._finish, job_id, FAILED, error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            lease.cancel()
+            job_seconds.observe(time.perf_counter() - start)
+        await asyncio.to_thread(self._finish, job_id, DONE, result=result)
+        return result
+
+    def prune(self) -> int:
+        """Delete finished jobs older than the retention period; returns how many were removed."""
+        return self._execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_ts < ?", (DONE, FAILED, time.time() - self.retention))
+
+    async def _run(self, row: sqlite3.Row, handler: Callable[[dict], Awaitable[dict]]):
+        job_wait.observe(max(0.0, time.time() - datetime.fromisoformat(row["created_at"]).timestamp()))
+        start = time.perf_counter()
+        lease = asyncio.create_task(self._keep_lease(row["job_id"]))
+        with tracing.start_trace("job predict", row["app_id"]) as trace:
+            # The bookkeeping writes go to a thread: another process may hold the database's write lock.
+            try:
+                result = await handler(json.loads(row["payload"]))
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self._release, row["job_id"])
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self._finish, row["job_id"], FAILED, error=f"{type(e).__name__}: {e}")
+            else:
+                await asyncio.to_thread(self._finish, row["job_id"], DONE, result=result)
+            finally:
+                lease.cancel()
+                elapsed = time.perf_counter() - start
+                job_seconds.observe(elapsed)
+                self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+                tracing.slow_requests.maybe_record(trace, elapsed * 1e3, method="JOB", route="/predict", job_id=row["job_id"])
+
+    async def _worker(self, handler: Callable[[dict], Awaitable[dict]]):
+        while True:
+            # Cleared before looking, so a submit that lands in between still wakes this worker.
+            self._wakeup.clear()
+            try:
+                row = await asyncio.to_thread(self.claim)
+            except sqlite3.Error as e:
+                print(f"[WARN] Could not claim a job: {e}")
+                row = None
+            if row is None:
+                try:
+                    # Polling as well covers jobs submitted by another process sharing the database.
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(row, handler)
+
+    def start(self, handler: Callable[[dict], Awaitable[dict]], recover: bool = True):
+        """Start the workers on the running event loop, first resuming interrupted jobs.
+
+        Pass recover=False when sibling processes share the database: their
+        running jobs are not interrupted, and lapsed leases cover the ones that are.
+        """
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        if recover:
+            self.recover()
+        self._tasks = [asyncio.create_task(self._worker(handler), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        counts = {row["status"]: row["n"] for row in self._fetchall("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        return {
+            "workers": self.workers,
+            "running_workers": sum(not t.done() for t in self._tasks),
+            "max_depth": self.max_depth,
+            "depth": counts.get(QUEUED, 0) + counts.get(RUNNING, 0),
+            "counts": counts,
+            "avg_job_seconds": round(self._avg_seconds, 3) if self._avg_seconds is not None else None,
+            "recovered": self.recovered,
+            "deduplicated": job_counts.value(status="deduplicated"),
+        }
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+
+tracing.metrics.gauge(
+    "job_queue_depth", "Jobs waiting or running, by status.", ("status",),
+    collect=lambda: _queue._depth_by_status() if _queue is not None else {},
+)
@@ -0,0 +1,36 @@
+import os
+import threading
+from collections import deque
+import numpy as np
+
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", 1000))
+
+
+class LatencyRecorder:
+    """Rolling per-request timings for one endpoint, e.g. time-to-first-token and total."""
+
+    def __init__(self, fields=("ttft_ms", "total_ms"), window: int = LATENCY_WINDOW):
+        self.fields = tuple(fields)
+        self._samples = {field: deque(maxlen=window) for field in self.fields}
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, **timings):
+        with self._lock:
+            self.count += 1
+            for field, value in timings.items():
+                if field in self._samples and value is not None:
+                    self._samples[field].append(float(value))
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = {field: list(values) for field, values in self._samples.items()}
+            result = {"requests": self.count}
+        for field, values in samples.items():
+            if values:
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                result[field] = {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2), "samples": len(values)}
+        return result
+
+
+explain_latency = {"stream": LatencyRecorder(), "blocking": LatencyRecorder()}
@@ -0,0 +1,274 @@
+import os
+import re
+import csv
+import zipfile
+import tempfile
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+# Malformed rows kept with their details; the rest are only counted.
+LEDGER_MAX_ISSUES = int(os.getenv("LEDGER_MAX_ISSUES", 20))
+# Bytes of shared-string text held in memory; a larger table is moved to a temporary file.
+LEDGER_STRINGS_IN_MEMORY = int(os.getenv("LEDGER_STRINGS_IN_MEMORY", 8 * 1024 * 1024))
+
+TYPES = {"asset": "asset", "assets": "asset", "liability": "liability", "liabilities": "liability"}
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NUMBER = re.compile(r"^\(?-?[\d,]*\.?\d+\)?$")
+
+
+class LedgerSummary:
+    """Totals of an assets/liabilities sheet, read in one pass."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = "csv" if path.lower().endswith(".csv") else "xlsx"
+        self.assets = 0.0
+        self.liabilities = 0.0
+        self.categories: Dict[str, Dict[str, float]] = {"asset": {}, "liability": {}}
+        self.rows = 0
+        self.malformed = 0
+        self.issues: List[dict] = []
+        self.error = None
+
+    def add(self, kind: str, category: str, value: float):
+        if kind == "asset":
+            self.assets += value
+        else:
+            self.liabilities += value
+        subtotals = self.categories[kind]
+        subtotals[category] = subtotals.get(category, 0.0) + value
+
+    def reject(self, row: int, reason: str, values: tuple):
+        self.malformed += 1
+        if len(self.issues) < LEDGER_MAX_ISSUES:
+            self.issues.append({"row": row, "reason": reason, "values": [None if v is None else str(v) for v in values]})
+
+    def to_dict(self) -> dict:
+        return {
+            "format": self.format,
+            "assets": self.assets,
+            "liabilities": self.liabilities,
+            "categories": self.categories,
+            "rows": self.rows,
+            "malformed": self.malformed,
+            "issues": self.issues,
+            "error": self.error,
+        }
+
+
+def _column_index(ref: str) -> int:
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - 64
+    return index - 1
+
+
+def _first_sheet(zf: zipfile.ZipFile) -> str:
+    """Archive path of the workbook's first sheet, which is what pd.read_excel used to read."""
+    sheet = ElementTree.fromstring(zf.read("xl/workbook.xml")).find(f"{NS}sheets/{NS}sheet")
+    rel_id = sheet.get(f"{REL_NS}id")
+    for rel in ElementTree.fromstring(zf.read("xl/_rels/workbook.xml.rels")):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    raise KeyError(f"no part for sheet relationship {rel_id}")
+
+
+class _SharedStrings:
+    """The workbook's shared-string table, looked up by index.
+
+    Cells refer to text by its position in this table, so every entry has to
+    be kept. Up to LEDGER_STRINGS_IN_MEMORY bytes it is a plain list; past
+    that the text moves to a temporary file and only an 8-byte offset per
+    string stays in memory.
+    """
+
+    def __init__(self, limit: int = None):
+        self.limit = LEDGER_STRINGS_IN_MEMORY if limit is None else limit
+        self._strings: List[str] = []
+        self._size = 0
+        self._file = None
+        self._offsets = array("q", [0])
+
+    def __len__(self):
+        return len(self._offsets) - 1 if self._file else len(self._strings)
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def append(self, text: str):
+        if self._file is None:
+            self._strings.append(text)
+            self._size += len(text)
+            if self._size > self.limit:
+                self._spill()
+            return
+        data = text.encode()
+        self._file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def _spill(self):
+        self._file = tempfile.TemporaryFile()
+        strings, self._strings = self._strings, []
+        for text in strings:
+            self.append(text)
+
+    def __getitem__(self, index: int) -> str:
+        if self._file is None:
+            return self._strings[index]
+        if index < 0:
+            raise IndexError(index)
+        start, end = self._offsets[index], self._offsets[index + 1]
+        self._file.seek(start)
+        return self._file.read(end - start).decode()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> _SharedStrings:
+    strings = _SharedStrings()
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return strings
+    root = None
+    with zf.open("xl/sharedStrings.xml") as f:
+        for event, elem in ElementTree.iterparse(f, events=("start", "end")):
+            if event == "start":
+                root = elem if root is None else root
+            elif elem.tag == f"{NS}si":
+                # Rich text is split over several runs; phonetic hints (rPh) are not part of the value.
+                phonetic = {t for ph in elem.iter(f"{NS}rPh") for t in ph.iter(f"{NS}t")}
+                strings.append("".join(t.text or "" for t in elem.iter(f"{NS}t") if t not in phonetic))
+                root.clear()
+    return strings
+
+
+def _cell_value(cell, strings: _SharedStrings):
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        return "".join(t.text or "" for t in cell.iter(f"{NS}t"))
+    v = cell.find(f"{NS}v")
+    if v is None or v.text is None:
+        return None
+    if kind == "s":
+        return strings[int(v.text)]
+    if kind == "b":
+        return v.text == "1"
+    if kind == "n":
+        return int(v.text) if v.text.lstrip("-").isdigit() else float(v.text)
+    # "str" (formula result), "e" (error such as #DIV/0!) and "d" (ISO date) stay text.
+    return v.text
+
+
+def _xlsx_rows(path: str) -> Iterator[Tuple[int, tuple]]:
+    # Reads the sheet XML directly: openpyxl's read-only mode leaves every parsed
+    # row attached to the tree, so its memory still grows with the sheet.
+    with zipfile.ZipFile(path) as zf:
+        strings = _shared_strings(zf)
+        with strings, zf.open(_first_sheet(zf)) as f:
+            sheet_data = None
+            number = 0
+            for event, elem in ElementTree.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == f"{NS}sheetData":
+                        sheet_data = elem
+                    continue
+                if elem.tag != f"{NS}row":
+                    continue
+                number = int(elem.get("r", number + 1))
+                values, column = [], -1
+                for cell in elem.iter(f"{NS}c"):
+                    ref = cell.get("r")
+                    column = _column_index(ref) if ref else column + 1
+                    values.extend([None] * (column - len(values)))
+                    values.append(_cell_value(cell, strings))
+                yield number, tuple(values)
+                # Drop finished rows so only the current one is ever in memory.
+                if sheet_data is not None:
+                    sheet_data.clear()
+
+
+def _csv_rows(path: str) -> Iterator[Tuple[int, tuple]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for number, row in enumerate(csv.reader(f), start=1):
+            yield number, tuple(row)
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value == value else None
+    if isinstance(value, str):
+        text = value.strip().upper().replace("AED", "").replace("DHS", "").strip()
+        if NUMBER.match(text):
+            negative = text.startswith("(") and text.endswith(")")
+            amount = float(text.strip("()").replace(",", ""))
+            return -amount if negative else amount
+    return None
+
+
+def _cell(values: tuple, i: Optional[int]):
+    return values[i] if i is not None and i < len(values) else None
+
+
+def _columns(header: tuple) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    names = [str(h).strip().lower() if h is not None else "" for h in header]
+
+    def find(name):
+        return names.index(name) if name in names else None
+
+    return find("type"), find("value"), find("category")
+
+
+def parse_ledger(path: str) -> LedgerSummary:
+    """Sum assets and liabilities from an .xlsx or .csv sheet with Type and Value columns (Category optional).
+
+    Memory use does not depend on the number of rows: only the totals,
+    per-category subtotals and the first LEDGER_MAX_ISSUES bad rows are kept.
+    """
+    summary = LedgerSummary(path)
+    rows = _csv_rows(path) if summary.format == "csv" else _xlsx_rows(path)
+    columns = None
+    try:
+        for number, values in rows:
+            if not any(v is not None and str(v).strip() for v in values):
+                continue
+            if columns is None:
+                columns = _columns(values)
+                if columns[0] is None or columns[1] is None:
+                    summary.error = "header row needs Type and Value columns"
+                    break
+                continue
+            type_col, value_col, category_col = columns
+            summary.rows += 1
+            kind = TYPES.get(str(_cell(values, type_col) or "").strip().lower())
+            if kind is None:
+                summary.reject(number, "unknown type", values)
+                continue
+            value = _number(_cell(values, value_col))
+            if value is None:
+                summary.reject(number, "value is not a number", values)
+                continue
+            category = str(_cell(values, category_col) or "").strip() or "uncategorized"
+            summary.add(kind, category, value)
+    except Exception as e:
+        # Totals up to the failure are kept; the caller sees the error next to them.
+        summary.error = f"{type(e).__name__}: {e}"
+    finally:
+        rows.close()
+    if columns is None and summary.error is None:
+        summary.error = "sheet is empty"
+    return summary
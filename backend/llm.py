@@ -0,0 +1,488 @@
+import os
+import re
+import json
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, Optional
+from dotenv import load_dotenv
+
+from backend import tracing
+
+load_dotenv()
+
+# "gemini", or "stub" for the offline model below (tests, benchmarks, running without an API key).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# Gemini requests in flight at once from this process; callers beyond it wait (within their deadline).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+# Seconds one attempt may take before it is abandoned.
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 20))
+# Extra attempts after a timeout, rate limit or 5xx; other errors are not retried.
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 2))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.25))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 4))
+# Consecutive transient failures that open the circuit, and seconds it stays open before one trial call.
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30))
+# Send a second copy of a request still unanswered after this many seconds and take whichever answers first; 0 disables.
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 0))
+# Seconds one /predict may wait on the LLM, from extraction through the explanation; once it is spent the
+# decision goes out with the template explanation. 0 disables.
+LLM_REQUEST_BUDGET = float(os.getenv("LLM_REQUEST_BUDGET", 15))
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", 0))
+LLM_STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", 0))
+
+# Status codes (HTTP, as google.api_core exceptions carry them) worth another attempt.
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+llm_requests = tracing.metrics.counter("llm_requests_total", "LLM calls by outcome (ok, error, timeout, rejected by the open circuit, out of budget, no free slot).", ("outcome",))
+llm_attempts = tracing.metrics.counter("llm_attempts_total", "Individual LLM requests sent, including retries and hedges, by kind.", ("kind",))
+llm_seconds = tracing.metrics.histogram("llm_request_duration_seconds", "Time for an LLM call, including retries and waiting for a slot.")
+llm_wait = tracing.metrics.histogram("llm_slot_wait_seconds", "Time an LLM call waited for a free concurrency slot.")
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class LLMUnavailable(LLMError):
+    """The circuit is open; the call was refused without contacting the model."""
+
+
+class LLMDeadlineExceeded(LLMError):
+    """Gave up here without the model failing: no free slot in time, or the caller's budget ran out.
+
+    Not retried, and never counted by the circuit breaker.
+    """
+
+    def __init__(self, message: str, outcome: str = "budget"):
+        super().__init__(message)
+        self.outcome = outcome
+
+
+class TransientLLMError(LLMError):
+    """A failure worth retrying (the stub raises it to imitate a 503)."""
+
+
+def retryable(e: Exception) -> bool:
+    if isinstance(e, (LLMTimeout, TransientLLMError, TimeoutError, ConnectionError)):
+        return True
+    return getattr(e, "code", None) in RETRYABLE_CODES
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+def deadline_in(seconds: float) -> Optional[float]:
+    """An absolute deadline `seconds` from now, or None for no budget."""
+    return time.monotonic() + seconds if seconds and seconds > 0 else None
+
+
+def remaining(deadline: Optional[float] = None) -> Optional[float]:
+    deadline = _deadline.get() if deadline is None else deadline
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def budget(deadline: Optional[float]):
+    """Every LLM call made inside (in this thread) finishes or gives up by `deadline`."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def within(deadline: Optional[float], fn: Callable, *args, **kwargs):
+    """Run `fn` under `deadline`; for executor hops, which do not carry context variables across."""
+    with budget(deadline):
+        return fn(*args, **kwargs)
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Offline stand-in for Gemini with injectable latency and failures.
+
+    Answers the way the real prompts expect: a bare number for salary
+    extraction, a JSON array for batched explanations, a sentence otherwise.
+    `failures` makes the next n calls fail; `failure_rate` fails calls at random.
+    """
+
+    supports_timeout = True
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, failure_rate: float = 0.0, failures: int = 0,
+                 error: Callable[[], Exception] = None, seed: int = None):
+        self.latency = latency_ms / 1e3
+        self.jitter = jitter_ms / 1e3
+        self.failure_rate = failure_rate
+        self.failures = failures
+        self.error = error or (lambda: TransientLLMError("stub: service unavailable"))
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def answer(self, prompt: str) -> str:
+        batch = re.search(r"JSON array of (\d+) strings", prompt)
+        if "salary deposit amount" in prompt:
+            return "4000"
+        if batch:
+            return json.dumps(["Your application was assessed on income and family size."] * int(batch.group(1)))
+        return "Your application was assessed on income and family size."
+
+    def generate_content(self, contents=None, stream=False, timeout=None):
+        with self._lock:
+            self.calls += 1
+            fail = self.failures > 0 or (self.failure_rate and self._rng.random() < self.failure_rate)
+            self.failures = max(0, self.failures - 1)
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise self.error()
+        text = self.answer(str(contents))
+        return iter([StubResponse(text)]) if stream else StubResponse(text)
+
+
+class GeminiModel:
+    """google.generativeai model that takes a per-call timeout like the stub does."""
+
+    supports_timeout = True
+
+    def __init__(self, name: str = GEMINI_MODEL):
+        import google.generativeai as genai
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if api_key:
+            genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(name)
+
+    def generate_content(self, contents=None, stream=False, timeout=None):
+        return self._model.generate_content(contents=contents, stream=stream, request_options={"timeout": timeout} if timeout else None)
+
+
+def make_model(backend: str = None):
+    backend = backend or LLM_BACKEND
+    if backend == "stub":
+        return StubModel(LLM_STUB_LATENCY_MS, failure_rate=LLM_STUB_FAILURE_RATE)
+    if backend == "gemini":
+        return GeminiModel()
+    raise ValueError(f"Unknown LLM backend '{backend}'")
+
+
+class CircuitBreaker:
+    """Closed until `failures` transient errors in a row; then open (calls refused) for `reset` seconds,
+    then half-open: one trial call decides whether it closes or opens again."""
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, reset: float = LLM_BREAKER_RESET):
+        self.failures = max(1, failures)
+        self.reset = reset
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = None
+        self.opened = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset:
+                self.state = "half_open"
+                self._trial = False
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def release(self):
+        """Give back a trial call that ended without a verdict on the model (budget or slot wait)."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.state = "closed"
+                self.consecutive = 0
+                self._trial = False
+                return
+            self.consecutive += 1
+            if self.state == "half_open" or self.consecutive >= self.failures:
+                if self.state != "open":
+                    self.opened += 1
+                    print(f"[WARN] LLM circuit open after {self.consecutive} failures; refusing calls for {self.reset:g}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive, "times_opened": self.opened}
+
+
+class LLMClient:
+    """The one way the backend talks to the LLM.
+
+    Every call takes a concurrency slot, is bounded by its timeout and by the
+    caller's budget (see `budget`), is retried with jittered exponential
+    backoff on transient errors, and is refused at once while the circuit is
+    open. Attempts run on the client's own threads, so a call that hangs is
+    abandoned at its deadline instead of holding the caller.
+    """
+
+    def __init__(self, model=None, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT,
+                 retries: int = LLM_RETRIES, backoff_base: float = LLM_BACKOFF_BASE, backoff_max: float = LLM_BACKOFF_MAX,
+                 hedge_after: float = LLM_HEDGE_AFTER, breaker: CircuitBreaker = None):
+        self._model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        # A slot is taken before an attempt is submitted, so there is always a free thread for it.
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm-call")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {"ok": 0, "error": 0, "timeout": 0, "rejected": 0, "budget": 0, "busy": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = make_model()
+        return self._model
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.counts[key] += n
+
+    def _limit(self) -> Optional[float]:
+        """Seconds this attempt may take: the client timeout, cut to what is left of the caller's budget."""
+        left = remaining()
+        if left is not None and left <= 0:
+            raise LLMDeadlineExceeded("LLM budget for this request is used up")
+        return self.timeout if left is None else min(self.timeout, left)
+
+    def _cut_short(self, e: Exception, limit: float) -> Exception:
+        """A timeout of an attempt the caller's budget shortened says nothing about the model; report it as such."""
+        timed_out = isinstance(e, (LLMTimeout, TimeoutError)) or getattr(e, "code", None) in (408, 504)
+        if timed_out and limit < self.timeout:
+            return LLMDeadlineExceeded(f"LLM budget ran out after {limit:.1f}s")
+        return e
+
+    def _acquire(self, limit: float, block: bool = True) -> bool:
+        start = time.perf_counter()
+        got = self._slots.acquire(timeout=limit) if block else self._slots.acquire(blocking=False)
+        if block:
+            llm_wait.observe(time.perf_counter() - start)
+        if got:
+            with self._lock:
+                self.in_flight += 1
+        return got
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _call(self, model, prompt: str, timeout: float, kind: str):
+        llm_attempts.inc(kind=kind)
+        try:
+            kwargs = {"timeout": timeout} if getattr(model, "supports_timeout", False) else {}
+            return model.generate_content(contents=prompt, **kwargs)
+        finally:
+            self._release()
+
+    def _attempt(self, model, prompt: str, kind: str):
+        limit = self._limit()
+        if not self._acquire(limit):
+            raise LLMDeadlineExceeded(f"No free LLM slot within {limit:.1f}s", outcome="busy")
+        # The attempt's clock starts once it has a slot, so time spent queueing here is never blamed on the model.
+        start = time.monotonic()
+        try:
+            limit = self._limit()
+        except LLMDeadlineExceeded:
+            self._release()
+            raise
+        first = self._pool.submit(self._call, model, prompt, limit, kind)
+        futures = {first}
+        if self.hedge_after > 0:
+            done, _ = wait(futures, timeout=min(self.hedge_after, limit))
+            # Only hedge with a spare slot: a hedge must not queue behind, or displace, other requests.
+            if not done and self._acquire(0, block=False):
+                self._count("hedges")
+                futures.add(self._pool.submit(self._call, model, prompt, max(0.0, limit - (time.monotonic() - start)), "hedge"))
+        error = None
+        while futures:
+            done, _ = wait(futures, timeout=max(0.0, limit - (time.monotonic() - start)), return_when=FIRST_COMPLETED)
+            if not done:
+                raise self._cut_short(LLMTimeout(f"LLM call took longer than {limit:.1f}s"), limit)
+            for future in done:
+                futures.discard(future)
+                if future.exception() is None:
+                    if future is not first:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise self._cut_short(error, limit)
+
+    def _report(self, e: Exception) -> bool:
+        """Tell the breaker about a failed attempt; True when it is worth retrying.
+
+        Only failures of the model itself count: a 429/5xx, or a timeout
+        after the full LLM_TIMEOUT. Giving up on a slot or on the caller's
+        budget is local and leaves the breaker as it was.
+        """
+        if isinstance(e, LLMDeadlineExceeded):
+            self.breaker.release()
+            return False
+        transient = retryable(e)
+        self.breaker.record(not transient)
+        return transient
+
+    def generate(self, prompt: str, model=None) -> str:
+        """The model's text for `prompt`; raises LLMError (or the model's own error) when it cannot get one."""
+        model = model or self.model
+        start = time.perf_counter()
+        try:
+            with tracing.span("llm.call") as span:
+                for attempt in range(self.retries + 1):
+                    left = remaining()
+                    if left is not None and left <= 0:
+                        self._count("budget")
+                        llm_requests.inc(outcome="budget")
+                        raise LLMDeadlineExceeded("LLM budget for this request is used up")
+                    if not self.breaker.allow():
+                        self._count("rejected")
+                        llm_requests.inc(outcome="rejected")
+                        raise LLMUnavailable("LLM circuit is open")
+                    try:
+                        response = self._attempt(model, prompt, "retry" if attempt else "first")
+                    except Exception as e:
+                        transient = self._report(e)
+                        left = remaining()
+                        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                        if not transient or attempt == self.retries or (left is not None and left <= delay):
+                            outcome = getattr(e, "outcome", "timeout" if isinstance(e, LLMTimeout) else "error")
+                            self._count(outcome)
+                            llm_requests.inc(outcome=outcome)
+                            raise
+                        self._count("retries")
+                        span.set(retries=attempt + 1)
+                        time.sleep(delay)
+                        continue
+                    self.breaker.record(True)
+                    self._count("ok")
+                    llm_requests.inc(outcome="ok")
+                    return response.text
+        finally:
+            llm_seconds.observe(time.perf_counter() - start)
+
+    def stream(self, prompt: str, model=None) -> Iterator[str]:
+        """Yield text chunks as they arrive. Retries only until the first chunk; no hedging."""
+        model = model or self.model
+        for attempt in range(self.retries + 1):
+            try:
+                limit = self._limit()
+            except LLMDeadlineExceeded:
+                self._count("budget")
+                llm_requests.inc(outcome="budget")
+                raise
+            if not self.breaker.allow():
+                self._count("rejected")
+                llm_requests.inc(outcome="rejected")
+                raise LLMUnavailable("LLM circuit is open")
+            if not self._acquire(limit):
+                self.breaker.release()
+                self._count("busy")
+                llm_requests.inc(outcome="busy")
+                raise LLMDeadlineExceeded(f"No free LLM slot within {limit:.1f}s", outcome="busy")
+            started = False
+            try:
+                # Re-checked after the slot wait, which may have used up the caller's budget.
+                limit = self._limit()
+                llm_attempts.inc(kind="retry" if attempt else "first")
+                kwargs = {"timeout": limit} if getattr(model, "supports_timeout", False) else {}
+                for chunk in model.generate_content(contents=prompt, stream=True, **kwargs):
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks carrying only a finish reason or safety ratings have no text.
+                        continue
+                    if text:
+                        started = True
+                        yield text
+            except GeneratorExit:
+                # The reader went away mid-answer; the model was answering, so this settles a half-open trial.
+                self.breaker.record(True)
+                raise
+            except Exception as e:
+                error = self._cut_short(e, limit)
+                transient = self._report(error)
+                if started or not transient or attempt == self.retries:
+                    outcome = getattr(error, "outcome", "error")
+                    self._count(outcome)
+                    llm_requests.inc(outcome=outcome)
+                    if error is e:
+                        raise
+                    raise error from e
+                self._count("retries")
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+                continue
+            finally:
+                self._release()
+            self.breaker.record(True)
+            self._count("ok")
+            llm_requests.inc(outcome="ok")
+            return
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+            in_flight = self.in_flight
+        return {
+            "backend": type(self._model).__name__ if self._model is not None else LLM_BACKEND,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": in_flight,
+            "timeout_s": self.timeout,
+            "retries": self.retries,
+            "hedge_after_s": self.hedge_after,
+            "breaker": self.breaker.to_dict(),
+            "counts": counts,
+        }
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+tracing.metrics.gauge("llm_in_flight", "LLM requests currently in flight from this process.",
+                      collect=lambda: {(): float(_client.in_flight)} if _client is not None else {})
+tracing.metrics.gauge("llm_circuit_open", "1 while the LLM circuit breaker refuses calls.",
+                      collect=lambda: {(): float(_client.breaker.state == "open")} if _client is not None else {})
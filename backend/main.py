@@ -1,17 +1,77 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, APIRouter
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, APIRouter, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from pathlib import Path
 import uvicorn
 import uuid
+import hashlib
 import shutil
 import os
 import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from backend.orchestrator import Orchestrator
-from backend.agents import DataExtractionAgent
+from backend.agents import DEFAULT_FAMILY_SIZE
+from backend.executors import executors
+from backend.application_store import STORE_SHUTDOWN_TIMEOUT, get_application_store
+from backend.extraction_cache import extraction_cache
+from backend.salary_rules import salary_rules
+from backend.retrieval import document_text, get_retrieval_index
+from backend.latency import explain_latency
+from backend.explanations import explanation_stats
+from backend.chat import chat_stats, get_chat_sessions
+from backend.llm import get_llm_client
+from backend.uploads import UPLOAD_MAX_REQUEST_BYTES, UploadTooLarge, upload_digest, upload_sessions, write_upload
+from backend.tracing import metrics, set_app_id, slow_requests, start_trace
+from backend.jobs import DONE, FAILED, IdempotencyConflict, QueueFull, get_job_queue, job_counts
+from backend.ocr import warm_ocr
+from backend import serving
 
-app = FastAPI(title = "Social Support Interface API")
+UPLOAD_SWEEP_INTERVAL = float(os.getenv("UPLOAD_SWEEP_INTERVAL", 300))
+# How long a ?wait=true duplicate waits for the identical request's job before answering 202 with it instead.
+PREDICT_WAIT_TIMEOUT = float(os.getenv("PREDICT_WAIT_TIMEOUT", 120))
+
+async def _sweep_upload_sessions():
+    while True:
+        try:
+            await run_in_threadpool(upload_sessions.sweep)
+        except Exception as e:
+            print(f"[WARN] Could not sweep upload sessions: {e}")
+        try:
+            await run_in_threadpool(job_queue.prune)
+        except Exception as e:
+            print(f"[WARN] Could not prune finished jobs: {e}")
+        try:
+            await run_in_threadpool(chat_sessions.prune)
+        except Exception as e:
+            print(f"[WARN] Could not prune chat sessions: {e}")
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(_sweep_upload_sessions())
+    # Under serving.serve() the supervisor has already resumed interrupted jobs; siblings' jobs are still running.
+    job_queue.start(run_prediction, recover=not serving.SERVE_SUPERVISED)
+    state = serving.worker_state
+    warmup = asyncio.create_task(state.warm_up({'model':_warm_model, 'ocr':_warm_ocr}))
+    publisher = asyncio.create_task(state.keep_publishing())
+    yield
+    sweeper.cancel()
+    warmup.cancel()
+    publisher.cancel()
+    state.discard()
+    # Jobs cut short here go back to the queue and run again on the next start.
+    await job_queue.stop()
+    # The writer thread is a daemon: whatever it has not committed yet is gone once the process exits.
+    if not await run_in_threadpool(application_store.flush, STORE_SHUTDOWN_TIMEOUT):
+        print(f"[WARN] {application_store.pending()} applications were not written before shutdown")
+    executors.shutdown()
+    retrieval_index.save()
+
+app = FastAPI(title = "Social Support Interface API", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins = ['*'],
@@ -21,81 +81,438 @@ app.add_middleware(
     )
 
 router = APIRouter()
-extractor = DataExtractionAgent()
+
+@app.middleware('http')
+async def limit_upload_size(request: Request, call_next):
+    # Reject oversized bodies before the multipart parser spools them to disk.
+    length = request.headers.get('content-length')
+    if request.url.path in ('/extract', '/predict') and length and length.isdigit() and int(length) > UPLOAD_MAX_REQUEST_BYTES:
+        return JSONResponse(status_code=413, content={'detail': f'Upload is larger than {UPLOAD_MAX_REQUEST_BYTES} bytes'})
+    return await call_next(request)
+
+http_seconds = metrics.histogram('http_request_duration_seconds', 'Time to produce a response (streaming bodies: until headers are sent).', ('method', 'route', 'status'))
+http_errors = metrics.counter('http_request_errors_total', 'Responses with a 5xx status.', ('method', 'route', 'status'))
+http_in_flight = metrics.gauge('http_requests_in_flight', 'Requests currently being handled.')
+
+@app.middleware('http')
+async def trace_requests(request: Request, call_next):
+    # Added last, so it is the outermost middleware and also times rejected uploads.
+    if request.url.path == '/metrics':
+        return await call_next(request)
+    http_in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    with start_trace(f"{request.method} {request.url.path}") as trace:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            http_in_flight.dec()
+            elapsed = time.perf_counter() - start
+            # Route templates, not raw paths, so /applications/{app_id} stays one series.
+            route = getattr(request.scope.get('route'), 'path', None) or 'unmatched'
+            http_seconds.observe(elapsed, method=request.method, route=route, status=str(status))
+            if status >= 500:
+                http_errors.inc(method=request.method, route=route, status=str(status))
+            slow_requests.maybe_record(trace, elapsed * 1e3, method=request.method, route=route, status=status)
 
 os.makedirs('data/raw', exist_ok=True)
-path = Path("data/saved_applications")
-path.mkdir(parents=True,exist_ok=True)
 
 orchestrator = Orchestrator()
+application_store = get_application_store()
+retrieval_index = get_retrieval_index()
+job_queue = get_job_queue()
+chat_sessions = get_chat_sessions()
+
+async def run_prediction(application:dict) -> dict:
+    set_app_id(application['app_id'])
+    result = await orchestrator.process_application_async(application)
+    application_store.save({**result, 'application':{k:v for k, v in application.items() if k not in ('files', 'file_digests', 'rich_explanation')}})
+    return result
+
+WARMUP_APPLICATION = {'app_id':'warmup', 'dob':'1990-01-01', 'family_size':DEFAULT_FAMILY_SIZE, 'reported_income':1000}
+
+async def _warm_model():
+    await executors.run('model', orchestrator.eligibility.assess_many_versioned, [WARMUP_APPLICATION])
+
+async def _warm_ocr():
+    # Starts every extraction worker, whose initializer loads its OCR engine, so no request pays for a cold one.
+    stage = executors.stages['extraction']
+    warmed = await stage.run_on_every_worker(warm_ocr)
+    if len(warmed) < (1 if stage.kind == 'inline' else stage.max_workers):
+        raise RuntimeError(f'Only {len(warmed)} of {stage.max_workers} extraction workers started')
+    if any(seconds is None for seconds in warmed.values()):
+        raise RuntimeError('OCR engine did not start')
+
+def _queue_full(e:QueueFull) -> JSONResponse:
+    return JSONResponse(status_code=429, content={'detail':str(e), 'retry_after':e.retry_after}, headers={'Retry-After':str(e.retry_after)})
 class PredictResponse(BaseModel):
     app_id: Optional[str] = None
     decision: str
     score: float
     reasons: List[str]
     recommendations: List[str]
-    explanation: str
+    explanation: Optional[str] = None
+    model_version: Optional[str] = None
+
+class JobAccepted(BaseModel):
+    job_id: str
+    app_id: str
+    status: str
+    position: Optional[int] = None
+    status_url: str
+    duplicate: bool = False
+
+class JobStatus(BaseModel):
+    job_id: str
+    app_id: Optional[str] = None
+    status: str
+    attempts: int
+    position: Optional[int] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Optional[PredictResponse] = None
+    error: Optional[str] = None
+
+class ActivateModelRequest(BaseModel):
+    version: str
+
+class BatchApplication(BaseModel):
+    app_id: Optional[str] = None
+    name: Optional[str] = None
+    dob: Optional[str] = None
+    age: Optional[int] = None
+    family_size: int = DEFAULT_FAMILY_SIZE
+    reported_income: float = 0
+    employment_status: Optional[str] = None
+    assets: float = 0
+    liabilities: float = 0
+    credit_score: float = 600
+
+class BatchPredictRequest(BaseModel):
+    applications: List[BatchApplication]
+    explain: bool = False
+    # Gemini prose, EXPLAIN_LLM_BATCH_SIZE applications per request; templates otherwise.
+    rich_explanation: Optional[bool] = None
+
+class BatchPredictResponse(BaseModel):
+    results: List[PredictResponse]
 
 @app.get('/health')
 async def health():
     return {'status':'ok'}
 
-@app.post('/predict',response_model=PredictResponse)
+@app.get('/ready')
+async def ready():
+    # /health says the process is up; this says every worker has finished warming up.
+    report = await run_in_threadpool(serving.worker_state.readiness)
+    return JSONResponse(status_code=200 if report['ready'] else 503, content=report)
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.get('/admin/slow-requests')
+async def recent_slow_requests(limit:int = 20):
+    return {'threshold_ms':slow_requests.threshold_ms, 'requests':slow_requests.recent(max(1, min(limit, 100)))}
+
+@app.get('/executors')
+async def executor_stats():
+    return executors.stats()
+
+@app.get('/llm')
+async def llm_stats():
+    return get_llm_client().stats()
+
+@app.get('/cache')
+async def cache_stats():
+    return extraction_cache.stats()
+
+@app.get('/extraction/stats')
+async def extraction_stats():
+    return {'cache':extraction_cache.stats(), 'salary_sources':salary_rules.stats()}
+
+@app.get('/admin/models')
+async def list_models():
+    active_model = orchestrator.eligibility.active_model
+    return {'active':active_model.current().version, 'versions':active_model.registry.versions()}
+
+@app.post('/admin/models/activate')
+async def activate_model(request:ActivateModelRequest):
+    try:
+        model = await run_in_threadpool(orchestrator.eligibility.active_model.swap, request.version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {'active':model.version, 'metadata':model.metadata}
+
+def _request_hash(form:dict, file_digests:List[str]) -> str:
+    """Canonical identity of a /predict request: the form values and the documents' content, in any order."""
+    canonical = {k:(v.strip() if isinstance(v, str) else v) for k, v in form.items()}
+    canonical['reported_income'] = float(canonical['reported_income'])
+    canonical['files'] = sorted(file_digests)
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+def _accepted(job:dict) -> JSONResponse:
+    status_url = f"/jobs/{job['job_id']}"
+    return JSONResponse(status_code=202, content={**job, 'status_url':status_url}, headers={'Location':status_url})
+
+def _replay(job:dict) -> JSONResponse:
+    # The result of an identical earlier request; nothing was run again.
+    return JSONResponse(status_code=200, content=PredictResponse(**job['result']).model_dump(),
+                        headers={'Idempotent-Replayed':'true', 'Location':f"/jobs/{job['job_id']}"})
+
+async def _wait_for_job(job_id:str) -> Optional[dict]:
+    """The job once it has finished, or as it stands after PREDICT_WAIT_TIMEOUT seconds."""
+    deadline = time.monotonic() + PREDICT_WAIT_TIMEOUT
+    while True:
+        job = await run_in_threadpool(job_queue.get, job_id)
+        if job is None or job['status'] in (DONE, FAILED) or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(0.1)
+
+async def _answer_duplicate(job:dict, wait:bool):
+    """Answer with the job of an identical earlier request; nothing is run again."""
+    if job['status'] != DONE and wait:
+        job = await _wait_for_job(job['job_id'])
+        if job is None:
+            raise HTTPException(status_code=500, detail='Job disappeared')
+        if job['status'] == FAILED:
+            raise HTTPException(status_code=500, detail=job.get('error') or 'Job failed')
+    if job['status'] == DONE:
+        return _replay(job)
+    return _accepted({**job, 'duplicate':True})
+
+async def _save_application(form:dict, session:Optional[dict], files:Optional[List[UploadFile]]) -> dict:
+    app_id = f'app_{uuid.uuid4().hex[:8]}'
+    set_app_id(app_id)
+    app_dir = os.path.join('data/raw', app_id)
+    os.makedirs(app_dir, exist_ok=True)
+    saved_files = []
+    file_digests = {}
+    if session:
+        # Hard links keep data/raw/<app_id> complete after the session is swept, without copying bytes.
+        for doc in session['files']:
+            file_path = os.path.join(app_dir, doc['filename'])
+            try:
+                os.link(doc['path'], file_path)
+            except OSError:
+                await run_in_threadpool(shutil.copyfile, doc['path'], file_path)
+            saved_files.append(file_path)
+            file_digests[file_path] = doc['sha256']
+    for f in files or []:
+        try:
+            saved = await write_upload(f, app_dir)
+        except UploadTooLarge as e:
+            shutil.rmtree(app_dir, ignore_errors=True)
+            raise HTTPException(status_code=413, detail=str(e))
+        saved_files.append(saved['path'])
+        file_digests[saved['path']] = saved['sha256']
+    return {'app_id':app_id, **{k:v for k, v in form.items() if v is not None}, 'files':saved_files, 'file_digests':file_digests}
+
+@app.post('/predict',status_code=202,responses={200:{'model':PredictResponse, 'description':'Scored (?wait=true), or the stored result of an identical request'}, 202:{'model':JobAccepted}, 422:{'description':'Idempotency-Key reused for a different request'}, 429:{'description':'Job queue is full; see Retry-After'}})
 async def predict(
     name:str = Form(...),
     dob:str = Form(...),
     address:str = Form(...),
     family_size:int = Form(...),
     income:float = Form(...),
-    files:Optional[List[UploadFile]]=File(None),):
-    
-    app_id = f'app_{uuid.uuid4().hex[:8]}'
-    app_dir = os.path.join('data/raw', app_id)
-    os.makedirs(app_dir, exist_ok=True)
-    saved_files = []
-    if files:
-        for f in files:
-            file_path = os.path.join(app_dir, f.filename)
-            with open(file_path,'wb') as out:
-                shutil.copyfileobj(f.file, out)
-            saved_files.append(file_path)
-    application = {
-        'app_id':app_id,
-        'name':name,
-        'dob':dob,
-        'address':address,
-        'family_size':family_size,
-        'reported_income':income,
-        'files':saved_files,
-    }
+    files:Optional[List[UploadFile]]=File(None),
+    upload_session:Optional[str] = Form(None),
+    rich_explanation:Optional[bool] = Form(None, description='Ask Gemini for the explanation instead of the template (default: EXPLAIN_MODE)'),
+    idempotency_key:Optional[str] = Header(None, alias='Idempotency-Key', description='Resubmissions with the same key reuse the first job (default: a hash of the form and documents)'),
+    wait:bool = Query(False, description='Score inside this request and return the result (200) instead of queueing a job (202)'),):
+
+    session = None
+    if upload_session:
+        try:
+            session = upload_sessions.get(upload_session)
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if session is None:
+            raise HTTPException(status_code=410, detail=f"Upload session {upload_session} has expired; upload the documents again")
 
+    # Hashed in place, so a duplicate is recognised before anything is written to data/raw.
+    digests = [doc['sha256'] for doc in session['files']] if session else []
+    for f in files or []:
+        try:
+            digests.append(await upload_digest(f))
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+    form = {'name':name, 'dob':dob, 'address':address, 'family_size':family_size, 'reported_income':income, 'rich_explanation':rich_explanation}
+    request_hash = _request_hash(form, digests)
+    key = f'client:{idempotency_key}' if idempotency_key else f'auto:{request_hash}'
+
+    try:
+        existing = await run_in_threadpool(job_queue.find, key, request_hash)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if existing is not None:
+        job_counts.inc(status='deduplicated')
+        return await _answer_duplicate(existing, wait)
+
+    # Refuse before the uploads are written; submit() checks again, atomically.
+    try:
+        await run_in_threadpool(job_queue.check_capacity)
+    except QueueFull as e:
+        return _queue_full(e)
+    # data/raw/<app_id> holds the documents until the job has run, even across restarts.
+    application = await _save_application(form, session, files)
+    app_dir = os.path.join('data/raw', application['app_id'])
+    try:
+        # ?wait=true reserves a running job for this request, so duplicates from any process wait on it instead of scoring again.
+        job = await run_in_threadpool(job_queue.submit, application, app_id=application['app_id'], idempotency_key=key,
+                                      request_hash=request_hash, run_here=wait)
+    except QueueFull as e:
+        shutil.rmtree(app_dir, ignore_errors=True)
+        return _queue_full(e)
+    except IdempotencyConflict as e:
+        shutil.rmtree(app_dir, ignore_errors=True)
+        raise HTTPException(status_code=422, detail=str(e))
+    if job.get('duplicate'):
+        # An identical request got its job in first, while this one was saving its documents.
+        shutil.rmtree(app_dir, ignore_errors=True)
+        return await _answer_duplicate(job, wait)
+    if not wait:
+        return _accepted(job)
     try:
-        result = orchestrator.process_application(application)
-        with open(path/f"{app_id}.json","w") as f:
-            json.dump(result, f , indent=2)
-        print(result)
+        result = await job_queue.run_reserved(job['job_id'], run_prediction, application)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return PredictResponse(**result)
+    return JSONResponse(status_code=200, content=PredictResponse(**result).model_dump())
 
-@app.post('/explain')
-async def explain(query:dict):
+@app.get('/jobs')
+async def job_stats():
+    return await run_in_threadpool(job_queue.stats)
+
+@app.get('/jobs/{job_id}',response_model=JobStatus)
+async def job_status(job_id:str):
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.post('/predict/batch',response_model=BatchPredictResponse)
+async def predict_batch(request:BatchPredictRequest):
+    applications = [a.model_dump() for a in request.applications]
+    try:
+        results = await orchestrator.process_batch_async(applications, explain=request.explain, rich=request.rich_explanation)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return BatchPredictResponse(results=[PredictResponse(**r) for r in results])
+
+@app.get('/applications')
+async def list_applications(
+    decision:Optional[str] = None,
+    min_score:Optional[float] = None,
+    max_score:Optional[float] = None,
+    min_income:Optional[float] = None,
+    max_income:Optional[float] = None,
+    since:Optional[str] = None,
+    until:Optional[str] = None,
+    limit:int = 50,
+    cursor:Optional[str] = None,):
+    try:
+        return await run_in_threadpool(
+            application_store.query,
+            decision=decision, min_score=min_score, max_score=max_score, min_income=min_income, max_income=max_income,
+            since=since, until=until, limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get('/applications/{app_id}')
+async def get_application(app_id:str):
+    record = await run_in_threadpool(application_store.get, app_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Application {app_id} not found")
+    return record
+
+@app.get('/search')
+async def search(q:str, k:int = 5):
+    def _search():
+        hits = retrieval_index.search(q, max(1, min(k, 50)))
+        return [{**hit, "text": document_text(hit["id"], application_store)} for hit in hits]
+    return {"hits": await run_in_threadpool(_search), "index": retrieval_index.stats()}
+
+def _explain_args(query:dict):
     q = query.get('query')
-    app_id = query.get('app_id')
     if not q:
         raise HTTPException(status_code=400, detail="Missing query in request body")
-    answer = orchestrator.explain_query(q, app_id=app_id)
-    return {'answer':answer}
+    return q, query.get('app_id') or None, query.get('session_id') or None
+
+async def _remember_turn(session:dict, query:str, answer:str):
+    # Failed answers are not part of the conversation.
+    if answer and not answer.startswith('[Error calling LLM'):
+        try:
+            await run_in_threadpool(chat_sessions.append, session, query, answer)
+        except Exception as e:
+            print(f"[WARN] Could not save chat turn: {e}")
+
+@app.post('/explain')
+async def explain(query:dict):
+    """Answer a question; pass back the returned `session_id` to continue the same conversation."""
+    q, app_id, session_id = _explain_args(query)
+    session = await run_in_threadpool(chat_sessions.open, session_id, app_id)
+    usage = {}
+    start = time.perf_counter()
+    answer = await orchestrator.explain_query_async(q, app_id=session['app_id'], history=session['turns'], usage=usage)
+    total_ms = (time.perf_counter() - start) * 1e3
+    explain_latency["blocking"].record(ttft_ms=total_ms, total_ms=total_ms)
+    await _remember_turn(session, q, answer)
+    return {'answer':answer, 'session_id':session['session_id'], 'app_id':session['app_id'], 'usage':usage}
+
+def _sse(data:dict, event:str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post('/explain/stream')
+async def explain_stream(query:dict):
+    """Server-sent events: one `data: {"text": ...}` per chunk, then an `event: done` with timings, session and token usage."""
+    q, app_id, session_id = _explain_args(query)
+    session = await run_in_threadpool(chat_sessions.open, session_id, app_id)
+
+    async def events():
+        start = time.perf_counter()
+        ttft_ms = None
+        usage = {}
+        answer = []
+        try:
+            async for text in orchestrator.explain_query_stream(q, app_id=session['app_id'], history=session['turns'], usage=usage):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1e3
+                answer.append(text)
+                yield _sse({"text": text})
+        except Exception as e:
+            yield _sse({"detail": str(e)}, event="error")
+            return
+        total_ms = (time.perf_counter() - start) * 1e3
+        explain_latency["stream"].record(ttft_ms=ttft_ms, total_ms=total_ms)
+        await _remember_turn(session, q, "".join(answer))
+        yield _sse({"ttft_ms": round(ttft_ms or total_ms, 2), "total_ms": round(total_ms, 2),
+                    "session_id": session['session_id'], "usage": usage}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get('/explain/stats')
+async def explain_stats():
+    return {**{name: recorder.stats() for name, recorder in explain_latency.items()}, 'decisions':explanation_stats(), 'chat':await run_in_threadpool(chat_stats)}
 
 @app.post('/extract')
 async def extract_fields(files: list[UploadFile] = File(...)):
-    file_paths = []
-    for f in files:
-        save_path = f'data/uploads/{f.filename}'
-        with open(save_path, 'wb') as buffer:
-            buffer.write(await f.read())
-        file_paths.append(save_path)
-    parsed_docs = extractor.extract({'files':file_paths})
+    session_id = upload_sessions.create()
+    try:
+        saved = await upload_sessions.add_files(session_id, files)
+    except UploadTooLarge as e:
+        upload_sessions.discard(session_id)
+        raise HTTPException(status_code=413, detail=str(e))
+    parsed_docs = await orchestrator.extract_async({
+        'files':[doc['path'] for doc in saved],
+        'file_digests':{doc['path']:doc['sha256'] for doc in saved},
+    })
 
     fields = {
         "name": parsed_docs['app_form'].get("name"),
@@ -106,7 +523,13 @@ async def extract_fields(files: list[UploadFile] = File(...)):
     }
     # print(fields)
 
-    return {"fields":fields, "documents":parsed_docs["documents"]}
+    return {
+        "fields":fields,
+        "documents":parsed_docs["documents"],
+        "upload_session":session_id,
+        "files":[{k:doc[k] for k in ('filename', 'sha256', 'size')} for doc in saved],
+        "expires_in":upload_sessions.ttl,
+    }
 
 if __name__ == '__main__':
     uvicorn.run(app, host='0.0.0.0', port=8000)
\ No newline at end of file
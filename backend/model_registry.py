@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import shutil
+import joblib
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from backend.compiled_forest import CompiledForest, compile_pipeline
+from backend.extraction_cache import file_sha256
+
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "models/registry")
+ACTIVE_POINTER = "ACTIVE"
+
+
+class LoadedModel:
+    """One registry version, ready to score.
+
+    The compiled arrays are memory-mapped so every worker on the host shares the
+    same pages; the sklearn pipeline is only unpickled when something needs it.
+    """
+
+    def __init__(self, version: str, metadata: dict, model_path: str, engine: Optional[CompiledForest] = None, pipeline=None):
+        self.version = version
+        self.metadata = metadata
+        self.model_path = model_path
+        self.engine = engine
+        self._pipeline = pipeline
+        self._lock = threading.Lock()
+
+    @property
+    def pipeline(self):
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    self._pipeline = joblib.load(self.model_path)
+        return self._pipeline
+
+    @property
+    def classes(self) -> List[str]:
+        if self.engine is not None:
+            return self.engine.classes
+        return [str(c) for c in self.pipeline.classes_]
+
+
+class ModelRegistry:
+    def __init__(self, root: str = MODEL_REGISTRY_DIR):
+        self.root = Path(root)
+
+    def _version_dir(self, version: str) -> Path:
+        return self.root / version
+
+    def versions(self) -> List[dict]:
+        if not self.root.exists():
+            return []
+        found = []
+        for path in sorted(self.root.iterdir()):
+            if path.name.startswith("."):
+                continue
+            meta_file = path / "metadata.json"
+            if meta_file.exists():
+                with open(meta_file) as f:
+                    found.append(json.load(f))
+        return found
+
+    def active_version(self) -> Optional[str]:
+        try:
+            return (self.root / ACTIVE_POINTER).read_text().strip() or None
+        except OSError:
+            return None
+
+    def pointer_mtime(self) -> float:
+        try:
+            return os.path.getmtime(self.root / ACTIVE_POINTER)
+        except OSError:
+            return 0.0
+
+    def set_active(self, version: str):
+        if not (self._version_dir(version) / "metadata.json").exists():
+            raise KeyError(f"Unknown model version '{version}'")
+        tmp = self.root / f".{ACTIVE_POINTER}.{os.getpid()}.tmp"
+        tmp.write_text(version)
+        os.replace(tmp, self.root / ACTIVE_POINTER)
+
+    def register(self, model_path: str, version: str = None, metrics: dict = None, trained_at: str = None, activate: bool = False) -> dict:
+        version = version or datetime.now(timezone.utc).strftime("v%Y%m%dT%H%M%S")
+        target = self._version_dir(version)
+        if target.exists():
+            raise ValueError(f"Model version '{version}' is already registered")
+
+        staging = self.root / f".{version}.staging"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        shutil.copyfile(model_path, staging / "model.joblib")
+
+        pipeline = joblib.load(staging / "model.joblib")
+        engine = compile_pipeline(pipeline)
+        engine.meta["source_sha256"] = file_sha256(str(staging / "model.joblib"))
+        engine.save(staging / "compiled")
+
+        classifier = pipeline.named_steps["classifier"]
+        metadata = {
+            "version": version,
+            "features": [str(f) for f in getattr(pipeline, "feature_names_in_", [])],
+            "classes": [str(c) for c in classifier.classes_],
+            "trained_at": trained_at or datetime.fromtimestamp(os.path.getmtime(model_path), timezone.utc).isoformat(),
+            "registered_at": datetime.now(timezone.utc).isoformat(),
+            "metrics": metrics or {},
+            "n_trees": engine.meta["n_trees"],
+            "max_depth": engine.meta["max_depth"],
+            "sha256": engine.meta["source_sha256"],
+        }
+        with open(staging / "metadata.json", "w") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(staging, target)
+
+        if activate or self.active_version() is None:
+            self.set_active(version)
+        return metadata
+
+    def load(self, version: str, compiled: bool = True) -> LoadedModel:
+        path = self._version_dir(version)
+        if not (path / "metadata.json").exists():
+            raise KeyError(f"Unknown model version '{version}'")
+        with open(path / "metadata.json") as f:
+            metadata = json.load(f)
+        engine = None
+        if compiled and CompiledForest.exists(path / "compiled"):
+            engine = CompiledForest.load(path / "compiled", mmap_mode="r")
+        return LoadedModel(version, metadata, str(path / "model.joblib"), engine=engine)
+
+
+# Models loaded by preload_initial_model, keyed like load_initial_model's arguments.
+_preloaded = {}
+
+
+def preload_initial_model(registry: ModelRegistry, fallback_path: str, fallback_compiled_path: str = None, compiled: bool = True) -> LoadedModel:
+    """Load the initial model fully, for a parent process that is about to fork workers.
+
+    Workers then get it from load_initial_model without reading the files again,
+    and share its pages copy-on-write.
+    """
+    model = load_initial_model(registry, fallback_path, fallback_compiled_path, compiled)
+    # The sklearn pipeline is otherwise unpickled lazily, once per worker.
+    model.pipeline
+    _preloaded[(str(registry.root), fallback_path, compiled)] = model
+    return model
+
+
+def load_initial_model(registry: ModelRegistry, fallback_path: str, fallback_compiled_path: str = None, compiled: bool = True) -> LoadedModel:
+    """Load the registry's active version, or the legacy single joblib file if nothing is registered."""
+    preloaded = _preloaded.get((str(registry.root), fallback_path, compiled))
+    if preloaded is not None:
+        return preloaded
+    version = registry.active_version()
+    if version:
+        return registry.load(version, compiled=compiled)
+    if not os.path.exists(fallback_path):
+        raise FileNotFoundError(f"Model not found. Please run Scripts/train_eligibility_model.py to create it.")
+
+    pipeline = joblib.load(fallback_path)
+    engine = None
+    if compiled:
+        try:
+            if fallback_compiled_path and CompiledForest.exists(fallback_compiled_path):
+                engine = CompiledForest.load(fallback_compiled_path, mmap_mode="r")
+                if engine.meta.get("source_sha256") != file_sha256(fallback_path):
+                    print(f"[WARN] {fallback_compiled_path} is stale for {fallback_path}; compiling in memory")
+                    engine = None
+            engine = engine or compile_pipeline(pipeline)
+        except Exception as e:
+            print(f"[WARN] Could not compile eligibility model, using sklearn: {e}")
+            engine = None
+    version = Path(fallback_path).stem
+    return LoadedModel(version, {"version": version}, fallback_path, engine=engine, pipeline=pipeline)
+
+
+class ActiveModel:
+    """Holds the model currently used for scoring and swaps it without blocking readers.
+
+    Callers take `current()` once per request and score with that object, so a
+    swap never changes the model under an in-flight request. Other workers
+    notice a new ACTIVE pointer on their next `current()` after
+    `refresh_interval`; the new version loads on a background thread and
+    requests keep the old one until it is ready.
+    """
+
+    def __init__(self, registry: ModelRegistry, model: LoadedModel, compiled: bool = True, refresh_interval: float = 5.0):
+        self.registry = registry
+        self.compiled = compiled
+        self.refresh_interval = refresh_interval
+        self._swap_lock = threading.Lock()
+        self._reloading = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._pointer_mtime = registry.pointer_mtime()
+        self._model = model
+
+    def current(self) -> LoadedModel:
+        now = time.monotonic()
+        if now - self._checked_at >= self.refresh_interval and not self._reloading.locked():
+            self._checked_at = now
+            mtime = self.registry.pointer_mtime()
+            # current() may run on the event loop (MODEL_EXECUTOR=inline), so never load here.
+            if mtime and mtime != self._pointer_mtime and self._reloading.acquire(blocking=False):
+                threading.Thread(target=self._reload, args=(mtime,), name="model-reload", daemon=True).start()
+        return self._model
+
+    def _reload(self, mtime: float):
+        try:
+            version = self.registry.active_version()
+            if version and version != self._model.version:
+                try:
+                    self.swap(version, persist=False)
+                except Exception as e:
+                    print(f"[WARN] Could not hot-swap to model {version}: {e}")
+            self._pointer_mtime = mtime
+        finally:
+            self._reloading.release()
+
+    def wait_reloaded(self, timeout: float = None) -> bool:
+        """Block until a background reload started by `current()` has finished."""
+        if not self._reloading.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+        self._reloading.release()
+        return True
+
+    def swap(self, version: str, persist: bool = True) -> LoadedModel:
+        with self._swap_lock:
+            # Load fully before publishing so requests never see a half-loaded model.
+            model = self.registry.load(version, compiled=self.compiled)
+            if model.engine is None:
+                model.pipeline
+            if persist:
+                self.registry.set_active(version)
+                self._pointer_mtime = self.registry.pointer_mtime()
+            self._model = model
+            return model
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import queue
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+
+from backend import tracing
+
+try:
+    import tesserocr
+except ImportError:
+    # Optional: keeps a tesseract engine loaded per worker instead of starting the binary for every call.
+    tesserocr = None
+
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", 300))
+# Small captures are scaled up at most this much; large photos are always scaled down to the target DPI.
+OCR_MAX_UPSCALE = float(os.getenv("OCR_MAX_UPSCALE", 2.0))
+OCR_THRESHOLD = os.getenv("OCR_THRESHOLD", "otsu")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", 2))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+# 6 = a uniform block of text, which is what a cropped field region is; 3 = tesseract's automatic layout.
+OCR_REGION_PSM = int(os.getenv("OCR_REGION_PSM", 6))
+OCR_FULL_PSM = int(os.getenv("OCR_FULL_PSM", 3))
+OCR_REGION_PADDING = int(os.getenv("OCR_REGION_PADDING", 12))
+
+# ID-1 card width (85.6 mm); a card scanned at OCR_TARGET_DPI is this many inches wide.
+ID_CARD_WIDTH_IN = 3.37
+# Field regions as (left, top, right, bottom) fractions of the card, tuned on data_creation.py's cards.
+ID_CARD_REGIONS: Dict[str, Tuple[float, float, float, float]] = {
+    "name_dob": (0.05, 0.205, 0.75, 0.31),
+}
+ID_CARD_REGIONS.update({k: tuple(v) for k, v in json.loads(os.getenv("OCR_ID_REGIONS", "{}")).items()})
+
+ocr_calls = tracing.metrics.counter("ocr_calls_total", "Tesseract calls, by what was read (a card region or the full image).", ("kind",))
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Gray level that best separates ink from background (Otsu's method)."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if not total:
+        return 128
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    mean_bg = np.cumsum(hist * levels)
+    mean_all = mean_bg[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean_all * weight_bg - mean_bg * total) ** 2 / (weight_bg * weight_fg)
+    between = np.nan_to_num(between)
+    return int(np.argmax(between))
+
+
+def normalize(image: Image.Image, target_width: int = None, threshold: str = None) -> Image.Image:
+    """Upright, grayscale, resized to the target DPI and binarized."""
+    target_width = target_width or int(ID_CARD_WIDTH_IN * OCR_TARGET_DPI)
+    threshold = threshold or OCR_THRESHOLD
+    if image.format == "JPEG" and image.width > 2 * target_width:
+        # Let the JPEG decoder skip detail we are about to throw away (no-op once the image is loaded).
+        image.draft("L", (target_width, round(target_width * image.height / image.width)))
+    image = ImageOps.exif_transpose(image).convert("L")
+    scale = min(target_width / image.width, OCR_MAX_UPSCALE)
+    if abs(scale - 1) > 0.05:
+        # Shrinking first also makes the threshold and tesseract itself cheaper on phone photos.
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    if threshold == "otsu":
+        gray = np.asarray(image)
+        image = Image.fromarray(np.where(gray > otsu_threshold(gray), 255, 0).astype(np.uint8))
+    return image
+
+
+def crop_region(image: Image.Image, box: Tuple[float, float, float, float], padding: int = OCR_REGION_PADDING) -> Image.Image:
+    left, top, right, bottom = box
+    region = image.crop((round(left * image.width), round(top * image.height), round(right * image.width), round(bottom * image.height)))
+    # Tesseract misses glyphs that touch the image edge.
+    return ImageOps.expand(region, border=padding, fill=255) if padding else region
+
+
+class OcrWorker:
+    """One OCR engine; with tesserocr it stays loaded between calls."""
+
+    def __init__(self, lang: str = OCR_LANG):
+        self.lang = lang
+        self.api = tesserocr.PyTessBaseAPI(lang=lang) if tesserocr is not None else None
+        self.calls = 0
+
+    def recognize(self, image: Image.Image, psm: int) -> str:
+        self.calls += 1
+        if self.api is not None:
+            self.api.SetPageSegMode(psm)
+            self.api.SetImage(image)
+            return self.api.GetUTF8Text()
+        return pytesseract.image_to_string(image, lang=self.lang, config=f"--psm {psm}")
+
+    def close(self):
+        if self.api is not None:
+            self.api.End()
+
+
+class OcrPool:
+    """Up to `size` warm workers shared by every request in this process.
+
+    It also bounds how many tesseract runs compete for the CPU at once.
+    """
+
+    def __init__(self, size: int = OCR_WORKERS, lang: str = OCR_LANG):
+        self.size = max(1, size)
+        self.lang = lang
+        # LIFO, so the most recently used (warmest) worker is picked first.
+        self._idle: "queue.LifoQueue[OcrWorker]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.warm_seconds = None
+
+    @property
+    def backend(self) -> str:
+        return "tesserocr" if tesserocr is not None else "pytesseract"
+
+    def _checkout(self) -> OcrWorker:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return OcrWorker(self.lang)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def recognize(self, image: Image.Image, psm: int) -> str:
+        worker = self._checkout()
+        try:
+            return worker.recognize(image, psm)
+        finally:
+            self._idle.put(worker)
+
+    def warm(self) -> Optional[float]:
+        """Start every worker and run one tiny recognition, so the first request does not pay for it."""
+        start = time.perf_counter()
+        blank = Image.new("L", (64, 32), 255)
+        workers = []
+        try:
+            for _ in range(self.size):
+                workers.append(self._checkout())
+            for worker in workers:
+                worker.recognize(blank, OCR_REGION_PSM)
+        except Exception as e:
+            print(f"[WARN] Could not warm OCR workers: {e}")
+            return None
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+        self.warm_seconds = time.perf_counter() - start
+        return self.warm_seconds
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "size": self.size, "workers": self._created, "warm_seconds": self.warm_seconds}
+
+
+ocr_pool = OcrPool()
+
+
+def warm_ocr() -> Optional[float]:
+    """Executor initializer: extraction workers load their OCR engines before the first request.
+
+    Returns the warm-up time, or None if the engine could not start; calling it
+    again on a warm pool is free, which is how the server's readiness check uses it.
+    """
+    if ocr_pool.warm_seconds is not None:
+        return ocr_pool.warm_seconds
+    return ocr_pool.warm()
+
+
+class OcrResult:
+    def __init__(self, path: str):
+        self.path = path
+        self.texts: List[str] = []
+        self.passes: List[str] = []
+        self.timed_out = False
+        self.seconds = 0.0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.texts)
+
+
+def ocr_image(path: str, regions: Iterable[str] = (), until: Callable[[str], bool] = None, pool: OcrPool = None,
+              deadline: float = None) -> OcrResult:
+    """OCR a normalized image, reading the named card `regions` first.
+
+    The whole image is read when no regions are given, or when `until(text)`
+    says the regions did not contain everything the caller needs. No pass is
+    started after `deadline` (a time.monotonic() value); the result is then
+    marked `timed_out`.
+    """
+    pool = pool or ocr_pool
+    result = OcrResult(path)
+    start = time.perf_counter()
+    with tracing.span("ocr") as span:
+        with Image.open(path) as raw:
+            image = normalize(raw)
+        regions = list(regions)
+        for name in regions:
+            if deadline is not None and time.monotonic() >= deadline:
+                result.timed_out = True
+                break
+            result.texts.append(pool.recognize(crop_region(image, ID_CARD_REGIONS[name]), OCR_REGION_PSM))
+            result.passes.append(name)
+            ocr_calls.inc(kind="region")
+        if result.timed_out or (deadline is not None and time.monotonic() >= deadline):
+            result.timed_out = True
+        elif not regions or (until is not None and not until(result.text)):
+            result.texts.append(pool.recognize(image, OCR_FULL_PSM))
+            result.passes.append("full")
+            ocr_calls.inc(kind="full")
+        result.seconds = time.perf_counter() - start
+        span.set(passes=result.passes, width=image.width, timed_out=result.timed_out)
+    return result
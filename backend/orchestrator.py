@@ -1,4 +1,13 @@
+import asyncio
+import threading
+from typing import AsyncIterator, List
 from backend.agents import DataExtractionAgent, ValidationAgent, EligibilityAgent, ExplanationAgent
+from backend.executors import executors
+from backend.extraction_cache import extraction_cache
+from backend.salary_rules import salary_rules
+from backend.tracing import span
+from backend import explanations as decision_explanations
+from backend import llm
 
 class Orchestrator:
     def __init__(self):
@@ -7,22 +16,127 @@ class Orchestrator:
         self.eligibility = EligibilityAgent()
         self.explainer = ExplanationAgent()
 
-    def process_application(self, application: dict):
-        app_id = application.get("app_id")
-        parsed_docs = self.extractor.extract(application)
-        validation_report = self.validator.validate(application, parsed_docs)
-        decision, score, reasons, recommendations, = self.eligibility.assess(application, parsed_docs, validation_report)
-        explanation = self.explainer.explain (application, parsed_docs, validation_report, decision, score, recommendations)
-        result = {
+    def _build_result(self, app_id, decision, score, reasons, recommendations, explanation, model_version):
+        return {
             "app_id": app_id,
             "decision": decision,
             "score": score,
             "reasons": reasons,
             "recommendations": recommendations,
             "explanation": explanation,
+            "model_version": model_version,
             }
-        print(result)
-        return result
 
-    def explain_query(self, query: str, app_id: None) -> str:
-        return self.explainer.answer_query(query, app_id)
\ No newline at end of file
+    def process_application(self, application: dict):
+        with llm.budget(llm.deadline_in(llm.LLM_REQUEST_BUDGET)):
+            return self._process_application(application)
+
+    def _process_application(self, application: dict):
+        with span("stage.extract"):
+            parsed_docs = self.extractor.extract(application)
+        extraction_cache.record(parsed_docs["documents"])
+        salary_rules.record(parsed_docs["documents"])
+        with span("stage.validate"):
+            validation_report = self.validator.validate(application, parsed_docs)
+        with span("stage.assess"):
+            model_version, (decision, score, reasons, recommendations) = self.eligibility.assess_versioned(application, parsed_docs, validation_report)
+        with span("stage.explain"):
+            explanation = self.explainer.explain(application, parsed_docs, validation_report, decision, score, recommendations, rich=application.get("rich_explanation"))
+        return self._build_result(application.get("app_id"), decision, score, reasons, recommendations, explanation, model_version)
+
+    async def extract_async(self, application: dict, deadline: float = None) -> dict:
+        with span("stage.extract"):
+            parsed_docs = await executors.run("extraction", self.extractor.extract, application, defer_llm=True)
+        if parsed_docs.get("deferred_llm"):
+            with span("stage.resolve_llm"):
+                parsed_docs = await executors.run("llm", llm.within, deadline, self.extractor.resolve_deferred_llm, parsed_docs)
+        parsed_docs.pop("deferred_llm", None)
+        extraction_cache.record(parsed_docs["documents"])
+        salary_rules.record(parsed_docs["documents"])
+        return parsed_docs
+
+    async def process_application_async(self, application: dict):
+        # LLM calls for this application share one budget; once it is spent they fail fast and
+        # the explanation falls back to the template, so the decision is never held up by the LLM.
+        deadline = llm.deadline_in(llm.LLM_REQUEST_BUDGET)
+        parsed_docs = await self.extract_async(application, deadline)
+        with span("stage.validate"):
+            validation_report = self.validator.validate(application, parsed_docs)
+        with span("stage.assess"):
+            model_version, (decision, score, reasons, recommendations) = await executors.run("model", self.eligibility.assess_versioned, application, parsed_docs, validation_report)
+        rich = self.explainer.wants_llm(application.get("rich_explanation"))
+        with span("stage.explain"):
+            if rich:
+                explanation = await executors.run("llm", llm.within, deadline, self.explainer.explain, application, parsed_docs, validation_report, decision, score, recommendations, rich=True)
+            else:
+                # Templates take microseconds; an executor hop would cost more than the work.
+                explanation = self.explainer.explain(application, parsed_docs, validation_report, decision, score, recommendations, rich=False)
+        return self._build_result(application.get("app_id"), decision, score, reasons, recommendations, explanation, model_version)
+
+    def _assess_batch(self, applications: List[dict]):
+        # Batch rows are already-extracted field dicts, so there are no documents to parse.
+        parsed_docs = [{"app_form": {}, "documents": []} for _ in applications]
+        validation_reports = [self.validator.validate(a, p) for a, p in zip(applications, parsed_docs)]
+        model_version, assessments = self.eligibility.assess_many_versioned(applications, parsed_docs, validation_reports)
+        return parsed_docs, validation_reports, model_version, assessments
+
+    async def process_batch_async(self, applications: List[dict], explain: bool = False, rich: bool = None) -> List[dict]:
+        with span("stage.assess", rows=len(applications)):
+            parsed_docs, validation_reports, model_version, assessments = await executors.run("model", self._assess_batch, applications)
+
+        explanations = [None] * len(applications)
+        if explain and not self.explainer.wants_llm(rich):
+            with span("stage.explain", rows=len(applications)):
+                explanations = [
+                    self.explainer.explain(application, parsed, report, decision, score, recommendations, rich=False)
+                    for application, parsed, report, (decision, score, _, recommendations) in zip(applications, parsed_docs, validation_reports, assessments)
+                ]
+        elif explain:
+            # One Gemini request per EXPLAIN_LLM_BATCH_SIZE applications instead of one each.
+            items = [
+                (application, report, decision, score, recommendations)
+                for application, report, (decision, score, _, recommendations) in zip(applications, validation_reports, assessments)
+            ]
+            size = max(1, decision_explanations.EXPLAIN_LLM_BATCH_SIZE)
+            with span("stage.explain", rows=len(applications)):
+                chunks = await asyncio.gather(*[executors.run("llm", self.explainer.explain_many, items[i:i + size]) for i in range(0, len(items), size)])
+            explanations = [text for chunk in chunks for text in chunk]
+
+        return [
+            self._build_result(application.get("app_id"), decision, score, reasons, recommendations, explanation, model_version)
+            for application, explanation, (decision, score, reasons, recommendations) in zip(applications, explanations, assessments)
+        ]
+
+    def explain_query(self, query: str, app_id: None, history: List[dict] = (), usage: dict = None) -> str:
+        return self.explainer.answer_query(query, app_id, history, usage)
+
+    async def explain_query_async(self, query: str, app_id: str = None, history: List[dict] = (), usage: dict = None) -> str:
+        return await executors.run("llm", self.explainer.answer_query, query, app_id, history, usage)
+
+    async def explain_query_stream(self, query: str, app_id: str = None, history: List[dict] = (), usage: dict = None) -> AsyncIterator[str]:
+        """Stream answer chunks; the Gemini stream holds one llm-stage slot until it ends."""
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def pump():
+            try:
+                for text in self.explainer.answer_query_stream(query, app_id, history, usage):
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(chunks.put_nowait, text)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, done)
+
+        task = asyncio.ensure_future(executors.run("llm", pump))
+        try:
+            while True:
+                text = await chunks.get()
+                if text is done:
+                    break
+                yield text
+            await task
+        finally:
+            # Client went away: let the worker thread drop the rest of the stream.
+            stop.set()
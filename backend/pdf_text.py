@@ -0,0 +1,201 @@
+import os
+import time
+import threading
+from typing import Callable, List, Optional
+
+import pdfplumber
+import pypdfium2 as pdfium
+
+from backend import tracing
+
+# "fast" reads the PDF's text layer with pdfium; "layout" runs pdfplumber's layout analysis on every page.
+PDF_TEXT_MODE = os.getenv("PDF_TEXT_MODE", "fast")
+# Pages read per document; 0 reads them all.
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 20))
+# Layout analysis is the fallback when the text layer looks broken: it fails, or has
+# fewer than PDF_MIN_CHARS_PER_PAGE characters per page read. A document that simply
+# lacks the wanted fields is not re-read; layout analysis would not find them either.
+PDF_LAYOUT_FALLBACK = os.getenv("PDF_LAYOUT_FALLBACK", "1").lower() not in ("0", "false", "no")
+PDF_MIN_CHARS_PER_PAGE = int(os.getenv("PDF_MIN_CHARS_PER_PAGE", 10))
+
+# pdfium is not thread-safe; documents are extracted on several threads per process.
+_pdfium_lock = threading.Lock()
+
+pdf_pages = tracing.metrics.counter("pdf_pages_total", "PDF pages read, by text mode.", ("mode",))
+pdf_page_seconds = tracing.metrics.histogram("pdf_page_duration_seconds", "Time to read one PDF page, by text mode.", ("mode",))
+pdf_fallbacks = tracing.metrics.counter("pdf_layout_fallbacks_total", "Documents re-read with layout analysis, by reason.", ("reason",))
+
+
+class PdfText:
+    """Text read from one PDF and what it cost."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pages: List[str] = []
+        self.page_count = 0
+        self.mode = None
+        self.early_exit = False
+        self.fallback = None
+        self.timed_out = False
+        self.seconds = 0.0
+        self.error = None
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.pages)
+
+    @property
+    def ms_per_page(self) -> float:
+        return round(self.seconds * 1e3 / len(self.pages), 3) if self.pages else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "pages": len(self.pages),
+            "page_count": self.page_count,
+            "mode": self.mode,
+            "early_exit": self.early_exit,
+            "fallback": self.fallback,
+            "timed_out": self.timed_out,
+            "ms": round(self.seconds * 1e3, 3),
+            "ms_per_page": self.ms_per_page,
+        }
+
+
+class PdfStats:
+    """Per-process totals, so scripts can report pages and time per page without a metrics scrape."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"documents": 0, "pages": 0, "seconds": 0.0, "early_exits": 0, "fallbacks": 0}
+
+    def record(self, result: PdfText):
+        with self._lock:
+            self.counters["documents"] += 1
+            self.counters["pages"] += len(result.pages)
+            self.counters["seconds"] += result.seconds
+            self.counters["early_exits"] += int(result.early_exit)
+            self.counters["fallbacks"] += int(result.fallback is not None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def stats(self) -> dict:
+        counters = self.snapshot()
+        pages = counters["pages"]
+        return {**counters, "seconds": round(counters["seconds"], 3), "ms_per_page": round(counters["seconds"] * 1e3 / pages, 3) if pages else 0.0}
+
+
+pdf_stats = PdfStats()
+
+
+def _page_limit(page_count: int, max_pages: int) -> int:
+    return min(page_count, max_pages) if max_pages and max_pages > 0 else page_count
+
+
+def _out_of_time(result: PdfText, deadline: Optional[float]) -> bool:
+    if deadline is not None and time.monotonic() >= deadline:
+        result.timed_out = True
+    return result.timed_out
+
+
+def _read_fast(result: PdfText, max_pages: int, until: Optional[Callable[[str], bool]], deadline: Optional[float] = None):
+    with _pdfium_lock:
+        doc = pdfium.PdfDocument(result.path)
+    try:
+        with _pdfium_lock:
+            result.page_count = len(doc)
+        for i in range(_page_limit(result.page_count, max_pages)):
+            if _out_of_time(result, deadline):
+                break
+            start = time.perf_counter()
+            with _pdfium_lock:
+                page = doc[i]
+                textpage = page.get_textpage()
+                text = textpage.get_text_range()
+                textpage.close()
+                page.close()
+            result.pages.append(text.replace("\r\n", "\n"))
+            pdf_page_seconds.observe(time.perf_counter() - start, mode="fast")
+            if until is not None and until(result.text):
+                result.early_exit = True
+                break
+    finally:
+        with _pdfium_lock:
+            doc.close()
+    pdf_pages.inc(len(result.pages), mode="fast")
+
+
+def _read_layout(result: PdfText, max_pages: int, until: Optional[Callable[[str], bool]], deadline: Optional[float] = None):
+    with pdfplumber.open(result.path) as pdf:
+        result.page_count = len(pdf.pages)
+        for page in pdf.pages[:_page_limit(result.page_count, max_pages)]:
+            if _out_of_time(result, deadline):
+                break
+            start = time.perf_counter()
+            result.pages.append(page.extract_text() or "")
+            # Release the parsed layout objects; long statements otherwise keep every page in memory.
+            page.close()
+            pdf_page_seconds.observe(time.perf_counter() - start, mode="layout")
+            if until is not None and until(result.text):
+                result.early_exit = True
+                break
+    pdf_pages.inc(len(result.pages), mode="layout")
+
+
+def _fallback_reason(result: PdfText) -> Optional[str]:
+    if result.timed_out:
+        return None
+    if result.error:
+        return "error"
+    if result.early_exit:
+        return None
+    if result.pages and len(result.text.strip()) < PDF_MIN_CHARS_PER_PAGE * len(result.pages):
+        return "sparse"
+    return None
+
+
+def extract_pdf_text(path: str, until: Callable[[str], bool] = None, max_pages: int = None, mode: str = None, layout_fallback: bool = None,
+                     deadline: float = None) -> PdfText:
+    """Read a PDF page by page, stopping early once `until(text_so_far)` is true.
+
+    Extractors pass `until` to say when they have found their fields, so a
+    statement whose salary line is on page one is not read to the end. No
+    page is started after `deadline` (a time.monotonic() value); the result
+    is then marked `timed_out`.
+    """
+    max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+    mode = mode or PDF_TEXT_MODE
+    layout_fallback = PDF_LAYOUT_FALLBACK if layout_fallback is None else layout_fallback
+    result = PdfText(path)
+    start = time.perf_counter()
+    with tracing.span("pdf.text", mode=mode) as span:
+        result.mode = mode
+        try:
+            (_read_layout if mode == "layout" else _read_fast)(result, max_pages, until, deadline)
+        except Exception as e:
+            result.error = e
+
+        reason = _fallback_reason(result) if mode != "layout" and layout_fallback else None
+        if reason:
+            pdf_fallbacks.inc(reason=reason)
+            retry = PdfText(path)
+            retry.mode = "layout"
+            try:
+                _read_layout(retry, max_pages, until, deadline)
+            except Exception as e:
+                retry.error = e
+            result.timed_out = retry.timed_out
+            if retry.error is None and not retry.timed_out:
+                result = retry
+            elif result.error is not None and retry.error is not None:
+                result.error = retry.error
+            result.fallback = reason
+
+        result.seconds = time.perf_counter() - start
+        if result.error is not None:
+            span.fail(result.error)
+            print(f"[WARN] Could not extract text from PDF {path}: {result.error}")
+        span.set(pages=len(result.pages), page_count=result.page_count, early_exit=result.early_exit, fallback=result.fallback, timed_out=result.timed_out)
+    pdf_stats.record(result)
+    return result
@@ -0,0 +1,430 @@
+import os
+import re
+import json
+import math
+import time
+import zlib
+import queue
+import threading
+import numpy as np
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+RETRIEVAL_INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", "data/index")
+RETRIEVAL_SEGMENT_POSTINGS = int(os.getenv("RETRIEVAL_SEGMENT_POSTINGS", 65536))
+RETRIEVAL_SAVE_EVERY = int(os.getenv("RETRIEVAL_SAVE_EVERY", 500))
+RETRIEVAL_SYNC_INTERVAL = float(os.getenv("RETRIEVAL_SYNC_INTERVAL", 30))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 3))
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it my of on or so the their this to was what when "
+    "which who why will with you your".split()
+)
+
+# Programme rules the chatbot should be able to cite without an app_id.
+POLICY_DOCUMENTS = {
+    "policy:decisions": "Eligibility decisions are approve, soft-decline or reject. The model looks at per capita income, which is monthly income divided by family size, together with age, employment status, assets, liabilities and credit score.",
+    "policy:approve": "Approve: per capita income is low, roughly under 300 AED per family member per month. Approved applicants are offered upskilling and job matching support.",
+    "policy:soft-decline": "Soft-decline: per capita income is marginal, roughly 300 to 700 AED per family member per month. Applicants are offered financial counseling and may reapply if income drops or family size grows.",
+    "policy:reject": "Reject: per capita income is sufficient, above roughly 700 AED per family member per month. Applicants may reapply if their circumstances change.",
+    "policy:documents": "Required documents: applicants upload a bank statement, Emirates ID, resume, credit report and an assets and liabilities spreadsheet. Salary is read from the bank statement, name and date of birth from the Emirates ID.",
+    "policy:improve": "To improve eligibility, make sure reported income and family size are accurate, upload all documents, and keep the bank statement showing salary deposits. Counseling and upskilling programmes can help increase future income.",
+}
+
+
+def _fold(token: str) -> str:
+    # Plural folding only ("documents" -> "document"); anything smarter needs a stemmer dependency.
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def features(text: str) -> Dict[str, int]:
+    """Term counts for unigrams and bigrams, stopwords removed."""
+    tokens = [_fold(t) for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+    counts = {}
+    for feature in tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]:
+        counts[feature] = counts.get(feature, 0) + 1
+    return counts
+
+
+def embed(text: str, normalize: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Sparse hashed term-frequency vector as (term hashes, weights); deterministic and offline.
+
+    Terms are hashed into the full 32-bit space, so unlike a small dense
+    hashing trick two unrelated words practically never share a dimension.
+    """
+    counts = {}
+    for feature, tf in features(text).items():
+        h = zlib.crc32(feature.encode())
+        weight = (1.0 + math.log(tf)) * (0.5 if "_" in feature else 1.0)
+        counts[h] = counts.get(h, 0.0) + weight
+    terms = np.fromiter(counts.keys(), dtype=np.uint32, count=len(counts))
+    weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    if normalize and len(weights):
+        weights /= np.linalg.norm(weights)
+    return terms, weights
+
+
+def application_text(record: dict) -> str:
+    application = record.get("application") or {}
+    parts = [
+        f"decision {record.get('decision')}",
+        "reasons " + " ".join(record.get("reasons") or []),
+        "recommendations " + " ".join(record.get("recommendations") or []),
+    ]
+    if application.get("reported_income") is not None:
+        parts.append(f"monthly income {application['reported_income']} AED family size {application.get('family_size')}")
+    if record.get("explanation"):
+        parts.append(record["explanation"])
+    return ". ".join(parts)
+
+
+def document_text(doc_id: str, store=None) -> Optional[str]:
+    if doc_id in POLICY_DOCUMENTS:
+        return POLICY_DOCUMENTS[doc_id]
+    record = store.get(doc_id) if store is not None else None
+    return application_text(record) if record else None
+
+
+class _Segment:
+    """Immutable block of postings grouped by term (CSR layout)."""
+
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, docs: np.ndarray, weights: np.ndarray):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.weights = weights
+
+    @classmethod
+    def build(cls, terms: np.ndarray, docs: np.ndarray, weights: np.ndarray) -> "_Segment":
+        order = np.lexsort((docs, terms))
+        terms, docs, weights = terms[order], docs[order], weights[order]
+        unique, starts = np.unique(terms, return_index=True)
+        offsets = np.append(starts, len(terms)).astype(np.int64)
+        return cls(unique.astype(np.uint32), offsets, docs.astype(np.int32), weights.astype(np.float16))
+
+    def postings(self, alive: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        terms, docs, weights = np.repeat(self.terms, np.diff(self.offsets)), self.docs, self.weights
+        if alive is not None:
+            keep = alive[docs]
+            terms, docs, weights = terms[keep], docs[keep], weights[keep]
+        return terms, docs, weights
+
+    @classmethod
+    def merge(cls, a: "_Segment", b: "_Segment", alive: Optional[np.ndarray] = None) -> "_Segment":
+        """One segment holding both; with `alive`, postings of dead documents are dropped."""
+        return cls.build(*(np.concatenate(columns) for columns in zip(a.postings(alive), b.postings(alive))))
+
+    def lookup(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        i = np.searchsorted(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return self.docs[:0], self.weights[:0]
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return self.docs[lo:hi], self.weights[lo:hi]
+
+    def __len__(self):
+        return len(self.docs)
+
+    @property
+    def nbytes(self) -> int:
+        return self.terms.nbytes + self.offsets.nbytes + self.docs.nbytes + self.weights.nbytes
+
+
+class RetrievalIndex:
+    """Incremental sparse-vector index with cosine top-k over inverted postings.
+
+    New postings go to a small append buffer that queries scan directly; full
+    buffers are frozen into sorted segments, and similar-sized segments are
+    merged so a query touches O(log n) of them. Re-indexing a document marks
+    its old postings dead; merges drop them, and once dead documents outnumber
+    live ones every segment is rewritten with the live documents renumbered.
+    A record already indexed at the same `created_at` is skipped. Documents
+    are embedded on a background thread, off the request path.
+    """
+
+    def __init__(self, directory: str = RETRIEVAL_INDEX_DIR, segment_postings: int = RETRIEVAL_SEGMENT_POSTINGS, save_every: int = RETRIEVAL_SAVE_EVERY):
+        self.directory = Path(directory) if directory else None
+        self.segment_postings = segment_postings
+        self.save_every = save_every
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._syncing = threading.Lock()
+        self._doc_ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        # created_at of the record each application was indexed from
+        self._versions: Dict[str, str] = {}
+        self._alive = np.zeros(1024, dtype=bool)
+        self._segments: List[_Segment] = []
+        self._reset_buffer()
+        self.high_water = ""
+        self._unsaved = 0
+        self._synced_at = 0.0
+        self._queue = queue.Queue()
+        self._load()
+        self._worker = threading.Thread(target=self._index_loop, name="retrieval-index", daemon=True)
+        self._worker.start()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _reset_buffer(self):
+        self._buf_terms, self._buf_docs, self._buf_weights = array("I"), array("i"), array("f")
+
+    def _load(self):
+        if not self.directory or not (self.directory / "meta.json").exists():
+            return
+        try:
+            with open(self.directory / "meta.json") as f:
+                meta = json.load(f)
+            with np.load(self.directory / "segments.npz") as data:
+                segments = [
+                    _Segment(data[f"terms_{i}"], data[f"offsets_{i}"], data[f"docs_{i}"], data[f"weights_{i}"])
+                    for i in range(meta["segments"])
+                ]
+                alive = data["alive"]
+            self._doc_ids = meta["doc_ids"]
+            self._alive = np.zeros(max(1024, len(alive)), dtype=bool)
+            self._alive[:len(alive)] = alive
+            self._positions = {doc_id: i for i, doc_id in enumerate(self._doc_ids) if alive[i]}
+            self._segments = segments
+            self._versions = meta.get("versions", {})
+            self.high_water = meta.get("high_water", "")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] Could not load retrieval index: {e}")
+
+    def save(self):
+        if not self.directory:
+            return
+        with self._save_lock:
+            with self._lock:
+                self._freeze()
+                segments = list(self._segments)
+                alive = self._alive[:len(self._doc_ids)].copy()
+                meta = {"doc_ids": list(self._doc_ids), "segments": len(segments), "versions": dict(self._versions),
+                        "high_water": self.high_water}
+                self._unsaved = 0
+            arrays = {"alive": alive}
+            for i, segment in enumerate(segments):
+                arrays.update({f"terms_{i}": segment.terms, f"offsets_{i}": segment.offsets, f"docs_{i}": segment.docs, f"weights_{i}": segment.weights})
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / "segments.tmp.npz", "wb") as f:
+                np.savez(f, **arrays)
+            with open(self.directory / "meta.tmp.json", "w") as f:
+                json.dump(meta, f)
+            os.replace(self.directory / "segments.tmp.npz", self.directory / "segments.npz")
+            os.replace(self.directory / "meta.tmp.json", self.directory / "meta.json")
+
+    def _freeze(self):
+        if not self._buf_docs:
+            return
+        docs = np.frombuffer(self._buf_docs, dtype=np.int32).copy()
+        keep = self._alive[docs]
+        segment = _Segment.build(
+            np.frombuffer(self._buf_terms, dtype=np.uint32)[keep],
+            docs[keep],
+            np.frombuffer(self._buf_weights, dtype=np.float32)[keep],
+        )
+        self._reset_buffer()
+        self._segments.append(segment)
+        # Keep segment sizes roughly geometric so merges stay amortised O(log n).
+        while len(self._segments) > 1 and len(self._segments[-2]) <= 2 * len(self._segments[-1]):
+            b, a = self._segments.pop(), self._segments.pop()
+            self._segments.append(_Segment.merge(a, b, self._alive))
+        if len(self._doc_ids) - len(self._positions) > len(self._positions):
+            self._compact()
+
+    def _compact(self):
+        """Renumber the live documents densely and drop every dead posting and document id.
+
+        Builds new segments, id list and mask rather than editing them, so a
+        search holding the old ones still reads a consistent snapshot.
+        """
+        n = len(self._doc_ids)
+        alive = self._alive[:n]
+        live = np.flatnonzero(alive)
+        renumber = np.full(n, -1, dtype=np.int32)
+        renumber[live] = np.arange(len(live), dtype=np.int32)
+        segments = []
+        for segment in self._segments:
+            terms, docs, weights = segment.postings(alive)
+            if len(docs):
+                segments.append(_Segment.build(terms, renumber[docs], weights))
+        self._segments = segments
+        self._doc_ids = [self._doc_ids[i] for i in live.tolist()]
+        self._positions = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+        self._alive = np.zeros(max(1024, 2 * len(live)), dtype=bool)
+        self._alive[:len(live)] = True
+
+    def add(self, doc_id: str, text: str, version: Optional[str] = None):
+        terms, weights = embed(text)
+        with self._lock:
+            if version:
+                self._versions[doc_id] = version
+            else:
+                self._versions.pop(doc_id, None)
+            old = self._positions.get(doc_id)
+            if old is not None:
+                self._alive[old] = False
+            docno = len(self._doc_ids)
+            if docno == len(self._alive):
+                self._alive = np.concatenate([self._alive, np.zeros(len(self._alive), dtype=bool)])
+            self._doc_ids.append(doc_id)
+            self._positions[doc_id] = docno
+            self._alive[docno] = True
+            self._buf_terms.extend(terms.tolist())
+            self._buf_docs.extend([docno] * len(terms))
+            self._buf_weights.extend(weights.tolist())
+            if len(self._buf_docs) >= self.segment_postings:
+                self._freeze()
+            self._unsaved += 1
+
+    def add_records(self, records: Iterable[dict], advance: bool = False):
+        """Index saved applications; `advance` moves the store sync mark past them."""
+        for record in records:
+            if record.get("app_id"):
+                # Sync replays records this worker already indexed from its own writer.
+                if not record.get("created_at") or self._versions.get(record["app_id"]) != record["created_at"]:
+                    self.add(record["app_id"], application_text(record), version=record.get("created_at"))
+                if advance:
+                    self.high_water = max(self.high_water, record.get("created_at") or "")
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def enqueue(self, records: List[dict], advance: bool = False):
+        self._queue.put((list(records), advance))
+
+    def _index_loop(self):
+        while True:
+            records, advance = self._queue.get()
+            try:
+                self.add_records(records, advance=advance)
+            except Exception as e:
+                print(f"[WARN] Could not index {len(records)} records: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+    def ensure_policies(self):
+        for doc_id, text in POLICY_DOCUMENTS.items():
+            if doc_id not in self._positions:
+                self.add(doc_id, text)
+
+    def sync_from_store(self, store, batch_size: int = 1000):
+        """Index records other workers saved since our high-water mark.
+
+        Only this path advances the mark: records this worker indexed straight
+        from its own writer may be newer than ones another worker has yet to commit.
+        """
+        self._synced_at = time.monotonic()
+        for records in store.iter_since(self.high_water, batch_size=batch_size):
+            self.add_records(records, advance=True)
+
+    def maybe_sync(self, store):
+        if time.monotonic() - self._synced_at >= RETRIEVAL_SYNC_INTERVAL and not self._syncing.locked():
+            self._synced_at = time.monotonic()
+            threading.Thread(target=self._sync_once, args=(store,), daemon=True).start()
+
+    def _sync_once(self, store):
+        if not self._syncing.acquire(blocking=False):
+            return
+        try:
+            self.sync_from_store(store)
+        except Exception as e:
+            print(f"[WARN] Could not sync retrieval index: {e}")
+        finally:
+            self._syncing.release()
+
+    def search(self, query: str, k: int = 5) -> List[dict]:
+        terms, weights = embed(query, normalize=False)
+        with self._lock:
+            doc_ids = self._doc_ids
+            n = len(doc_ids)
+            alive = self._alive
+            live = len(self._positions)
+            segments = list(self._segments)
+            buffered = (
+                np.frombuffer(self._buf_terms, dtype=np.uint32).copy(),
+                np.frombuffer(self._buf_docs, dtype=np.int32).copy(),
+                np.frombuffer(self._buf_weights, dtype=np.float32).copy(),
+            )
+        if not live or not len(terms):
+            return []
+
+        matched, query_norm = [], 0.0
+        for term, weight in zip(terms.tolist(), weights.tolist()):
+            found = [segment.lookup(term) for segment in segments]
+            mask = buffered[0] == term
+            found.append((buffered[1][mask], buffered[2][mask]))
+            df = sum(len(docs) for docs, _ in found)
+            if not df:
+                continue
+            # Documents carry unit tf vectors; idf is applied on the query side only.
+            q = weight * math.log(1.0 + live / df)
+            query_norm += q * q
+            matched.append((q, found))
+        if not matched:
+            return []
+
+        scores = np.zeros(n, dtype=np.float32)
+        for q, found in matched:
+            q = np.float32(q)
+            for docs, doc_weights in found:
+                # A document has at most one posting per term, so plain fancy-index += is safe.
+                scores[docs] += doc_weights * q
+        scores[~alive[:n]] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if not len(candidates):
+            return []
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        query_norm = math.sqrt(query_norm)
+        return [{"id": doc_ids[i], "score": round(float(scores[i]) / query_norm, 4)} for i in top]
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: postings, liveness mask, the document-id tables and indexed versions."""
+        with self._lock:
+            postings = sum(segment.nbytes for segment in self._segments)
+            buffered = 12 * len(self._buf_docs)
+            # str object + list slot per document id, dict entry per live document
+            ids = sum(49 + len(doc_id) for doc_id in self._doc_ids) + 8 * len(self._doc_ids)
+            positions = 100 * len(self._positions)
+            versions = 140 * len(self._versions)
+            return int(postings + buffered + self._alive.nbytes + ids + positions + versions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self),
+                "dead_documents": len(self._doc_ids) - len(self._positions),
+                "segments": len(self._segments),
+                "postings": sum(len(segment) for segment in self._segments) + len(self._buf_docs),
+                "memory_bytes": self.memory_bytes(),
+                "pending_batches": self._queue.qsize(),
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_retrieval_index() -> RetrievalIndex:
+    """Process-wide index, fed by the application store's writer thread."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from backend.application_store import get_application_store
+
+                index = RetrievalIndex()
+                index.ensure_policies()
+                store = get_application_store()
+                store.add_listener(index.enqueue)
+                index.maybe_sync(store)
+                _index = index
+    return _index
@@ -0,0 +1,85 @@
+import os
+import re
+import threading
+from typing import List, Optional
+
+SALARY_RULE_MIN_CONFIDENCE = float(os.getenv("SALARY_RULE_MIN_CONFIDENCE", 0.8))
+
+AMOUNT = r"(?:AED|Dhs?\.?)?\s*([\d,]+(?:\.\d{1,2})?)\s*(?:AED|Dhs?)?"
+
+
+class SalaryRule:
+    def __init__(self, name: str, pattern: str, confidence: float):
+        self.name = name
+        self.regex = re.compile(pattern, re.IGNORECASE)
+        self.confidence = confidence
+
+
+class SalaryMatch:
+    def __init__(self, amount: float, confidence: float, rule: str):
+        self.amount = amount
+        self.confidence = confidence
+        self.rule = rule
+
+    def to_dict(self) -> dict:
+        return {"amount": self.amount, "confidence": self.confidence, "rule": self.rule}
+
+
+# Ordered from the most specific bank layout to the loosest fallback.
+SALARY_RULES = [
+    # "Date: 2025-10-10 | Description: Salary Deposit | Amount: 5000 AED"
+    SalaryRule("labelled_columns", r"Description:\s*Salary\s+(?:Deposit|Credit|Transfer)\s*\|\s*Amount:\s*" + AMOUNT, 0.98),
+    # "Date: 2025-01-01 | Salary Deposit | 7000 AED"
+    SalaryRule("pipe_columns", r"Salary\s+(?:Deposit|Credit|Transfer)\s*\|\s*" + AMOUNT, 0.95),
+    # "10/01 SALARY CREDIT ACME LLC 5,000.00 AED" and similar single-line formats
+    SalaryRule("salary_line", r"(?:Salary|Payroll|WPS)\s+(?:Deposit|Credit|Transfer|Payment)[^\d\n\-|]{0,40}" + r"(?:AED|Dhs?\.?)?\s*([\d,]+(?:\.\d{1,2})?)\s*(?:AED|Dhs?)\b", 0.85),
+    SalaryRule("salary_keyword", r"Salary[^\d\n\-]{0,40}([\d,]+(?:\.\d{1,2})?)", 0.6),
+]
+
+
+class SalaryRuleEngine:
+    def __init__(self, rules: List[SalaryRule] = None, min_confidence: float = SALARY_RULE_MIN_CONFIDENCE):
+        self.rules = rules if rules is not None else SALARY_RULES
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self.counters = {"rule": 0, "llm": 0, "cache": 0}
+
+    def match(self, text: str) -> Optional[SalaryMatch]:
+        for rule in self.rules:
+            amounts = []
+            for m in rule.regex.finditer(text or ""):
+                try:
+                    amounts.append(float(m.group(1).replace(",", "")))
+                except ValueError:
+                    continue
+            amounts = [a for a in amounts if a > 0]
+            if not amounts:
+                continue
+            confidence = rule.confidence
+            if len(set(amounts)) > 1:
+                # Several different salary lines: take the latest, but trust it less.
+                confidence *= 0.8
+            return SalaryMatch(amounts[-1], round(confidence, 4), rule.name)
+        return None
+
+    def confident_match(self, text: str) -> Optional[SalaryMatch]:
+        match = self.match(text)
+        if match and match.confidence >= self.min_confidence:
+            return match
+        return None
+
+    def record(self, documents: list):
+        with self._lock:
+            for doc in documents:
+                source = doc.get("field_sources", {}).get("reported_income")
+                if not source:
+                    continue
+                path = source["path"] if doc.get("cache", "miss") == "miss" else "cache"
+                self.counters[path] = self.counters.get(path, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+
+salary_rules = SalaryRuleEngine()
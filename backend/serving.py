@@ -0,0 +1,286 @@
+import os
+import gc
+import sys
+import json
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import resource
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+from backend import tracing
+
+# How many API worker processes /ready waits for; serve() sets it in its children.
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", 1))
+# True in workers forked by serve(), which resumes interrupted jobs itself before forking.
+SERVE_SUPERVISED = False
+SERVE_STATE_DIR = os.getenv("SERVE_STATE_DIR", "data/run")
+SERVE_STATE_INTERVAL = float(os.getenv("SERVE_STATE_INTERVAL", 15))
+# Warm-up steps that must succeed before /ready says yes; the others are only reported.
+SERVE_WARMUP_REQUIRED = [s.strip() for s in os.getenv("SERVE_WARMUP_REQUIRED", "model,ocr").split(",") if s.strip()]
+
+
+def memory_usage(pid: str = "self") -> dict:
+    """Resident memory of a process, split into what it shares with its siblings and what it does not.
+
+    PSS charges each shared page to the processes mapping it in equal parts, so
+    summing it over the workers gives their real footprint.
+    """
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    usage[name] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    if "Rss" in usage:
+        return {
+            "rss_bytes": usage["Rss"],
+            "pss_bytes": usage.get("Pss"),
+            "shared_bytes": usage.get("Shared_Clean", 0) + usage.get("Shared_Dirty", 0),
+            "private_bytes": usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0),
+        }
+    # No /proc (macOS, or a restricted container): peak RSS is the best there is.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"rss_bytes": peak if sys.platform == "darwin" else peak * 1024, "pss_bytes": None, "shared_bytes": None, "private_bytes": None}
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WorkerState:
+    """Warm-up progress and memory of this API worker, shared with its siblings through small files.
+
+    Any worker can answer /ready for the whole deployment: it is ready once
+    `expected` workers of the same group have finished warming up.
+    """
+
+    def __init__(self, state_dir: str = SERVE_STATE_DIR, expected: int = SERVE_WORKERS, group: str = None,
+                 required: List[str] = None):
+        self.state_dir = Path(state_dir)
+        self.expected = max(1, expected)
+        # Workers forked by one supervisor share its pid as their group; a standalone process is its own group.
+        self.group = group or str(os.getpid())
+        self.required = SERVE_WARMUP_REQUIRED if required is None else required
+        self.pid = os.getpid()
+        self.started_at = time.time()
+        self.warmup: Dict[str, dict] = {}
+        self.warming = False
+        self.ready = False
+
+    @property
+    def path(self) -> Path:
+        return self.state_dir / f"worker-{self.pid}.json"
+
+    async def warm_up(self, steps: Dict[str, Callable[[], Awaitable]]) -> bool:
+        """Run each warm-up step once, recording its time or error; returns whether this worker is ready."""
+        self.warming = True
+        self.publish()
+        for name, step in steps.items():
+            start = time.perf_counter()
+            try:
+                await step()
+                self.warmup[name] = {"ms": round((time.perf_counter() - start) * 1e3, 1)}
+            except Exception as e:
+                self.warmup[name] = {"ms": round((time.perf_counter() - start) * 1e3, 1), "error": f"{type(e).__name__}: {e}"}
+                print(f"[WARN] Warm-up step {name} failed: {e}")
+        self.warming = False
+        self.ready = all(name in self.warmup and "error" not in self.warmup[name] for name in self.required)
+        self.publish()
+        return self.ready
+
+    def to_dict(self) -> dict:
+        return {
+            "pid": self.pid,
+            "group": self.group,
+            "ready": self.ready,
+            "warming": self.warming,
+            "warmup": self.warmup,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "memory": memory_usage(),
+            "updated_at": time.time(),
+        }
+
+    def publish(self):
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.to_dict()))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[WARN] Could not write worker state: {e}")
+
+    async def keep_publishing(self, interval: float = SERVE_STATE_INTERVAL):
+        # Refreshes the memory figures the siblings report for this worker.
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.publish)
+
+    def discard(self):
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+    def workers(self) -> List[dict]:
+        """Live workers of this group, this one first, with fresh figures for this one."""
+        found = [self.to_dict()]
+        for path in self.state_dir.glob("worker-*.json") if self.state_dir.exists() else []:
+            try:
+                state = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if state.get("pid") == self.pid or state.get("group") != self.group:
+                continue
+            if not _alive(state["pid"]):
+                path.unlink(missing_ok=True)
+                continue
+            found.append(state)
+        return found
+
+    def readiness(self) -> dict:
+        workers = self.workers()
+        ready_workers = sum(1 for w in workers if w["ready"])
+        return {
+            "ready": self.ready and ready_workers >= self.expected,
+            "expected_workers": self.expected,
+            "ready_workers": ready_workers,
+            "required": self.required,
+            "workers": workers,
+        }
+
+
+worker_state = WorkerState()
+
+tracing.metrics.gauge(
+    "worker_memory_bytes", "Memory of this API worker: rss, pss (shared pages split between processes), shared and private.", ("kind",),
+    collect=lambda: {(k[:-len("_bytes")],): float(v) for k, v in memory_usage().items() if v is not None},
+)
+
+
+def preload():
+    """Done once in the supervisor: import the app's heavy modules and load the model, then fork.
+
+    The children find the model in model_registry's preload cache and share its
+    pages copy-on-write. Nothing here may start a thread or open a connection
+    the children would inherit.
+    """
+    start = time.perf_counter()
+    from backend.agents import preload_eligibility_model
+    from backend.jobs import JobQueue
+    try:
+        model = preload_eligibility_model()
+        print(f"Preloaded model {model.version} in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        print(f"[WARN] Could not preload the model; each worker will load its own: {e}")
+    # Resume interrupted jobs once here; workers only take over jobs whose lease lapses.
+    queue = JobQueue()
+    queue.recover()
+    queue.close()
+    # Objects that exist now are never collected, so the children's GC does not write to (and copy) their pages.
+    gc.collect()
+    gc.freeze()
+
+
+def _run_worker(sock: socket.socket, app: str, host: str, port: int, workers: int, group: str):
+    global worker_state, SERVE_SUPERVISED
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    # Set before the app is imported, which happens in this process only.
+    SERVE_SUPERVISED = True
+    worker_state = WorkerState(expected=workers, group=group)
+    import uvicorn
+    config = uvicorn.Config(app, host=host, port=port, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(app: str = "backend.main:app", host: str = "0.0.0.0", port: int = 8000, workers: int = 2) -> int:
+    """Pre-forking server: one listening socket, the model loaded once, `workers` uvicorn children.
+
+    uvicorn's own --workers starts each child from scratch (spawn), so every
+    worker would load the model again; forking after preload() shares it.
+    A worker that dies is replaced.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    group = str(os.getpid())
+    state_dir = Path(SERVE_STATE_DIR)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    for stale in state_dir.glob("worker-*.json"):
+        stale.unlink(missing_ok=True)
+    preload()
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(sock, app, host, port, workers, group)
+            except BaseException as e:
+                print(f"[WARN] Worker {os.getpid()} exited: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(workers):
+        spawn(slot)
+    print(f"Serving {app} on {host}:{port} with {workers} workers: {sorted(children)}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        (state_dir / f"worker-{pid}.json").unlink(missing_ok=True)
+        if slot is not None and not stopping:
+            print(f"[WARN] Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; starting a new one")
+            time.sleep(1)
+            spawn(slot)
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the API from several worker processes that share one preloaded model.")
+    parser.add_argument("--app", default="backend.main:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", 2)))
+    args = parser.parse_args()
+    # Through the package module, not __main__, so the workers' backend.serving is the one serve() configures.
+    from backend.serving import serve as run
+    sys.exit(run(args.app, args.host, args.port, args.workers))
@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+TRACE_SLOW_REQUEST_MS = float(os.getenv("TRACE_SLOW_REQUEST_MS", 2000))
+TRACE_SLOW_LOG_PATH = os.getenv("TRACE_SLOW_LOG_PATH", "data/logs/slow_requests.jsonl")
+TRACE_SLOW_KEEP = int(os.getenv("TRACE_SLOW_KEEP", 100))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 500))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+        return lines
+
+
+class Gauge:
+    """Set/inc/dec gauge, or a callback gauge read at scrape time when `collect` is given."""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), collect: Callable[[], Dict[Tuple, float]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(labels.get(n, "") for n in self.labelnames)] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if self.collect is not None:
+            try:
+                items = sorted(self.collect().items())
+            except Exception as e:
+                print(f"[WARN] Could not collect gauge {self.name}: {e}")
+                items = []
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(n, "") for n in self.labelnames))
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = (), collect: Callable = None) -> Gauge:
+        return self._add(Gauge(name, help, labelnames, collect))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("stage_duration_seconds", "Time spent in each pipeline stage or external call.", ("stage",))
+stage_errors = metrics.counter("stage_errors_total", "Stage failures by stage and exception type.", ("stage", "error"))
+stage_in_flight = metrics.gauge("stage_in_flight", "Stage calls currently running in this process.", ("stage",))
+
+
+class Trace:
+    """Spans recorded while serving one request, tagged with the application id once known.
+
+    A `deferred` trace only collects spans: executors use one in worker threads
+    and processes and hand the spans back to the request's trace, which is
+    where they are counted into the stage metrics.
+    """
+
+    def __init__(self, name: str = "", app_id: str = None, deferred: bool = False):
+        self.name = name
+        self.app_id = app_id
+        self.deferred = deferred
+        self.started = time.perf_counter()
+        self.spans: List[dict] = []
+        self.dropped = 0
+
+    def add(self, entry: dict):
+        if len(self.spans) < TRACE_MAX_SPANS:
+            self.spans.append(entry)
+        else:
+            self.dropped += 1
+
+    def stage_totals(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s["name"]] = round(totals.get(s["name"], 0.0) + s["ms"], 3)
+        return dict(sorted(totals.items(), key=lambda kv: -kv[1]))
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def set_app_id(app_id: str):
+    trace = _current.get()
+    if trace is not None:
+        trace.app_id = app_id
+
+
+@contextmanager
+def start_trace(name: str = "", app_id: str = None):
+    trace = Trace(name, app_id)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "error")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.error = None
+
+    def fail(self, error: BaseException):
+        """Mark the span failed for an exception the caller handles itself."""
+        self.error = type(error).__name__
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+def _record(trace: Optional[Trace], name: str, seconds: float, error: str = None, attrs: dict = None):
+    if trace is None or not trace.deferred:
+        stage_seconds.observe(seconds, stage=name)
+        if error:
+            stage_errors.inc(stage=name, error=error)
+    if trace is not None:
+        entry = {"name": name, "ms": round(seconds * 1e3, 3)}
+        if error:
+            entry["error"] = error
+        if attrs:
+            entry["attrs"] = attrs
+        trace.add(entry)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as stage `name`; cheap enough to leave on for every request."""
+    trace = _current.get()
+    s = Span(name, attrs)
+    stage_in_flight.inc(stage=name)
+    start = time.perf_counter()
+    try:
+        yield s
+    except Exception as e:
+        s.fail(e)
+        raise
+    finally:
+        stage_in_flight.dec(stage=name)
+        _record(trace, name, time.perf_counter() - start, s.error, s.attrs)
+
+
+def run_traced(fn: Callable, args: tuple, kwargs: dict):
+    """Executor entry point: run `fn` under a collecting trace and return its spans with the result."""
+    trace = Trace(deferred=True)
+    token = _current.set(trace)
+    try:
+        return fn(*args, **kwargs), trace.spans, None
+    except Exception as e:
+        return None, trace.spans, e
+    finally:
+        _current.reset(token)
+
+
+def absorb(spans: List[dict]):
+    """Count spans collected in a worker and attach them to the current request."""
+    trace = _current.get()
+    for entry in spans:
+        _record(trace, entry["name"], entry["ms"] / 1e3, entry.get("error"), entry.get("attrs"))
+
+
+class SlowRequestLog:
+    """Keeps the last `keep` slow requests and appends each one to a JSON-lines file."""
+
+    def __init__(self, threshold_ms: float = TRACE_SLOW_REQUEST_MS, path: str = TRACE_SLOW_LOG_PATH, keep: int = TRACE_SLOW_KEEP):
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self._recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def maybe_record(self, trace: Trace, total_ms: float, **fields) -> Optional[dict]:
+        if total_ms < self.threshold_ms:
+            return None
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "trace": trace.name,
+            "app_id": trace.app_id,
+            "total_ms": round(total_ms, 1),
+            **fields,
+            "stages": trace.stage_totals(),
+            "spans": trace.spans,
+        }
+        if trace.dropped:
+            entry["dropped_spans"] = trace.dropped
+        breakdown = ", ".join(f"{name} {ms:.0f} ms" for name, ms in list(entry["stages"].items())[:8])
+        print(f"[SLOW] {trace.name} app_id={trace.app_id} {total_ms:.0f} ms: {breakdown}")
+        with self._lock:
+            self._recent.append(entry)
+            if self.path:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    with open(self.path, "a") as f:
+                        f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                except OSError as e:
+                    print(f"[WARN] Could not write slow request log {self.path}: {e}")
+        return entry
+
+    def recent(self, limit: int = 20) -> List[dict]:
+        with self._lock:
+            return list(self._recent)[-limit:][::-1]
+
+
+slow_requests = SlowRequestLog()
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from pathlib import Path
+from typing import List, Optional
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "data/uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", 20 * 1024 * 1024))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", 100 * 1024 * 1024))
+UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", 3600))
+
+SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+MANIFEST = "session.json"
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def safe_filename(name: str) -> str:
+    # Keep the original name (document kind is detected from it) but never a path.
+    name = re.sub(r"[^\w.\- ]", "_", Path(name or "").name).strip(" .")
+    return name or "upload"
+
+
+async def write_upload(upload, directory: str, chunk_size: int = UPLOAD_CHUNK_SIZE, max_bytes: int = UPLOAD_MAX_FILE_BYTES) -> dict:
+    """Copy an UploadFile to `directory` in fixed-size chunks, hashing as it goes.
+
+    Only one chunk is held in memory at a time. Raises UploadTooLarge (and
+    removes the partial file) once more than `max_bytes` have been read.
+    """
+    directory = Path(directory)
+    filename = safe_filename(upload.filename)
+    target = directory / filename
+    stem, suffix = os.path.splitext(filename)
+    n = 1
+    while target.exists():
+        target = directory / f"{stem}_{n}{suffix}"
+        n += 1
+
+    digest = hashlib.sha256()
+    size = 0
+    partial = target.with_name(f".{target.name}.part")
+    try:
+        with open(partial, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{filename} is larger than {max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+        os.replace(partial, target)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    return {"filename": target.name, "path": str(target), "sha256": digest.hexdigest(), "size": size}
+
+
+async def upload_digest(upload, chunk_size: int = UPLOAD_CHUNK_SIZE, max_bytes: int = UPLOAD_MAX_FILE_BYTES) -> str:
+    """SHA-256 of an UploadFile without copying it anywhere; the file is rewound for a later write_upload."""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"{safe_filename(upload.filename)} is larger than {max_bytes} bytes")
+        digest.update(chunk)
+    await upload.seek(0)
+    return digest.hexdigest()
+
+
+class UploadSessions:
+    """Per-request upload directories that later requests can reference by id.
+
+    `/extract` stores the documents once; `/predict` points at the session
+    instead of uploading the same bytes again. A session expires `ttl`
+    seconds after it was last used and `sweep` deletes it from disk.
+    """
+
+    def __init__(self, root: str = UPLOAD_DIR, ttl: float = UPLOAD_SESSION_TTL):
+        self.root = Path(root)
+        self.ttl = ttl
+
+    def _dir(self, session_id: str) -> Path:
+        if not SESSION_ID_RE.match(session_id or ""):
+            raise KeyError(f"Invalid upload session '{session_id}'")
+        return self.root / session_id
+
+    def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        self._dir(session_id).mkdir(parents=True)
+        return session_id
+
+    async def add_files(self, session_id: str, uploads: list, max_request_bytes: int = UPLOAD_MAX_REQUEST_BYTES) -> List[dict]:
+        directory = self._dir(session_id)
+        files, total = [], 0
+        for upload in uploads:
+            remaining = max_request_bytes - total
+            if remaining <= 0:
+                raise UploadTooLarge(f"Upload is larger than {max_request_bytes} bytes")
+            saved = await write_upload(upload, directory, max_bytes=min(UPLOAD_MAX_FILE_BYTES, remaining))
+            total += saved["size"]
+            files.append(saved)
+        self._write_manifest(session_id, (self._read_manifest(session_id) or {"files": []})["files"] + files)
+        return files
+
+    def _write_manifest(self, session_id: str, files: List[dict]):
+        path = self._dir(session_id) / MANIFEST
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"session_id": session_id, "files": files}, f)
+        os.replace(tmp, path)
+
+    def _read_manifest(self, session_id: str) -> Optional[dict]:
+        try:
+            with open(self._dir(session_id) / MANIFEST) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """The session manifest, or None if it is unknown or expired; using it renews the TTL."""
+        path = self._dir(session_id) / MANIFEST
+        try:
+            last_used = os.path.getmtime(path)
+        except OSError:
+            return None
+        if time.time() - last_used > self.ttl:
+            return None
+        manifest = self._read_manifest(session_id)
+        if manifest is not None:
+            os.utime(path)
+            manifest["expires_at"] = time.time() + self.ttl
+        return manifest
+
+    def discard(self, session_id: str):
+        shutil.rmtree(self._dir(session_id), ignore_errors=True)
+
+    def sweep(self) -> int:
+        """Delete expired sessions; returns how many were removed."""
+        if not self.root.exists():
+            return 0
+        removed = 0
+        cutoff = time.time() - self.ttl
+        for path in self.root.iterdir():
+            if not path.is_dir() or not SESSION_ID_RE.match(path.name):
+                continue
+            try:
+                last_used = os.path.getmtime(path / MANIFEST) if (path / MANIFEST).exists() else os.path.getmtime(path)
+            except OSError:
+                continue
+            if last_used < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+
+upload_sessions = UploadSessions()
@@ -0,0 +1,182 @@
+import os
+import re
+import sys
+import json
+import time
+import runpy
+import argparse
+import platform
+import tempfile
+import numpy as np
+from pathlib import Path
+from datetime import datetime, timezone
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pytesseract
+from backend.ocr import ID_CARD_REGIONS, OcrPool, crop_region, normalize, ocr_image
+
+ROOT = Path(__file__).resolve().parents[1]
+DATA_CREATION = ROOT / "data_creation.py"
+RESULTS_PATH = "data/benchmarks/ocr.json"
+# The region-first pipeline must read at least this share of names and DOBs correctly.
+MIN_ACCURACY = 0.9
+
+
+def generate_cards(directory, scales=(1,)):
+    """Run data_creation.py in `directory` and return its Emirates ID images with the name/DOB drawn on them.
+
+    Each card is also saved enlarged by every factor in `scales`, standing in
+    for a phone photo of the same card.
+    """
+    source = DATA_CREATION.read_text()
+    texts = re.findall(r'draw\.text\(\([^)]*\),\s*"([^"]*)"', source)
+    paths = re.findall(r'img\.save\("([^"]*emirates_id[^"]*)"\)', source)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        runpy.run_path(str(DATA_CREATION), run_name="data_creation")
+    finally:
+        os.chdir(cwd)
+
+    cards = []
+    for text, rel in zip(texts, paths):
+        text = text.encode().decode("unicode_escape")
+        truth = {
+            "name": re.search(r"Name:\s*(.+)", text).group(1).strip(),
+            "dob": re.search(r"DOB:\s*(\S+)", text).group(1),
+        }
+        original = Path(directory) / rel
+        for scale in scales:
+            path = original
+            if scale != 1:
+                with Image.open(original) as img:
+                    path = original.with_name(f"{original.stem}_x{scale}{original.suffix}")
+                    img.resize((img.width * scale, img.height * scale), Image.BICUBIC).save(path, quality=92)
+            cards.append({"path": str(path), "scale": scale, "truth": truth})
+    return cards
+
+
+def read_fields(text):
+    name = re.search(r"Name[:;]?\s*(.+)", text)
+    dob = re.search(r"DOB[:;]?\s*(\d{4}-\d{2}-\d{2})", text)
+    return {"name": name.group(1).strip() if name else None, "dob": dob.group(1) if dob else None}
+
+
+def matches(found, truth):
+    return " ".join((found or "").lower().split()) == " ".join(truth.lower().split())
+
+
+def summarize(timings, hits, total):
+    ms = np.asarray(timings) * 1e3
+    return {
+        "n": len(timings),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        **({f"{field}_accuracy": round(hits[field] / total, 4) for field in hits} if total else {}),
+    }
+
+
+def run(cards, repeat=5, workers=2):
+    """Time the old call (whole image, default segmentation) against the normalized, region-first pipeline."""
+    results, skipped = {}, {}
+    # Preprocessing alone runs without tesseract, so it is always measured.
+    timings = []
+    for card in cards * repeat:
+        start = time.perf_counter()
+        with Image.open(card["path"]) as raw:
+            crop_region(normalize(raw), ID_CARD_REGIONS["name_dob"])
+        timings.append(time.perf_counter() - start)
+    results["preprocess"] = summarize(timings, {}, 0)
+
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception:
+        skipped["ocr"] = "tesseract is not installed"
+        return results, skipped
+
+    pool = OcrPool(size=workers)
+    pool.warm()
+    variants = {
+        "baseline_full_image": lambda path: pytesseract.image_to_string(Image.open(path)),
+        "pipeline_region_first": lambda path: ocr_image(path, regions=["name_dob"], until=lambda t: all(read_fields(t).values()), pool=pool).text,
+    }
+    for name, fn in variants.items():
+        timings, hits = [], {"name": 0, "dob": 0}
+        for card in cards * repeat:
+            start = time.perf_counter()
+            text = fn(card["path"])
+            timings.append(time.perf_counter() - start)
+            found = read_fields(text)
+            hits["name"] += matches(found["name"], card["truth"]["name"])
+            hits["dob"] += matches(found["dob"], card["truth"]["dob"])
+        results[name] = summarize(timings, hits, len(cards) * repeat)
+        for scale in sorted({c["scale"] for c in cards}):
+            subset = [c for c in cards if c["scale"] == scale]
+            sub_timings = []
+            for card in subset:
+                start = time.perf_counter()
+                fn(card["path"])
+                sub_timings.append(time.perf_counter() - start)
+            results[name][f"x{scale}_p50_ms"] = round(float(np.percentile(np.asarray(sub_timings) * 1e3, 50)), 3)
+    results["pool"] = pool.stats()
+    return results, skipped
+
+
+def check_accuracy(results, skipped, min_accuracy=MIN_ACCURACY):
+    """Compare the pipeline's name/DOB accuracy with `min_accuracy`; None when OCR was skipped."""
+    if "ocr" in skipped:
+        return None
+    pipeline = results["pipeline_region_first"]
+    failed = {field: pipeline[f"{field}_accuracy"] for field in ("name", "dob") if pipeline[f"{field}_accuracy"] < min_accuracy}
+    return {"min_accuracy": min_accuracy, "passed": not failed, "failed": failed}
+
+
+def main(scales=(1, 5), repeat=5, workers=2, out=RESULTS_PATH, min_accuracy=MIN_ACCURACY):
+    with tempfile.TemporaryDirectory(prefix="ocr-bench-") as workdir:
+        cards = generate_cards(workdir, scales)
+        results, skipped = run(cards, repeat, workers)
+    check = check_accuracy(results, skipped, min_accuracy)
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "cards": len(cards),
+            "scales": list(scales),
+            "repeat": repeat,
+            "workers": workers,
+            "skipped": skipped,
+            "engine": results["pool"]["backend"] if "pool" in results else None,
+        },
+        "results": results,
+        "accuracy_check": check,
+    }
+    print(f"{'variant':<26}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'name acc':>10}{'dob acc':>10}")
+    for name, r in results.items():
+        if "n" in r:
+            print(f"{name:<26}{r['n']:>6}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r.get('name_accuracy', ''):>10}{r.get('dob_accuracy', ''):>10}")
+    for name, reason in skipped.items():
+        print(f"{name:<26} skipped: {reason}")
+    if check is None:
+        print("Accuracy check skipped: tesseract is not installed")
+    else:
+        print(f"Accuracy check (>= {min_accuracy}): {'passed' if check['passed'] else 'FAILED ' + str(check['failed'])}")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR latency and name/DOB accuracy on the Emirates ID cards from data_creation.py.")
+    parser.add_argument("--scales", default="1,5", help="Also test each card enlarged by these factors (phone-photo sizes)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2, help="OCR pool size")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    parser.add_argument("--min-accuracy", type=float, default=MIN_ACCURACY, help="Exit non-zero if name or DOB accuracy is below this")
+    args = parser.parse_args()
+    report = main(tuple(int(s) for s in args.scales.split(",")), args.repeat, args.workers, args.out, args.min_accuracy)
+    if report["accuracy_check"] and not report["accuracy_check"]["passed"]:
+        sys.exit(1)
@@ -0,0 +1,99 @@
+import sys
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.retrieval import RetrievalIndex
+
+DECISIONS = {
+    'approve': (['meets_income_threshold', 'low_per_capita_income'], ['upskill', 'job_match']),
+    'soft-decline': (['marginal_income'], ['counseling']),
+    'reject': (['sufficient_income'], []),
+}
+SENTENCES = [
+    "Your per capita income is below the programme threshold.",
+    "Your household income is close to the limit, so we suggest financial counseling.",
+    "Your income is sufficient for your family size, so support was not granted.",
+    "Uploading a recent bank statement showing salary deposits may change the outcome.",
+    "You qualify for upskilling courses and job matching with partner employers.",
+    "Your credit report shows outstanding liabilities that were taken into account.",
+    "You may reapply if your family size grows or your income drops.",
+    "The Emirates ID date of birth did not match the application form.",
+]
+QUERIES = [
+    "why was my application rejected",
+    "what is the income threshold for approval",
+    "how do I get financial counseling",
+    "can I reapply if my family grows",
+    "job matching and upskilling",
+    "salary deposits in the bank statement",
+    "emirates id date of birth mismatch",
+    "soft-decline marginal income",
+]
+
+
+def synthetic_records(n, seed=0):
+    rng = np.random.default_rng(seed)
+    names = list(DECISIONS)
+    for i in range(n):
+        decision = names[rng.integers(3)]
+        reasons, recommendations = DECISIONS[decision]
+        yield {
+            'app_id': f"app_{i:07d}",
+            'decision': decision,
+            'reasons': reasons,
+            'recommendations': recommendations,
+            'explanation': " ".join(rng.choice(SENTENCES, size=3, replace=False)),
+            'created_at': f"2026-01-01T00:00:00.{i:06d}+00:00",
+            'application': {'reported_income': int(np.clip(rng.normal(1000, 700), 100, 10000)), 'family_size': int(rng.integers(1, 8))},
+        }
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def run(n, repeat, k):
+    rss_before = rss_mb()
+    index = RetrievalIndex(directory=None)
+    start = time.perf_counter()
+    batch = []
+    for record in synthetic_records(n):
+        batch.append(record)
+        if len(batch) == 1000:
+            index.add_records(batch)
+            batch = []
+    index.add_records(batch)
+    build = time.perf_counter() - start
+
+    timings = []
+    for i in range(repeat):
+        query = QUERIES[i % len(QUERIES)]
+        t = time.perf_counter()
+        index.search(query, k=k)
+        timings.append(time.perf_counter() - t)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1e3
+    stats = index.stats()
+    print(
+        f"{n:>9,} docs  build {build:7.1f}s ({n / build:8,.0f} docs/s)  "
+        f"query p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  p99 {p99:7.2f} ms  "
+        f"index {stats['memory_bytes'] / 2**20:7.1f} MB  rss +{rss_mb() - rss_before:7.1f} MB  "
+        f"({stats['postings']:,} postings, {stats['segments']} segments)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure retrieval index build time, query latency and memory.")
+    parser.add_argument("--sizes", default="100000,1000000", help="Comma-separated document counts")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        run(size, args.repeat, args.k)
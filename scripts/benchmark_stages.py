@@ -0,0 +1,351 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime, timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from PIL import Image, ImageDraw
+
+# Every store the pipeline touches lives in a scratch directory, so a benchmark
+# never reads or writes the real data/ and models/ trees. This has to happen
+# before the backend modules read their settings at import time.
+WORKDIR = Path(os.getenv("BENCHMARK_WORKDIR") or tempfile.mkdtemp(prefix="stage-bench-"))
+os.environ["EXTRACTION_CACHE_DIR"] = str(WORKDIR / "cache")
+os.environ["APPLICATION_DB_PATH"] = str(WORKDIR / "applications.db")
+os.environ["RETRIEVAL_INDEX_DIR"] = str(WORKDIR / "index")
+os.environ["MODEL_REGISTRY_DIR"] = str(WORKDIR / "registry")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pytesseract
+import backend.agents as agents
+from backend.agents import DataExtractionAgent, ValidationAgent, EligibilityAgent, ExplanationAgent
+from backend.application_store import get_application_store
+from backend.compiled_forest import compile_pipeline
+from backend.explanations import EXPLAIN_LLM_BATCH_SIZE
+from backend.llm import StubModel
+from backend.model_registry import ActiveModel, LoadedModel, ModelRegistry
+from backend.orchestrator import Orchestrator
+from backend.pdf_text import extract_pdf_text
+from backend.salary_rules import salary_rules
+from train_eligibility_model import build_pipeline, synthetic_dataset
+
+BASELINE_PATH = str(Path(__file__).with_name("benchmark_stages_baseline.json"))
+RESULTS_PATH = "data/benchmarks/stages.json"
+STATEMENT_PAGES = 12
+NAMES = ["Ashish Agarwal", "Aisha Khan", "Omar Ali", "Fatima Noor", "Rahul Mehta", "Sara Haddad"]
+
+
+def generate_applicants(directory, n, seed=0):
+    """Applicant folders shaped like data_creation.py output, each with unique content."""
+    rng = np.random.default_rng(seed)
+    applicants = []
+    for i in range(n):
+        app_id = f"bench_{i:05d}"
+        folder = Path(directory) / app_id
+        folder.mkdir(parents=True, exist_ok=True)
+        name = f"{NAMES[i % len(NAMES)]} {i}"
+        salary = int(rng.integers(1500, 12000))
+        dob = f"{int(rng.integers(1960, 2004))}-{int(rng.integers(1, 13)):02d}-{int(rng.integers(1, 29)):02d}"
+
+        c = canvas.Canvas(str(folder / "bank_statement.pdf"), pagesize=letter)
+        c.drawString(100, 750, f"Bank Statement - Account: {100000000 + i}")
+        # Every fourth applicant is self-employed, which the salary rules leave to the LLM.
+        if i % 4 == 3:
+            c.drawString(100, 730, f"Date: 2025-01-02 | Business Income | {salary} AED")
+        else:
+            c.drawString(100, 730, f"Date: 2025-10-10 | Description: Salary Deposit | Amount: {salary} AED")
+        c.drawString(100, 710, f"Date: 2025-10-08 | Description: Rent Payment | Amount: -{salary // 3} AED")
+        c.drawString(100, 690, f"Closing Balance: {salary - salary // 3} AED")
+        c.save()
+
+        img = Image.new("RGB", (600, 300), "white")
+        ImageDraw.Draw(img).text((50, 50), f"Emirates ID\nName: {name}\nDOB: {dob}\nID: E{1000000 + i}", fill="black")
+        img.save(folder / "emirates_id.jpg")
+
+        c = canvas.Canvas(str(folder / "resume.pdf"), pagesize=letter)
+        c.drawString(100, 750, f"Resume - {name}")
+        c.drawString(100, 730, f"Financial Analyst, {int(rng.integers(1, 20))} years experience")
+        c.save()
+
+        c = canvas.Canvas(str(folder / "credit_report.pdf"), pagesize=letter)
+        c.drawString(100, 750, f"Credit Report - {name}")
+        c.drawString(100, 730, f"Credit Score: {int(rng.integers(450, 820))}")
+        c.save()
+
+        pd.DataFrame({
+            "Category": ["Cash", "Car", "House Loan"],
+            "Type": ["Asset", "Asset", "Liability"],
+            "Value": [int(rng.integers(1000, 50000)), int(rng.integers(0, 30000)), int(rng.integers(0, 40000))],
+        }).to_excel(folder / "assets_liabilities.xlsx", index=False)
+
+        files = sorted(str(p) for p in folder.iterdir())
+        applicants.append({"app_id": app_id, "name": name, "dob": dob, "family_size": int(rng.integers(1, 8)), "files": files})
+    return applicants
+
+
+def long_statement(path, pages=STATEMENT_PAGES, seed=0):
+    """A multi-page bank statement with the salary deposit on page one, like most real statements."""
+    rng = np.random.default_rng(seed)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    c = canvas.Canvas(str(path), pagesize=letter)
+    for page in range(pages):
+        c.drawString(100, 750, f"Bank Statement - Account: 123456789 - Page {page + 1} of {pages}")
+        for line in range(36):
+            day = page * 36 + line
+            if day == 2:
+                entry = f"Description: Salary Deposit | Amount: {int(rng.integers(1500, 12000))} AED"
+            else:
+                entry = f"Description: POS Purchase | Amount: -{int(rng.integers(5, 500))} AED"
+            c.drawString(100, 720 - 18 * line, f"Date: 2025-{day // 28 % 12 + 1:02d}-{day % 28 + 1:02d} | {entry}")
+        c.showPage()
+    c.save()
+    return str(path)
+
+
+def summarize(timings, items_per_call=1):
+    ms = np.asarray(timings) * 1e3
+    total = float(np.sum(timings))
+    return {
+        "n": len(timings),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "throughput_per_s": round(len(timings) * items_per_call / total, 2) if total else None,
+    }
+
+
+def measure(fn, inputs, warmup=1):
+    for x in inputs[:warmup]:
+        fn(x)
+    timings = []
+    for x in inputs:
+        start = time.perf_counter()
+        fn(x)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def tesseract_available():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def build_orchestrator(llm_latency_ms=0.0, model_rows=2000, seed=42):
+    """Real agents wired to a freshly trained forest and the offline LLM stub."""
+    agents._extraction_model = StubModel(llm_latency_ms)
+
+    df = synthetic_dataset(model_rows, seed)
+    pipeline = build_pipeline(n_estimators=200, random_state=seed)
+    pipeline.fit(df[agents.FEATURE_COLUMNS], df["label"])
+    engine = compile_pipeline(pipeline) if agents.ELIGIBILITY_ENGINE == "compiled" else None
+    eligibility = EligibilityAgent.__new__(EligibilityAgent)
+    eligibility.active_model = ActiveModel(ModelRegistry(), LoadedModel("bench", {}, None, engine=engine, pipeline=pipeline), refresh_interval=float("inf"))
+
+    explainer = ExplanationAgent.__new__(ExplanationAgent)
+    explainer.model = StubModel(llm_latency_ms)
+    explainer.processed_dir = WORKDIR / "saved_applications"
+
+    orchestrator = Orchestrator.__new__(Orchestrator)
+    orchestrator.extractor = DataExtractionAgent()
+    orchestrator.validator = ValidationAgent()
+    orchestrator.eligibility = eligibility
+    orchestrator.explainer = explainer
+    return orchestrator
+
+
+def run(applicants=20, repeat=200, batch_size=256, llm_latency_ms=0.0, rounds=1, seed=0):
+    orchestrator = build_orchestrator(llm_latency_ms)
+    extractor, eligibility, explainer = orchestrator.extractor, orchestrator.eligibility, orchestrator.explainer
+    validation = {"address_match": True, "income_match": True, "conflicts": [], "confidence": 0.95}
+    timings, items_per_call, skipped = {}, {}, {}
+    llm_calls = {}
+    if not tesseract_available():
+        skipped["extract.ocr"] = "tesseract is not installed"
+
+    def stage(name, fn, inputs, items=1, warmup=1):
+        items_per_call[name] = items
+        timings.setdefault(name, []).extend(measure(fn, inputs, warmup))
+
+    def cycle(items, n):
+        return [items[i % len(items)] for i in range(n)]
+
+    # Timings from every round are pooled; each round parses freshly generated
+    # documents so the cold stages are never served from the extraction cache.
+    for r in range(rounds):
+        apps = generate_applicants(WORKDIR / f"raw_{r}", applicants, seed + 2 * r)
+
+        def files(kind):
+            return [f for a in apps for f in a["files"] if kind in os.path.basename(f)]
+
+        statements = [extractor._extract_text_from_pdf(f) for f in files("bank_statement")]
+        resumes = [extractor._extract_text_from_pdf(f) for f in files("resume")]
+        reports = [extractor._extract_text_from_pdf(f) for f in files("credit_report")]
+        id_texts = [f"Emirates ID\nName: {a['name']}\nDOB: {a['dob']}\nID: E1" for a in apps]
+
+        # Document parsers, one call per file.
+        stage("extract.pdf_text", extractor._extract_text_from_pdf, files(".pdf"))
+        stage("extract.xlsx", extractor._parse_assets_liabilities, files(".xlsx"))
+        if "extract.ocr" not in skipped:
+            stage("extract.ocr", extractor._extract_text_from_image, files(".jpg"))
+
+        # A long statement: the agent's fast text layer with early exit against layout analysis of every page.
+        statement = long_statement(WORKDIR / f"statements_{r}" / "bank_statement.pdf", STATEMENT_PAGES, seed + r)
+        stage(f"extract.pdf_statement_{STATEMENT_PAGES}p", extractor._extract_text_from_pdf, [statement] * 5)
+        stage(f"extract.pdf_statement_{STATEMENT_PAGES}p_layout", lambda f: extract_pdf_text(f, max_pages=0, mode="layout"), [statement] * 3)
+
+        # Field extractors on already-extracted text.
+        stage("field.salary_rules", salary_rules.confident_match, cycle(statements, repeat))
+        stage("field.income_llm_stub", extractor._extract_income_from_bank_statement, cycle(statements, repeat))
+        stage("field.name_dob", extractor._extract_name_dob_from_text, cycle(id_texts, repeat))
+        stage("field.credit_score", extractor._extract_credit_score, cycle(reports, repeat))
+        stage("field.employment_status", extractor._infer_employment_status, cycle(resumes, repeat))
+
+        # Whole-application extraction: first pass is cold, second is served by the extraction cache.
+        stage("extract.application_cold", extractor.extract, apps, warmup=0)
+        stage("extract.application_cached", extractor.extract, apps, warmup=0)
+
+        parsed = [extractor.extract(a) for a in apps]
+        forms = [{**a, **p["app_form"]} for a, p in zip(apps, parsed)]
+        stage("eligibility.assess_single", lambda a: eligibility.assess(a, {}, validation), cycle(forms, repeat))
+        batch = cycle(forms, batch_size)
+        stage(f"eligibility.assess_batch_{batch_size}", eligibility.assess_many, [batch] * max(5, repeat // 20), items=batch_size)
+
+        assessed = [eligibility.assess(a, p, validation) for a, p in zip(forms, parsed)]
+        explain_inputs = cycle(list(zip(forms, parsed, assessed)), repeat)
+        # Before: one Gemini call per decision. After: local templates, or one call per batch when prose is wanted.
+        items = [(form, validation, a[0], a[1], a[3]) for form, _, a in explain_inputs]
+        batches = [items[i:i + EXPLAIN_LLM_BATCH_SIZE] for i in range(0, len(items), EXPLAIN_LLM_BATCH_SIZE)]
+        for name, fn, inputs, size in [
+            ("explanation.explain_stub", lambda x: explainer.explain(*x[:2], validation, x[2][0], x[2][1], x[2][3], rich=True), explain_inputs, 1),
+            ("explanation.template", lambda x: explainer.explain(*x[:2], validation, x[2][0], x[2][1], x[2][3], rich=False), explain_inputs, 1),
+            (f"explanation.llm_batch_{EXPLAIN_LLM_BATCH_SIZE}", explainer.explain_many, batches, EXPLAIN_LLM_BATCH_SIZE),
+        ]:
+            calls = explainer.model.calls
+            stage(name, fn, inputs, items=size, warmup=0)
+            llm_calls[name] = llm_calls.get(name, 0) + explainer.model.calls - calls
+
+        # End to end on another fresh set so the extraction cache does not hide parsing cost.
+        fresh = generate_applicants(WORKDIR / f"raw_e2e_{r}", applicants, seed + 2 * r + 1)
+        results = []
+        stage("orchestrator.process_application", lambda a: results.append(orchestrator.process_application(a)), fresh, warmup=0)
+
+        get_application_store().save_many([{**res, "application": {k: v for k, v in a.items() if k != "files"}} for res, a in zip(results, fresh)])
+        queries = cycle([(f"why was my application {res['decision']}?", res["app_id"]) for res in results], repeat)
+        stage("explanation.query_prompt", lambda q: explainer._query_prompt(*q), queries)
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "applicants": applicants,
+            "repeat": repeat,
+            "rounds": rounds,
+            "batch_size": batch_size,
+            "llm_latency_ms": llm_latency_ms,
+            "eligibility_engine": agents.ELIGIBILITY_ENGINE,
+            "skipped": skipped,
+        },
+        "stages": {name: summarize(t, items_per_call[name]) for name, t in timings.items()},
+        # Stubbed Gemini requests per explained application, for the explanation variants that call it.
+        "llm_calls_per_item": {name: round(n / (len(timings[name]) * items_per_call[name]), 4) for name, n in llm_calls.items()},
+    }
+
+
+def compare(current, baseline, tolerance=0.3, min_delta_ms=0.05, metrics=("p50_ms",)):
+    """Stages whose latency grew by more than `tolerance` (and `min_delta_ms`) over the baseline."""
+    regressions, improvements = [], []
+    for stage, now in current["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before:
+            continue
+        for metric in metrics:
+            old, new = before.get(metric), now.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            entry = {"stage": stage, "metric": metric, "baseline": old, "current": new, "change": round(change, 4)}
+            if change > tolerance and new - old > min_delta_ms:
+                regressions.append(entry)
+            elif change < -tolerance and old - new > min_delta_ms:
+                improvements.append(entry)
+    return regressions, improvements
+
+
+def print_table(result, baseline=None):
+    print(f"{'stage':<36}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'per s':>11}{'vs base p50':>13}")
+    for stage, s in result["stages"].items():
+        base = (baseline or {}).get("stages", {}).get(stage)
+        delta = f"{(s['p50_ms'] / base['p50_ms'] - 1) * 100:+.0f}%" if base and base.get("p50_ms") else ""
+        print(f"{stage:<36}{s['n']:>6}{s['p50_ms']:>11.3f}{s['p95_ms']:>11.3f}{s['p99_ms']:>11.3f}{s['throughput_per_s'] or 0:>11.1f}{delta:>13}")
+    for stage, reason in result["meta"]["skipped"].items():
+        print(f"{stage:<36} skipped: {reason}")
+    for stage, calls in result.get("llm_calls_per_item", {}).items():
+        print(f"{stage:<36} {calls} LLM calls per application")
+
+
+def load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline per-stage latency benchmark for the agent pipeline.")
+    parser.add_argument("--applicants", type=int, default=20, help="Generated applicant folders (documents are parsed once per applicant)")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls per in-memory stage (field extractors, single assess, prompts)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--rounds", type=int, default=3, help="Repeat every stage on fresh documents and pool the timings")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latency injected into the stubbed Gemini calls")
+    parser.add_argument("--out", default=RESULTS_PATH, help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative slowdown before a stage is flagged")
+    parser.add_argument("--metrics", default="p50_ms", help="Comma-separated metrics to compare, e.g. p50_ms,p95_ms (tails need more --applicants/--repeat to be stable)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    args = parser.parse_args()
+
+    try:
+        result = run(args.applicants, args.repeat, args.batch_size, args.llm_latency_ms, args.rounds)
+    finally:
+        if not os.getenv("BENCHMARK_WORKDIR"):
+            shutil.rmtree(WORKDIR, ignore_errors=True)
+
+    baseline = load_json(args.baseline)
+    print_table(result, baseline)
+    if baseline:
+        regressions, improvements = compare(result, baseline, args.tolerance, metrics=args.metrics.split(","))
+        result["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "metrics": args.metrics.split(","), "regressions": regressions, "improvements": improvements}
+    write_json(result, args.out)
+    print(f"Results written to {args.out}")
+
+    if args.update_baseline:
+        write_json(result, args.baseline)
+        print(f"Baseline updated at {args.baseline}")
+    elif baseline:
+        for r in result["comparison"]["improvements"]:
+            print(f"[INFO] {r['stage']} {r['metric']} improved {r['baseline']:.3f} -> {r['current']:.3f} ms ({r['change']:+.0%})")
+        for r in result["comparison"]["regressions"]:
+            print(f"[WARN] Regression: {r['stage']} {r['metric']} {r['baseline']:.3f} -> {r['current']:.3f} ms ({r['change']:+.0%})")
+        if result["comparison"]["regressions"]:
+            sys.exit(1)
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.compiled_forest import CompiledForest, compile_pipeline
+from backend.extraction_cache import file_sha256
+
+FEATURE_COLUMNS = ['age', 'family_size', 'monthly_income', 'employment_status', 'assets', 'liabilities', 'credit_score']
+
+
+def export(model_path, out_dir):
+    pipeline = joblib.load(model_path)
+    engine = compile_pipeline(pipeline)
+    engine.meta["source_model"] = os.path.basename(model_path)
+    engine.meta["source_sha256"] = file_sha256(model_path)
+    engine.save(out_dir)
+    print(f"Compiled {engine.meta['n_trees']} trees (max depth {engine.meta['max_depth']}) to {out_dir}")
+    return pipeline, CompiledForest.load(out_dir, mmap_mode="r")
+
+
+def sample_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'age': rng.integers(18, 70, size=n),
+        'family_size': rng.integers(1, 8, size=n),
+        'monthly_income': rng.normal(1000, 700, size=n).clip(100, 10000),
+        'employment_status': rng.choice(['employed', 'self-employed', 'unemployed'], size=n),
+        'assets': rng.exponential(2000, size=n),
+        'liabilities': rng.exponential(1000, size=n),
+        'credit_score': rng.normal(600, 80, size=n).clip(300, 850),
+    })[FEATURE_COLUMNS]
+
+
+def verify(pipeline, engine, n=2000):
+    df = sample_rows(n)
+    expected = pipeline.predict_proba(df)
+    actual = engine.predict_proba(df.to_dict('records'))
+    max_diff = float(np.abs(expected - actual).max())
+    labels_match = bool((expected.argmax(axis=1) == actual.argmax(axis=1)).all())
+    print(f"Verified on {n} rows: max |proba diff| = {max_diff:.2e}, labels match = {labels_match}")
+    if max_diff > 1e-9 or not labels_match:
+        raise SystemExit("Compiled model does not match the sklearn pipeline")
+
+
+def _time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, 50) * 1e3, np.percentile(timings, 99) * 1e3
+
+
+def benchmark(pipeline, engine, repeat=200, batch_size=1000):
+    df = sample_rows(batch_size, seed=1)
+    row = df.iloc[:1].to_dict('records')
+    rows = df.to_dict('records')
+    results = {
+        'sklearn single row (DataFrame + predict_proba + predict)': _time(lambda: (pipeline.predict_proba(pd.DataFrame(row)), pipeline.predict(pd.DataFrame(row))), repeat // 4),
+        'compiled single row': _time(lambda: engine.predict_proba(row), repeat),
+        f'sklearn batch of {batch_size}': _time(lambda: pipeline.predict_proba(pd.DataFrame(rows)), 10),
+        f'compiled batch of {batch_size}': _time(lambda: engine.predict_proba(rows), 10),
+    }
+    print(f"{'case':<60}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, (p50, p99) in results.items():
+        print(f"{name:<60}{p50:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flatten the eligibility pipeline into NumPy arrays for fast scoring.")
+    parser.add_argument("--model", default=os.getenv("ELIGIBILITY_MODEL_PATH", "models/eligibility_v1.joblib"))
+    parser.add_argument("--out", default=os.getenv("ELIGIBILITY_COMPILED_MODEL_PATH", "models/eligibility_v1_compiled"))
+    parser.add_argument("--benchmark", action="store_true", help="Compare single-row and batch latency against sklearn")
+    args = parser.parse_args()
+
+    pipeline, engine = export(args.model, args.out)
+    verify(pipeline, engine)
+    if args.benchmark:
+        benchmark(pipeline, engine)
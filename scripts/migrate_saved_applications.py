@@ -0,0 +1,18 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.application_store import ApplicationStore, APPLICATION_DB_PATH, migrate_json_dir
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import data/saved_applications/*.json into the SQLite application store.")
+    parser.add_argument("--source", default="data/saved_applications")
+    parser.add_argument("--db", default=APPLICATION_DB_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = ApplicationStore(args.db)
+    migrated = migrate_json_dir(store, args.source)
+    print(f"Migrated {migrated} applications from {args.source} into {args.db} in {time.perf_counter() - start:.1f}s ({store.count()} total)")
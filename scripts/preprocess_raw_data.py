@@ -1,46 +1,65 @@
 import os
 import re
+import sys
 import json
+import time
+import hashlib
+import argparse
 import pandas as pd
-import pytesseract
-from PIL import Image
-import pdfplumber
-from openpyxl import load_workbook
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.salary_rules import salary_rules
+from backend.pdf_text import extract_pdf_text, pdf_stats
+from backend.ocr import ocr_image
+from backend.ledger import parse_ledger
 
 RAW_DIR = "data/raw"
 PROCESSED_DIR = "data/processed"
-os.makedirs(PROCESSED_DIR, exist_ok=True)
+DATASET_DIR = os.path.join(PROCESSED_DIR, "dataset")
+MANIFEST_PATH = os.path.join(PROCESSED_DIR, "manifest.json")
 
-def extract_text_from_pdf(pdf_path):
-    """Extract raw text from PDF (works for bank, resume, credit report)."""
-    text = []
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text.append(page.extract_text() or "")
-    except Exception as e:
-        print(f"[WARN] Could not extract from {pdf_path}: {e}")
-    return " ".join(text)
+# Fixed schema so part files from different runs always concatenate cleanly.
+SCHEMA = pa.schema([
+    ("app_id", pa.string()),
+    ("name", pa.string()),
+    ("dob", pa.string()),
+    ("reported_income", pa.float64()),
+    ("credit_score", pa.float64()),
+    ("employment_status", pa.string()),
+    ("assets", pa.float64()),
+    ("liabilities", pa.float64()),
+    ("per_capita_income", pa.float64()),
+    ("defaults_filled", pa.string()),
+    ("content_sha256", pa.string()),
+    ("processed_at", pa.string()),
+])
 
-def extract_text_from_image(image_path):
-    """Extract text from ID images."""
+def extract_text_from_pdf(pdf_path, until=None):
+    """Extract raw text from PDF (works for bank, resume, credit report), stopping once `until(text)` holds."""
+    return extract_pdf_text(pdf_path, until=until).text
+
+def extract_text_from_image(image_path, regions=(), until=None):
+    """Extract text from ID images, reading the card's name/DOB region first when `regions` are given."""
     try:
-        return pytesseract.image_to_string(Image.open(image_path))
+        return ocr_image(image_path, regions=regions, until=until).text
     except Exception as e:
         print(f"[WARN] Could not OCR {image_path}: {e}")
         return ""
 
 def parse_assets_liabilities(xlsx_path):
-    """Parse Excel for assets/liabilities."""
-    try:
-        df = pd.read_excel(xlsx_path)
-        assets = df[df["Type"].str.lower() == "asset"]["Value"].sum()
-        liabilities = df[df["Type"].str.lower() == "liability"]["Value"].sum()
-        return assets, liabilities
-    except Exception as e:
-        print(f"[WARN] Could not parse {xlsx_path}: {e}")
-        return 0, 0
+    """Parse the Excel/CSV ledger for assets/liabilities in one streaming pass."""
+    summary = parse_ledger(xlsx_path)
+    if summary.error:
+        print(f"[WARN] Could not parse {xlsx_path}: {summary.error}")
+    elif summary.malformed:
+        print(f"[WARN] {summary.malformed} malformed rows in {xlsx_path}, first: {summary.issues[0]}")
+    return summary.assets, summary.liabilities
 
 def extract_numeric(pattern, text, default=0):
     """Utility to extract numbers with regex."""
@@ -56,28 +75,27 @@ def preprocess_applicant(app_id, app_path):
     """Preprocess a single applicant folder into structured dict."""
     record = {"app_id": app_id}
     # Parse files
-    for fname in os.listdir(app_path):
+    for fname in sorted(os.listdir(app_path)):
         fpath = os.path.join(app_path, fname)
         if "bank_statement" in fname:
-            text = extract_text_from_pdf(fpath)
-            record["reported_income"] = extract_numeric(r"(\\d{3,5})\\s*A?E?D?", text, default=0)
+            text = extract_text_from_pdf(fpath, until=lambda t: salary_rules.confident_match(t) is not None)
+            # Same salary rules as the API, so training data and live scoring agree.
+            match = salary_rules.match(text)
+            record["reported_income"] = match.amount if match else 0
         elif "emirates_id" in fname:
-            text = extract_text_from_image(fpath)
-            print(text)
+            text = extract_text_from_image(fpath, regions=["name_dob"], until=lambda t: bool(re.search(r"Name:\s*(.+)", t) and re.search(r"DOB:?\s*(\d{4}-\d{2}-\d{2})", t)))
             name_match = re.search(r"Name:\s*(.+)", text, re.MULTILINE)
-            dob_match = re.search(r"DOB\s*(\d{4}-\d{2}-\d{2}),?", text)
+            dob_match = re.search(r"DOB:?\s*(\d{4}-\d{2}-\d{2}),?", text)
             record["name"] = name_match.group(1).strip() if name_match else "Unknown"
             record["dob"] = dob_match.group(1) if dob_match else None
-            print(record["name"])
-            print(record["dob"])
 
         elif "resume" in fname:
-            text = extract_text_from_pdf(fpath)
+            text = extract_text_from_pdf(fpath, until=lambda t: "experience" in t.lower())
             # Very basic employment status inference
             record["employment_status"] = "employed" if "experience" in text.lower() else "unemployed"
         elif "credit_report" in fname:
-            text = extract_text_from_pdf(fpath)
-            record["credit_score"] = extract_numeric(r"(\\d{3})", text, default=600)
+            text = extract_text_from_pdf(fpath, until=lambda t: re.search(r"Credit\s*Score:\s*(\d{3})", t) is not None)
+            record["credit_score"] = extract_numeric(r"Credit\s*Score:\s*(\d{3})", text, default=600)
 
         elif "assets_liabilities" in fname:
             assets, liabilities = parse_assets_liabilities(fpath)
@@ -86,9 +104,10 @@ def preprocess_applicant(app_id, app_path):
 
     # Basic validation & missing value handling
     required_fields = ["name", "dob", "reported_income", "credit_score", "employment_status"]
+    filled = []
     for field in required_fields:
         if record.get(field) is None or record.get(field) == "":
-            print(f"[CHECK] Missing {field} for {app_id}, filling with defaults.")
+            filled.append(field)
             if field == "dob":
                 record[field] = "1985-01-01"
             elif field == "name":
@@ -97,6 +116,7 @@ def preprocess_applicant(app_id, app_path):
                 record[field] = "unemployed"
             else:
                 record[field] = 0
+    record["defaults_filled"] = ",".join(filled)
 
     # Derived metrics
     family_size = record.get("family_size", 4) # default to 4
@@ -105,27 +125,208 @@ def preprocess_applicant(app_id, app_path):
 
     return record
 
-def main():
-    all_records = []
-    for app_id in os.listdir(RAW_DIR):
-        app_path = os.path.join(RAW_DIR, app_id)
-        if os.path.isdir(app_path):
-            print(f"Processing {app_id} ...")
-            record = preprocess_applicant(app_id, app_path)
-            clean_record = {
-                k: (int(v) if isinstance(v,(np.int64, np.int32)) else float(v) if isinstance(v,(np.float64, np.float32)) else str(v) if isinstance (v,(pd.Timestamp,)) else v)
-                for k,v in record.items()
-            }
-            all_records.append(record)
-
-            # Save per-app JSON
-            with open(os.path.join(PROCESSED_DIR, f"{app_id}.json"), "w") as f:
-                json.dump(clean_record, f, indent=2)
-
-    # Save all to CSV
-    df = pd.DataFrame(all_records)
-    df.to_csv(os.path.join(PROCESSED_DIR, "applications.csv"), index=False)
-    print(f"Processed {len(all_records)} applicants. Saved to data/processed/")
+def clean_record(record):
+    return {
+        k: (int(v) if isinstance(v,(np.int64, np.int32)) else float(v) if isinstance(v,(np.float64, np.float32)) else str(v) if isinstance (v,(pd.Timestamp,)) else v)
+        for k,v in record.items()
+    }
+
+def folder_signature(app_path):
+    """Cheap change check: name -> [size, mtime_ns] for every file in the folder."""
+    signature = {}
+    with os.scandir(app_path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                st = entry.stat()
+                signature[entry.name] = [st.st_size, st.st_mtime_ns]
+    return signature
+
+def hash_folder(app_path, names):
+    hashes = {}
+    for name in sorted(names):
+        digest = hashlib.sha256()
+        with open(os.path.join(app_path, name), "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        hashes[name] = digest.hexdigest()
+    return hashes
+
+def process_folder(app_id, app_path, signature, previous_hashes):
+    """Worker: hash the folder and only parse it if the content really changed."""
+    hashes = hash_folder(app_path, signature)
+    if hashes == previous_hashes:
+        # Touched or copied, but the bytes are the same.
+        return app_id, signature, hashes, None, {}
+    before = pdf_stats.snapshot()
+    record = clean_record(preprocess_applicant(app_id, app_path))
+    record["content_sha256"] = hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()
+    record["processed_at"] = datetime.now(timezone.utc).isoformat()
+    # This folder's share of the worker's PDF counters, summed up by main().
+    pdf_usage = {k: v - before[k] for k, v in pdf_stats.snapshot().items()}
+    return app_id, signature, hashes, record, pdf_usage
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+def write_part(records, run_dir, part):
+    table = pa.Table.from_pylist([{name: r.get(name) for name in SCHEMA.names} for r in records], schema=SCHEMA)
+    os.makedirs(run_dir, exist_ok=True)
+    pq.write_table(table, os.path.join(run_dir, f"part-{part:05d}.parquet"))
+
+def prune_dataset(app_ids, dataset_dir=DATASET_DIR):
+    """Drop every record of `app_ids` from all runs, rewriting only the part files that hold them."""
+    app_ids = set(app_ids)
+    dropped = 0
+    if not app_ids:
+        return dropped
+    for path in sorted(Path(dataset_dir).glob("run=*/*.parquet")):
+        ids = pq.read_table(path, columns=["app_id"]).column("app_id").to_pylist()
+        keep = [i for i, app_id in enumerate(ids) if app_id not in app_ids]
+        if len(keep) == len(ids):
+            continue
+        dropped += len(ids) - len(keep)
+        if keep:
+            tmp = path.with_name(f"{path.name}.tmp")
+            pq.write_table(pq.read_table(path, schema=SCHEMA).take(keep), tmp)
+            os.replace(tmp, path)
+        else:
+            path.unlink()
+            if not any(path.parent.iterdir()):
+                path.parent.rmdir()
+    return dropped
+
+def read_dataset(dataset_dir=DATASET_DIR, latest=True):
+    """All runs as one DataFrame; with `latest`, only the newest record per applicant."""
+    if not os.path.isdir(dataset_dir) or not any(Path(dataset_dir).glob("run=*/*.parquet")):
+        return pd.DataFrame(columns=SCHEMA.names + ["run"])
+    df = pq.read_table(dataset_dir, partitioning="hive").to_pandas()
+    df["run"] = df["run"].astype(str)
+    if latest:
+        df = df.sort_values(["run", "processed_at"]).drop_duplicates("app_id", keep="last").reset_index(drop=True)
+    return df
+
+class Progress:
+    def __init__(self, total, every=2.0):
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, n=1):
+        self.done += n
+        now = time.perf_counter()
+        if now - self._last >= self.every or self.done == self.total:
+            self._last = now
+            elapsed = now - self.start
+            rate = self.done / elapsed if elapsed else 0.0
+            eta = (self.total - self.done) / rate if rate else 0.0
+            print(f"[{self.done}/{self.total}] {rate:.1f} folders/s, elapsed {elapsed:.0f}s, eta {eta:.0f}s", flush=True)
+
+def main(raw_dir=RAW_DIR, dataset_dir=DATASET_DIR, manifest_path=MANIFEST_PATH, workers=None, batch_size=5000, force=False, csv=False):
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    known = load_manifest(manifest_path)
+    manifest = {} if force else known
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S_%fZ")
+    run_dir = os.path.join(dataset_dir, f"run={run_id}")
+
+    # Pass 1 (serial, stat only): decide which folders could have changed.
+    folders = {}
+    with os.scandir(raw_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                folders[entry.name] = entry.path
+    # Applicants whose folder was deleted leave the dataset before the manifest forgets them.
+    removed = [app_id for app_id in known if app_id not in folders]
+    pruned = prune_dataset(removed, dataset_dir)
+    for app_id in removed:
+        manifest.pop(app_id, None)
+    if removed:
+        save_manifest(manifest, manifest_path)
+    todo = []
+    for app_id, app_path in sorted(folders.items()):
+        signature = folder_signature(app_path)
+        previous = manifest.get(app_id)
+        if previous and previous["signature"] == signature:
+            continue
+        todo.append((app_id, app_path, signature, previous["hashes"] if previous else None))
+    skipped = len(folders) - len(todo)
+    print(f"{len(folders)} folders: {skipped} unchanged, {len(todo)} to check, {len(removed)} removed since last run ({pruned} records dropped)")
+
+    # Pass 2 (process pool): hash, parse and write changed folders in batches.
+    processed = touched = part = 0
+    batch, pending_manifest = [], {}
+    pdf = {"documents": 0, "pages": 0, "seconds": 0.0, "early_exits": 0, "fallbacks": 0}
+    progress = Progress(len(todo))
+
+    def flush():
+        nonlocal batch, part, pending_manifest
+        if batch:
+            write_part(batch, run_dir, part)
+            part += 1
+        # Manifest only advances once the records are safely on disk.
+        manifest.update(pending_manifest)
+        save_manifest(manifest, manifest_path)
+        batch, pending_manifest = [], {}
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_folder, *job) for job in todo]
+            for future in as_completed(futures):
+                try:
+                    app_id, signature, hashes, record, pdf_usage = future.result()
+                except Exception as e:
+                    print(f"[WARN] Could not preprocess folder: {e}")
+                    progress.update()
+                    continue
+                pending_manifest[app_id] = {"signature": signature, "hashes": hashes, "run": run_id if record else manifest.get(app_id, {}).get("run")}
+                for key, value in pdf_usage.items():
+                    pdf[key] += value
+                if record is None:
+                    touched += 1
+                else:
+                    batch.append(record)
+                    processed += 1
+                if len(batch) >= batch_size:
+                    flush()
+                progress.update()
+    flush()
+
+    if csv:
+        read_dataset(dataset_dir).to_csv(os.path.join(os.path.dirname(dataset_dir), "applications.csv"), index=False)
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Processed {processed} applicants ({touched} touched but unchanged, {skipped} skipped) in {elapsed:.1f}s"
+        + (f" -> {run_dir}" if processed else "")
+    )
+    ms_per_page = round(pdf["seconds"] * 1e3 / pdf["pages"], 3) if pdf["pages"] else 0.0
+    if pdf["documents"]:
+        print(f"PDFs: {pdf['documents']} documents, {pdf['pages']} pages read, {ms_per_page} ms/page ({pdf['early_exits']} stopped early, {pdf['fallbacks']} layout fallbacks)")
+    return {
+        "processed": processed, "touched": touched, "skipped": skipped, "removed": len(removed), "pruned": pruned, "run_id": run_id if processed else None,
+        "pdf_pages": pdf["pages"], "pdf_ms_per_page": ms_per_page,
+    }
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Incrementally preprocess data/raw applicant folders into a Parquet dataset partitioned by run.")
+    parser.add_argument("--raw-dir", default=RAW_DIR)
+    parser.add_argument("--dataset-dir", default=DATASET_DIR)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Records per Parquet part file")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and reprocess every folder")
+    parser.add_argument("--csv", action="store_true", help="Also export the latest record per applicant to applications.csv")
+    args = parser.parse_args()
+    main(args.raw_dir, args.dataset_dir, args.manifest, args.workers, args.batch_size, args.force, args.csv)
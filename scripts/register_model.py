@@ -0,0 +1,23 @@
+import sys
+import json
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.model_registry import ModelRegistry, MODEL_REGISTRY_DIR
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Register a trained eligibility pipeline as a new model version.")
+    parser.add_argument("model", help="Path to the joblib pipeline")
+    parser.add_argument("--version", help="Version name (defaults to a UTC timestamp)")
+    parser.add_argument("--metrics", help="JSON file with validation metrics to store in the metadata")
+    parser.add_argument("--activate", action="store_true", help="Make this the active version")
+    parser.add_argument("--registry", default=MODEL_REGISTRY_DIR)
+    args = parser.parse_args()
+
+    metrics = None
+    if args.metrics:
+        with open(args.metrics) as f:
+            metrics = json.load(f)
+    metadata = ModelRegistry(args.registry).register(args.model, version=args.version, metrics=metrics, activate=args.activate)
+    print(json.dumps(metadata, indent=2))
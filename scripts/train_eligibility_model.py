@@ -1,4 +1,10 @@
 import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import importlib.util
 import joblib
 import pandas as pd
 import numpy as np
@@ -9,73 +15,290 @@ from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
+from pathlib import Path
+from datetime import datetime, timezone
 
-os.makedirs("models", exist_ok= True)
-
-# Creation of the Synthetic Dataset
-np.random.seed(42)
-N = 2000
-age = np.random.randint(18,70,size = N)
-family_size = np.random.randint(1,8,size = N)
-monthly_income = np.random.normal(1000,700,size = N).clip(100,10000)
-employment_status = np.random.choice(['employed','self-employed','unemployed'],size = N, p=[0.6,0.2,0.2])
-assets = np.random.exponential(2000, size = N)
-liabilities = np.random.exponential(1000, size = N)
-credit_score = np.random.normal(600,80,size = N).clip(300,850)
-
-# Simple labeling
-per_capita = monthly_income/np.maximum(1,family_size)
-label = np.where(per_capita < 300, 'approve', np.where(per_capita < 700, 'soft-decline','reject'))
-
-df = pd.DataFrame({
-    'age':age,
-    'family_size':family_size,
-    'monthly_income':monthly_income,
-    'employment_status':employment_status,
-    'assets':assets,
-    'liabilities':liabilities,
-    'credit_score':credit_score,
-    'label':label
-})
-df.to_csv("Synthetic_data.csv", index=False)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.agents import COMPILED_MAX_BATCH, DEFAULT_FAMILY_SIZE, FEATURE_COLUMNS, build_feature_row
+from backend.application_store import APPLICATION_DB_PATH, ApplicationStore
+from backend.compiled_forest import compile_pipeline
+from backend.model_registry import ModelRegistry, MODEL_REGISTRY_DIR
+from export_compiled_model import export
+
+MODEL_PATH = 'models/eligibility_v1.joblib'
+COMPILED_PATH = 'models/eligibility_v1_compiled'
+DATASET_DIR = 'data/processed/dataset'
+# Synthetic rows are written here, and --source csv trains on it (2000 rows with seed 42 reproduce the committed file).
+SYNTHETIC_CSV = 'Synthetic_data.csv'
 
 num_features = ['age','family_size','monthly_income','assets','liabilities','credit_score']
 cat_features = ['employment_status']
 
-x = df[num_features + cat_features]
-y = df['label']
 
-numeric_transformation = Pipeline(steps=[
-    ('imputer', SimpleImputer(strategy='median')),
-    ('scaler', StandardScaler())
-])
+def label_rows(df):
+    """Ground-truth rule: per-capita income bands."""
+    per_capita = df['monthly_income'] / np.maximum(1, df['family_size'])
+    return np.where(per_capita < 300, 'approve', np.where(per_capita < 700, 'soft-decline', 'reject'))
+
+
+def synthetic_dataset(n, seed=42):
+    # Same draws as the original fixed N=2000 script for the same seed.
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({
+        'age': rng.randint(18,70,size = n),
+        'family_size': rng.randint(1,8,size = n),
+        'monthly_income': rng.normal(1000,700,size = n).clip(100,10000),
+        'employment_status': rng.choice(['employed','self-employed','unemployed'],size = n, p=[0.6,0.2,0.2]),
+        'assets': rng.exponential(2000, size = n),
+        'liabilities': rng.exponential(1000, size = n),
+        'credit_score': rng.normal(600,80,size = n).clip(300,850),
+    })
+    df['label'] = label_rows(df)
+    return df
+
+
+def saved_applications_dataset(db_path=APPLICATION_DB_PATH, label_source='rule'):
+    """Feature rows for every stored application, built exactly as /predict builds them."""
+    store = ApplicationStore(db_path)
+    rows, decisions = [], []
+    for batch in store.iter_since():
+        for record in batch:
+            rows.append(build_feature_row(record.get('application') or {}))
+            decisions.append(record.get('decision'))
+    df = pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+    # Stored decisions are the previous model's own outputs; relabel unless asked not to.
+    df['label'] = decisions if label_source == 'decision' else label_rows(df) if len(df) else []
+    return df
+
+
+def csv_dataset(csv_path=SYNTHETIC_CSV):
+    """Rows saved by an earlier synthetic run (or prepared by hand) with the feature columns and a label."""
+    df = pd.read_csv(csv_path)
+    missing = [c for c in num_features + cat_features + ['label'] if c not in df.columns]
+    if missing:
+        raise ValueError(f"{csv_path} is missing columns {missing}")
+    return df
+
+
+def _read_preprocessed(dataset_dir):
+    spec = importlib.util.spec_from_file_location("preprocess_raw_data", Path(__file__).with_name("preprocess_raw_data.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.read_dataset(dataset_dir)
+
+
+def preprocessed_dataset(dataset_dir=DATASET_DIR):
+    """Latest cleaned record per applicant from scripts/preprocess_raw_data.py."""
+    records = _read_preprocessed(dataset_dir).to_dict('records')
+    rows = [build_feature_row({**r, 'family_size': r.get('family_size') or DEFAULT_FAMILY_SIZE}) for r in records]
+    df = pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+    df['label'] = label_rows(df) if len(df) else []
+    return df
+
+
+def load_dataset(source, rows=2000, seed=42, db_path=APPLICATION_DB_PATH, dataset_dir=DATASET_DIR, label_source='rule', csv_path=SYNTHETIC_CSV):
+    if source == 'synthetic':
+        df = synthetic_dataset(rows, seed)
+        if csv_path:
+            df.to_csv(csv_path, index=False)
+        return df
+    if source == 'csv':
+        df = csv_dataset(csv_path)
+    elif source == 'applications':
+        df = saved_applications_dataset(db_path, label_source)
+    elif source == 'preprocessed':
+        df = preprocessed_dataset(dataset_dir)
+    else:
+        raise ValueError(f"Unknown data source '{source}'")
+    if rows and len(df) > rows:
+        df = df.sample(rows, random_state=seed).reset_index(drop=True)
+    return df
+
+
+def build_pipeline(n_estimators=200, max_depth=None, n_jobs=None, random_state=42):
+    numeric_transformation = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler())
+    ])
+
+    categorical_transformation = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='most_frequent')),
+        ('onehot', OneHotEncoder(handle_unknown='ignore'))
+    ])
+
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ('num', numeric_transformation, num_features),
+            ('cat', categorical_transformation, cat_features)
+        ]
+    )
+
+    return Pipeline(steps=[('preprocessor',preprocessor),
+                           ('classifier',RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, n_jobs=n_jobs, random_state=random_state))])
+
+
+def _percentiles(timings):
+    ms = np.asarray(timings) * 1e3
+    return {'p50': round(float(np.percentile(ms, 50)), 4), 'p95': round(float(np.percentile(ms, 95)), 4), 'p99': round(float(np.percentile(ms, 99)), 4)}
+
+
+def _time(fn, repeat):
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return _percentiles(timings)
+
+
+def measure_latency(clf, x_sample, repeat=200, batch_size=1000):
+    """Score the way the API does: compiled forest up to COMPILED_MAX_BATCH rows, sklearn above."""
+    engine = compile_pipeline(clf)
+    rows = x_sample.to_dict('records')
+    batch = (rows * (batch_size // max(1, len(rows)) + 1))[:batch_size]
+
+    def score(chunk):
+        if len(chunk) <= COMPILED_MAX_BATCH:
+            return engine.predict_proba(chunk)
+        return clf.predict_proba(pd.DataFrame(chunk, columns=FEATURE_COLUMNS))
+
+    cycle = itertools.cycle(rows)
+    single = _time(lambda: score([next(cycle)]), repeat)
+    batched = _time(lambda: score(batch), max(5, repeat // 20))
+    batched['rows_per_s'] = round(batch_size / (batched['p50'] / 1e3)) if batched['p50'] else None
+    compiled_bytes = sum(a.nbytes for a in engine.arrays.values())
+    return {'single_row_ms': single, f'batch_{batch_size}_ms': batched}, compiled_bytes
+
+
+def model_size(clf, path):
+    joblib.dump(clf, path)
+    return os.path.getsize(path)
+
+
+def evaluate(clf, x_test, y_test):
+    report = classification_report(y_test, clf.predict(x_test), output_dict=True, zero_division=0)
+    return {'accuracy': round(report['accuracy'], 4), 'macro_f1': round(report['macro avg']['f1-score'], 4)}
+
+
+def choose(candidates, p99_budget_ms=None):
+    """Best macro F1 among forests within the single-row p99 budget, smallest on ties."""
+    within = [c for c in candidates if p99_budget_ms is None or c['latency']['single_row_ms']['p99'] <= p99_budget_ms]
+    if not within:
+        print(f"[WARN] No forest meets the {p99_budget_ms} ms single-row p99 budget; picking the fastest")
+        return min(candidates, key=lambda c: c['latency']['single_row_ms']['p99'])
+    return max(within, key=lambda c: (c['metrics']['macro_f1'], -c['joblib_bytes']))
+
+
+def _depth(value):
+    return None if value.lower() in ('none', 'full') else int(value)
+
+
+def main(source='synthetic', rows=2000, seed=42, trees=(200,), depths=(None,), n_jobs=-1, p99_budget_ms=None,
+         model_path=MODEL_PATH, compiled_path=COMPILED_PATH, registry_dir=MODEL_REGISTRY_DIR, register=True, activate=False,
+         db_path=APPLICATION_DB_PATH, dataset_dir=DATASET_DIR, label_source='rule', repeat=200, batch_size=1000, csv_path=SYNTHETIC_CSV):
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    df = load_dataset(source, rows, seed, db_path, dataset_dir, label_source, csv_path)
+    if len(df) < 10 or df['label'].nunique() < 2:
+        raise SystemExit(f"Need at least 10 rows and 2 labels to train ({len(df)} rows, labels {sorted(df['label'].unique())} from '{source}')")
+    print(f"Loaded {len(df)} rows from {source}: {df['label'].value_counts().to_dict()}")
+
+    x = df[num_features + cat_features]
+    y = df['label']
+    stratify = y if y.value_counts().min() >= 2 else None
+    x_train, x_test, y_train, y_test = train_test_split(x,y,stratify=stratify,test_size=0.2,random_state=seed)
+    x_sample = x_test.iloc[:200]
 
-categorical_transformation = Pipeline(steps=[
-    ('imputer', SimpleImputer(strategy='most_frequent')),
-    ('onehot', OneHotEncoder(handle_unknown='ignore'))
-])
+    candidates, fitted = [], {}
+    scratch = f"{model_path}.sweep.tmp"
+    try:
+        for n_estimators in trees:
+            for max_depth in depths:
+                clf = build_pipeline(n_estimators, max_depth, n_jobs, seed)
+                start = time.perf_counter()
+                clf.fit(x_train, y_train)
+                fit_s = time.perf_counter() - start
+                # Parallel fit only; one request is scored on one thread.
+                clf.named_steps['classifier'].set_params(n_jobs=None)
+                latency, compiled_bytes = measure_latency(clf, x_sample, repeat, batch_size)
+                candidate = {
+                    'n_estimators': n_estimators,
+                    'max_depth': max_depth,
+                    'fit_s': round(fit_s, 3),
+                    'metrics': evaluate(clf, x_test, y_test),
+                    'joblib_bytes': model_size(clf, scratch),
+                    'compiled_bytes': compiled_bytes,
+                    'latency': latency,
+                }
+                candidates.append(candidate)
+                fitted[(n_estimators, max_depth)] = clf
+                print(
+                    f"trees={n_estimators:<5} depth={str(max_depth):<5} fit {fit_s:6.2f}s  macro F1 {candidate['metrics']['macro_f1']:.4f}  "
+                    f"{candidate['joblib_bytes'] / 1e6:7.2f} MB  single p99 {latency['single_row_ms']['p99']:.3f} ms  "
+                    f"batch p50 {latency[f'batch_{batch_size}_ms']['p50']:.2f} ms"
+                )
+    finally:
+        if os.path.exists(scratch):
+            os.remove(scratch)
 
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', numeric_transformation, num_features),
-        ('cat', categorical_transformation, cat_features)
-    ]
-)
+    chosen = choose(candidates, p99_budget_ms)
+    clf = fitted[(chosen['n_estimators'], chosen['max_depth'])]
+    joblib.dump(clf,model_path)
+    print(f"Model Saved at {model_path} (trees={chosen['n_estimators']}, depth={chosen['max_depth']})")
+    export(model_path, compiled_path)
+    print(classification_report(y_test, clf.predict(x_test), zero_division=0))
 
-clf = Pipeline(steps=[('preprocessor',preprocessor),
-                      ('classifier',RandomForestClassifier(n_estimators=200, random_state=42))])
+    report = {
+        'model': os.path.basename(model_path),
+        'trained_at': datetime.now(timezone.utc).isoformat(),
+        'data': {'source': source, 'rows': len(df), 'train_rows': len(x_train), 'test_rows': len(x_test), 'seed': seed,
+                 **({'csv': csv_path} if source in ('synthetic', 'csv') and csv_path else {})},
+        'n_jobs': n_jobs,
+        'p99_budget_ms': p99_budget_ms,
+        'chosen': chosen,
+        'sweep': candidates,
+    }
+    report_path = os.path.splitext(model_path)[0] + '.report.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Latency/size report written to {report_path}")
 
-x_train, x_test, y_train, y_test = train_test_split(x,y,stratify=y,test_size=0.2,random_state=42)
-clf.fit(x_train, y_train)
+    if register:
+        metrics = {**chosen['metrics'], 'single_row_p99_ms': chosen['latency']['single_row_ms']['p99'], 'joblib_bytes': chosen['joblib_bytes']}
+        metadata = ModelRegistry(registry_dir).register(model_path, metrics=metrics, activate=activate)
+        print(f"Registered model version {metadata['version']}" + (" (active)" if activate else "; activate it with POST /admin/models/activate or --activate"))
+    return report
 
-model_path = 'models/eligibility_v1.joblib'
-joblib.dump(clf,model_path)
-print(f"Model Saved at {model_path}")
 
-y_pred = clf.predict(x_test)
-if hasattr(clf.named_steps['classifier'],'predict_proba'):
-    y_proba = clf.predict_proba(x_test)
-else:
-    y_proba = None
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the eligibility forest, optionally sweeping size/depth against latency.")
+    parser.add_argument("--source", choices=["synthetic", "csv", "applications", "preprocessed"], default="synthetic",
+                        help="synthetic rows, a CSV of labelled rows (--csv), the saved applications database, or the preprocess_raw_data.py dataset")
+    parser.add_argument("--csv", default=SYNTHETIC_CSV,
+                        help="--source synthetic writes its rows here ('' to skip); --source csv trains on this file")
+    parser.add_argument("--rows", type=int, default=2000, help="Synthetic rows to generate, or a cap on rows sampled from the other sources (0 = all)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--trees", default="200", help="Comma-separated n_estimators to sweep, e.g. 50,100,200")
+    parser.add_argument("--depths", default="none", help="Comma-separated max_depth to sweep, 'none' for unlimited, e.g. 8,12,none")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Cores used to fit each forest (-1 = all)")
+    parser.add_argument("--p99-budget-ms", type=float, default=None, help="Only pick forests whose single-row p99 fits this budget")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--compiled", default=COMPILED_PATH)
+    parser.add_argument("--registry", default=MODEL_REGISTRY_DIR)
+    parser.add_argument("--no-register", action="store_true", help="Do not add the model to the registry")
+    parser.add_argument("--activate", action="store_true", help="Make the registered model the active version, which running servers swap in")
+    parser.add_argument("--db", default=APPLICATION_DB_PATH)
+    parser.add_argument("--dataset-dir", default=DATASET_DIR)
+    parser.add_argument("--label-source", choices=["rule", "decision"], default="rule",
+                        help="For --source applications: relabel with the income rule, or train on stored decisions")
+    parser.add_argument("--repeat", type=int, default=200, help="Single-row timings per candidate")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows in the batch latency measurement")
+    args = parser.parse_args()
 
-print(classification_report(y_test, y_pred))
+    main(
+        source=args.source, rows=args.rows, seed=args.seed,
+        trees=[int(t) for t in args.trees.split(",")], depths=[_depth(d) for d in args.depths.split(",")],
+        n_jobs=args.n_jobs, p99_budget_ms=args.p99_budget_ms, model_path=args.model, compiled_path=args.compiled,
+        registry_dir=args.registry, register=not args.no_register, activate=args.activate, db_path=args.db, dataset_dir=args.dataset_dir,
+        label_source=args.label_source, repeat=args.repeat, batch_size=args.batch_size, csv_path=args.csv,
+    )
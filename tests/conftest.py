@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from backend.agents import EligibilityAgent
+from backend.model_registry import ActiveModel, LoadedModel, ModelRegistry
+
+NUM_FEATURES = ['age', 'family_size', 'monthly_income', 'assets', 'liabilities', 'credit_score']
+CAT_FEATURES = ['employment_status']
+
+
+def make_synthetic_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    family_size = rng.integers(1, 8, size=n)
+    monthly_income = rng.normal(1000, 700, size=n).clip(100, 10000)
+    per_capita = monthly_income / np.maximum(1, family_size)
+    return pd.DataFrame({
+        'age': rng.integers(18, 70, size=n),
+        'family_size': family_size,
+        'monthly_income': monthly_income,
+        'employment_status': rng.choice(['employed', 'self-employed', 'unemployed'], size=n),
+        'assets': rng.exponential(2000, size=n),
+        'liabilities': rng.exponential(1000, size=n),
+        'credit_score': rng.normal(600, 80, size=n).clip(300, 850),
+        'label': np.where(per_capita < 300, 'approve', np.where(per_capita < 700, 'soft-decline', 'reject')),
+    })
+
+
+@pytest.fixture(scope="session")
+def eligibility_pipeline():
+    df = make_synthetic_frame(600)
+    preprocessor = ColumnTransformer(transformers=[
+        ('num', Pipeline([('imputer', SimpleImputer(strategy='median')), ('scaler', StandardScaler())]), NUM_FEATURES),
+        ('cat', Pipeline([('imputer', SimpleImputer(strategy='most_frequent')), ('onehot', OneHotEncoder(handle_unknown='ignore'))]), CAT_FEATURES),
+    ])
+    clf = Pipeline([('preprocessor', preprocessor), ('classifier', RandomForestClassifier(n_estimators=25, random_state=0))])
+    clf.fit(df[NUM_FEATURES + CAT_FEATURES], df['label'])
+    return clf
+
+
+@pytest.fixture
+def eligibility_agent(eligibility_pipeline, tmp_path):
+    agent = EligibilityAgent.__new__(EligibilityAgent)
+    model = LoadedModel("test", {}, None, pipeline=eligibility_pipeline)
+    agent.active_model = ActiveModel(ModelRegistry(tmp_path / "registry"), model, refresh_interval=float("inf"))
+    return agent
@@ -0,0 +1,108 @@
+import json
+import sqlite3
+
+import pytest
+
+from backend import application_store
+from backend.application_store import ApplicationStore, migrate_json_dir
+
+
+def _record(i, decision, income, created_at):
+    return {
+        "app_id": f"app_{i:04d}",
+        "decision": decision,
+        "score": 0.5 + (i % 50) / 100,
+        "model_version": "v1",
+        "created_at": created_at,
+        "application": {"reported_income": income, "family_size": 3},
+    }
+
+
+def test_save_is_readable_before_and_after_flush(tmp_path):
+    store = ApplicationStore(tmp_path / "apps.db", flush_interval=0.5)
+    store.save({"app_id": "app_1", "decision": "approve", "score": 0.9})
+    assert store.get("app_1")["decision"] == "approve"
+    store.flush()
+    assert store.count() == 1
+    assert store.get("app_1")["created_at"]
+    assert store.get("missing") is None
+
+
+def test_query_filters_and_paginates_newest_first(tmp_path):
+    store = ApplicationStore(tmp_path / "apps.db")
+    decisions = ["approve", "soft-decline", "reject"]
+    store.save_many(
+        _record(i, decisions[i % 3], 500 + i * 10, f"2026-10-{1 + i // 10:02d}T00:00:{i % 60:02d}.000000+00:00")
+        for i in range(90)
+    )
+
+    soft = store.query(decision="soft-decline", since="2026-10-05", limit=7)
+    seen = list(soft["items"])
+    while soft["next_cursor"]:
+        soft = store.query(decision="soft-decline", since="2026-10-05", limit=7, cursor=soft["next_cursor"])
+        seen.extend(soft["items"])
+    expected = {f"app_{i:04d}" for i in range(40, 90) if i % 3 == 1}
+    assert len(seen) == len(expected)
+    assert {r["app_id"] for r in seen} == expected
+    assert all(r["decision"] == "soft-decline" and r["created_at"] >= "2026-10-05" for r in seen)
+    assert [r["created_at"] for r in seen] == sorted((r["created_at"] for r in seen), reverse=True)
+
+    low_income = store.query(min_income=500, max_income=600, limit=1000)["items"]
+    assert {r["app_id"] for r in low_income} == {f"app_{i:04d}" for i in range(11)}
+    with pytest.raises(ValueError):
+        store.query(cursor="not-a-cursor")
+    assert all(r["score"] >= 0.8 for r in store.query(min_score=0.8, limit=1000)["items"])
+
+
+def test_migrate_json_dir(tmp_path):
+    legacy = tmp_path / "saved_applications"
+    legacy.mkdir()
+    for i in range(3):
+        with open(legacy / f"app_{i}.json", "w") as f:
+            json.dump({"app_id": f"app_{i}", "decision": "reject", "score": 0.7}, f, indent=2)
+    (legacy / "broken.json").write_text("{not json")
+
+    store = ApplicationStore(tmp_path / "apps.db")
+    assert migrate_json_dir(store, legacy) == 3
+    assert store.count() == 3
+    assert store.get("app_2")["decision"] == "reject"
+    assert store.query(decision="reject")["items"][0]["created_at"]
+
+
+def test_failed_batches_are_retried_and_a_rejected_record_is_set_aside(tmp_path, monkeypatch):
+    monkeypatch.setattr(application_store, "STORE_RETRY_MAX_BACKOFF", 0.01)
+    store = ApplicationStore(tmp_path / "apps.db", flush_interval=0.01)
+    write = store._write
+    outages = [sqlite3.OperationalError("database is locked")] * 3
+
+    def flaky(rows):
+        if outages:
+            raise outages.pop()
+        if any(row[0] == "app_bad" for row in rows):
+            raise sqlite3.IntegrityError("bad row")
+        write(rows)
+
+    monkeypatch.setattr(store, "_write", flaky)
+    notified = []
+    store.add_listener(lambda records: notified.extend(r["app_id"] for r in records))
+    store.add_listener(lambda records: 1 / 0)
+    for app_id in ("app_1", "app_bad", "app_2"):
+        store.save({"app_id": app_id, "decision": "approve"})
+
+    assert store.flush(timeout=5)
+    assert store.count() == 2 and store.write_failures >= 3
+    assert sorted(notified) == ["app_1", "app_2"] and store.pending() == 0
+    failed = [json.loads(line) for line in open(f"{store.path}.failed.jsonl")]
+    assert [f["record"]["app_id"] for f in failed] == ["app_bad"]
+
+
+def test_flush_gives_up_after_its_timeout(tmp_path, monkeypatch):
+    store = ApplicationStore(tmp_path / "apps.db", flush_interval=0.01)
+
+    def down(rows):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(store, "_write", down)
+    store.save({"app_id": "app_1"})
+    assert not store.flush(timeout=0.2)
+    assert store.get("app_1") is not None and store.pending() == 1
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "benchmark_stages.py"
+
+
+def _bench(tmp_path, *args):
+    # A subprocess, because the script points the backend's stores at its own workdir before importing it.
+    env = {**os.environ, "BENCHMARK_WORKDIR": str(tmp_path / "work")}
+    return subprocess.run(
+        [sys.executable, str(SCRIPT), "--applicants", "2", "--repeat", "10", "--rounds", "1", "--batch-size", "16", *args],
+        env=env, capture_output=True, text=True, timeout=300,
+    )
+
+
+def test_suite_runs_offline_writes_json_and_flags_regressions(tmp_path):
+    baseline, out = tmp_path / "baseline.json", tmp_path / "out.json"
+    first = _bench(tmp_path, "--out", str(out), "--baseline", str(baseline), "--update-baseline")
+    assert first.returncode == 0, first.stdout + first.stderr
+
+    result = json.loads(out.read_text())
+    assert json.loads(baseline.read_text()) == result
+    stages = result["stages"]
+    for name in ["extract.pdf_text", "extract.pdf_statement_12p", "extract.pdf_statement_12p_layout", "extract.xlsx", "field.salary_rules", "field.name_dob", "field.credit_score",
+                 "extract.application_cold", "eligibility.assess_single", "eligibility.assess_batch_16",
+                 "explanation.explain_stub", "explanation.template", "explanation.llm_batch_20", "orchestrator.process_application", "explanation.query_prompt"]:
+        assert {"p50_ms", "p95_ms", "p99_ms", "throughput_per_s"} <= set(stages[name]), name
+    assert ("extract.ocr" in stages) != ("extract.ocr" in result["meta"]["skipped"])
+    assert stages["eligibility.assess_batch_16"]["throughput_per_s"] > stages["eligibility.assess_batch_16"]["n"]
+    # The stores were redirected to the benchmark workdir, not the repository's data/.
+    assert (tmp_path / "work" / "applications.db").exists()
+
+    # Pretend end-to-end processing used to be ten times faster.
+    doctored = json.loads(baseline.read_text())
+    doctored["stages"]["orchestrator.process_application"]["p50_ms"] /= 10
+    baseline.write_text(json.dumps(doctored))
+    second = _bench(tmp_path, "--out", str(out), "--baseline", str(baseline))
+    assert second.returncode == 1
+    assert "Regression: orchestrator.process_application p50_ms" in second.stdout
+    comparison = json.loads(out.read_text())["comparison"]
+    assert "orchestrator.process_application" in [r["stage"] for r in comparison["regressions"]]
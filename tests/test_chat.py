@@ -0,0 +1,111 @@
+import json
+import time
+
+from backend import chat
+from backend.agents import ExplanationAgent
+from backend.application_store import ApplicationStore
+from backend.chat import AppContextCache, ChatSessions, build_prompt, compact_context, estimate_tokens
+
+RECORD = {
+    "app_id": "app_1",
+    "decision": "soft-decline",
+    "score": 0.6834,
+    "reasons": ["marginal_income"],
+    "recommendations": ["upskill", "counseling"],
+    "explanation": "Your application was not approved this time. " * 40,
+    "model_version": "v20261017T195850",
+    "application": {"app_id": "app_1", "name": "Jane Doe", "dob": "1990-01-01", "address": "12 Palm St", "family_size": 4, "reported_income": 9000.0},
+    "created_at": "2026-10-17T20:00:53.936738+00:00",
+}
+
+
+def test_compact_context_keeps_what_answers_questions_and_drops_identity():
+    context = compact_context(RECORD)
+    assert "decision: soft-decline (confidence 0.68)" in context
+    assert "recommendations: upskill, counseling" in context
+    assert "monthly income: 9000 AED; family size: 4 (2250 AED per member)" in context
+    assert not any(field in context for field in ("Jane", "Palm", "1990-01-01", "created_at", "model_version"))
+    assert len(context.split("explanation given: ")[1]) <= chat.CHAT_EXPLANATION_CHARS + 4
+    assert estimate_tokens(context) < estimate_tokens(json.dumps(RECORD, indent=2)) / 2
+
+
+def test_prompt_keeps_newest_turns_and_best_cases_within_the_budget():
+    history = [{"query": f"question {i}", "answer": "word " * 60} for i in range(5)]
+    related = ["- [policy_1] " + "rule " * 50, "- [app_9] " + "case " * 400, "- [policy_2] short note"]
+    usage = {}
+    prompt = build_prompt("and now?", "app_1", "decision: approve", related, history, budget=400, usage=usage)
+
+    assert usage["prompt_tokens"] == estimate_tokens(prompt) <= 400
+    assert (usage["history_turns"], usage["dropped_turns"]) == (3, 2)
+    assert "question 4" in prompt and "question 2" in prompt and "question 1" not in prompt
+    assert prompt.index("question 2") < prompt.index("question 4") < prompt.index("Applicant asks: and now?")
+    # The long case does not fit; the shorter one ranked after it still does.
+    assert "app_9" not in prompt and "policy_1" in prompt and "policy_2" in prompt and usage["dropped_cases"] == 1
+
+    usage = {}
+    assert "Conversation so far" not in build_prompt("hi", usage=usage) and usage["history_tokens"] == 0
+
+
+def test_context_cache_reads_once_and_forgets_a_re_saved_application(tmp_path):
+    store = ApplicationStore(tmp_path / "applications.db")
+    cache = AppContextCache(ttl=60)
+    store.add_listener(cache.invalidate)
+    store.save(RECORD)
+    store.flush()
+
+    reads = []
+
+    def load(app_id):
+        reads.append(app_id)
+        return store.get(app_id)
+
+    assert cache.get("app_1", load) == cache.get("app_1", load)
+    assert reads == ["app_1"] and cache.stats()["hit"] == 1
+
+    store.save({**RECORD, "decision": "approve"})
+    store.flush()
+    assert cache.get("app_1", load).startswith("decision: approve")
+    assert len(reads) == 2 and cache.stats()["invalidated"] == 1
+    assert cache.get("missing", load) == "" and "missing" not in cache._items
+
+
+def test_sessions_keep_recent_turns_and_expire(tmp_path):
+    sessions = ChatSessions(tmp_path / "chat.db", ttl=60, max_turns=2)
+    session = sessions.open(app_id="app_1")
+    assert session["new"] and session["turns"] == []
+    for i in range(3):
+        sessions.append(session, f"q{i}", f"a{i}")
+
+    # Another worker process opens the same conversation.
+    again = ChatSessions(tmp_path / "chat.db", ttl=60, max_turns=2).open(session["session_id"])
+    assert (again["new"], again["app_id"]) == (False, "app_1")
+    assert [t["query"] for t in again["turns"]] == ["q1", "q2"]
+
+    sessions._conn.execute("UPDATE chat_sessions SET updated_ts = ?", (time.time() - 120,))
+    assert sessions.open(session["session_id"])["new"]
+    assert sessions.prune() == 1 and sessions.stats()["active_sessions"] == 0
+
+
+class _Model:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, contents, stream=False):
+        self.prompts.append(contents)
+        return type("Response", (), {"text": "answer"})()
+
+
+def test_answer_query_uses_the_cached_context_history_and_reports_tokens(monkeypatch):
+    monkeypatch.setattr(chat, "_contexts", AppContextCache())
+    agent = ExplanationAgent.__new__(ExplanationAgent)
+    agent.model = _Model()
+    reads = []
+    agent._read_application = lambda app_id: reads.append(app_id) or RECORD
+    agent._retrieve_context = lambda query, app_id=None: ["- [policy_1] income threshold"]
+
+    usage = {}
+    assert agent.answer_query("why?", "app_1", usage=usage) == "answer"
+    agent.answer_query("what next?", "app_1", history=[{"query": "why?", "answer": "answer"}], usage=usage)
+    assert reads == ["app_1"]
+    assert "Applicant: why?\nAssistant: answer" in agent.model.prompts[1]
+    assert usage["prompt_tokens"] == estimate_tokens(agent.model.prompts[1]) and usage["history_turns"] == 1
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from backend.agents import FEATURE_COLUMNS
+from backend.compiled_forest import CompiledForest, compile_pipeline
+from tests.conftest import make_synthetic_frame
+
+
+def test_compiled_forest_matches_sklearn(eligibility_pipeline):
+    engine = compile_pipeline(eligibility_pipeline)
+    df = make_synthetic_frame(500, seed=2)[FEATURE_COLUMNS]
+    expected = eligibility_pipeline.predict_proba(df)
+    actual = engine.predict_proba(df.to_dict('records'))
+
+    assert engine.classes == list(eligibility_pipeline.classes_)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(actual.argmax(axis=1), expected.argmax(axis=1))
+
+
+def test_missing_and_unknown_values_follow_sklearn(eligibility_pipeline):
+    engine = compile_pipeline(eligibility_pipeline)
+    base = {'age': 30, 'family_size': 3, 'monthly_income': 800.0, 'employment_status': 'employed', 'assets': 0.0, 'liabilities': 0.0, 'credit_score': 600.0}
+    rows = [
+        {**base, 'employment_status': None},
+        {**base, 'employment_status': 'retired'},
+        {**base, 'employment_status': np.nan},
+        {**base, 'age': None, 'credit_score': np.nan},
+        {k: v for k, v in base.items() if k != 'assets'},
+    ]
+    for row in rows:
+        expected = eligibility_pipeline.predict_proba(pd.DataFrame([row], columns=FEATURE_COLUMNS))
+        np.testing.assert_allclose(engine.predict_proba([row]), expected, rtol=0, atol=1e-9)
+
+
+def test_saved_arrays_reload_memory_mapped(eligibility_pipeline, tmp_path):
+    engine = compile_pipeline(eligibility_pipeline)
+    engine.save(tmp_path / "compiled")
+    loaded = CompiledForest.load(tmp_path / "compiled", mmap_mode="r")
+
+    assert isinstance(loaded.arrays["threshold"], np.memmap)
+    x = engine.transform(make_synthetic_frame(50, seed=3)[FEATURE_COLUMNS].to_dict('records'))
+    np.testing.assert_array_equal(loaded.predict_proba_matrix(x), engine.predict_proba_matrix(x))
+
+
+def test_agent_uses_compiled_engine_for_small_batches(eligibility_agent, eligibility_pipeline):
+    rows = make_synthetic_frame(40, seed=4)
+    applications = [
+        {'age': r.age, 'family_size': r.family_size, 'reported_income': r.monthly_income, 'employment_status': r.employment_status,
+         'assets': r.assets, 'liabilities': r.liabilities, 'credit_score': r.credit_score}
+        for r in rows.itertuples()
+    ]
+    expected = eligibility_agent.assess_many(applications)
+    eligibility_agent.active_model.current().engine = compile_pipeline(eligibility_pipeline)
+    actual = eligibility_agent.assess_many(applications)
+
+    assert [a[0] for a in actual] == [e[0] for e in expected]
+    np.testing.assert_allclose([a[1] for a in actual], [e[1] for e in expected], rtol=0, atol=1e-9)
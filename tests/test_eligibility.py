@@ -0,0 +1,52 @@
+import pandas as pd
+
+from backend.agents import FEATURE_COLUMNS, RECS_MAP, REASONS_MAP
+from tests.conftest import make_synthetic_frame
+
+
+def _applications(n):
+    df = make_synthetic_frame(n, seed=1)
+    return [
+        {
+            'age': int(row.age),
+            'family_size': int(row.family_size),
+            'reported_income': float(row.monthly_income),
+            'employment_status': row.employment_status,
+            'assets': float(row.assets),
+            'liabilities': float(row.liabilities),
+            'credit_score': float(row.credit_score),
+        }
+        for row in df.itertuples()
+    ]
+
+
+def test_assess_many_matches_single_row_predict_path(eligibility_agent):
+    pipeline = eligibility_agent.pipeline
+    applications = _applications(300)
+    results = eligibility_agent.assess_many(applications)
+    assert len(results) == len(applications)
+
+    for application, (decision, score, reasons, recommendations) in zip(applications, results):
+        x_df = pd.DataFrame([eligibility_agent._build_feature_vector(application, {})])
+        pred = pipeline.predict(x_df)[0]
+        proba = pipeline.predict_proba(x_df)
+        expected_score = float(proba[0][list(pipeline.classes_).index(pred)])
+
+        assert decision == pred
+        assert score == expected_score
+        assert reasons == REASONS_MAP[pred]
+        assert recommendations == RECS_MAP[pred]
+
+
+def test_assess_delegates_to_batch_path(eligibility_agent):
+    application = _applications(1)[0]
+    assert eligibility_agent.assess(application, {}, {}) == eligibility_agent.assess_many([application])[0]
+
+
+def test_assess_many_handles_sparse_rows_and_empty_input(eligibility_agent):
+    assert eligibility_agent.assess_many([]) == []
+    x_row = eligibility_agent._build_feature_vector({}, {})
+    assert list(x_row) == FEATURE_COLUMNS
+    assert x_row['family_size'] == 4
+    decision, _, _, _ = eligibility_agent.assess_many([{}])[0]
+    assert decision in REASONS_MAP
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from backend.executors import StageExecutor
+
+
+def test_saturated_stage_reports_queue_depth():
+    release = threading.Event()
+
+    async def scenario():
+        stage = StageExecutor("test", "thread", 1)
+        tasks = [asyncio.create_task(stage.run(release.wait, 5)) for _ in range(3)]
+        for _ in range(100):
+            if stage.running == 1 and stage.queued == 2:
+                break
+            await asyncio.sleep(0.01)
+        busy = stage.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        idle = stage.stats()
+        stage.shutdown()
+        return busy, idle
+
+    busy, idle = asyncio.run(scenario())
+    assert busy["running"] == 1
+    assert busy["queue_depth"] == 2
+    assert busy["saturated"] is True
+    assert idle["running"] == 0
+    assert idle["queue_depth"] == 0
+    assert idle["completed"] == 3
+    assert idle["saturated"] is False
+
+
+def test_inline_stage_runs_on_caller_and_releases_on_error():
+    async def scenario():
+        stage = StageExecutor("test", "inline", 1)
+        assert await stage.run(threading.get_ident) == threading.get_ident()
+        with pytest.raises(ZeroDivisionError):
+            await stage.run(lambda: 1 / 0)
+        return stage.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["completed"] == 2
+    assert stats["running"] == 0
+
+
+def test_shutdown_discards_pool_and_unknown_kind_is_rejected():
+    async def scenario():
+        stage = StageExecutor("test", "thread", 2)
+        assert await stage.run(sum, [1, 2, 3]) == 6
+        stage.shutdown()
+        assert stage._pool is None
+        assert await stage.run(sum, [4]) == 4
+        stage.shutdown()
+
+    asyncio.run(scenario())
+    with pytest.raises(ValueError):
+        StageExecutor("test", "gpu", 1)
+
+
+def _slow_start():
+    time.sleep(0.3)
+
+
+def test_every_worker_of_a_process_pool_is_started_by_a_warm_up():
+    async def scenario():
+        stage = StageExecutor("test", "process", 3, initializer=_slow_start)
+        try:
+            warmed = await stage.run_on_every_worker(os.getpid, timeout=30)
+            return warmed, {pid for pid, _ in warmed}, len(stage._pool._processes)
+        finally:
+            stage.shutdown()
+
+    warmed, pids, processes = asyncio.run(scenario())
+    assert len(warmed) == len(pids) == processes == 3
+    assert set(warmed.values()) == pids
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+
+from backend.agents import ExplanationAgent
+from backend.latency import LatencyRecorder
+from backend.orchestrator import Orchestrator
+
+
+class _Chunk:
+    def __init__(self, text):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("no text in this chunk")
+        return self._text
+
+
+class _StreamingModel:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = []
+
+    def generate_content(self, contents, stream=False):
+        self.calls.append(stream)
+        if not stream:
+            return _Chunk("".join(c for c in self.chunks if c))
+        return (_Chunk(c) for c in self.chunks)
+
+
+def _agent(chunks):
+    agent = ExplanationAgent.__new__(ExplanationAgent)
+    agent.model = _StreamingModel(chunks)
+    agent._query_prompt = lambda query, app_id=None, history=(), usage=None: f"prompt: {query}"
+    return agent
+
+
+def test_answer_query_stream_yields_text_chunks_and_skips_empty_ones():
+    agent = _agent(["Your income ", None, "is above ", "", "the limit."])
+    assert list(agent.answer_query_stream("why?")) == ["Your income ", "is above ", "the limit."]
+    assert agent.answer_query("why?") == "Your income is above the limit."
+    assert agent.model.calls == [True, False]
+
+
+def test_orchestrator_stream_delivers_first_chunk_before_generation_ends():
+    finished = threading.Event()
+    stopped_early = threading.Event()
+
+    class SlowExplainer:
+        def answer_query_stream(self, query, app_id=None, history=(), usage=None):
+            try:
+                for word in ["one ", "two ", "three "]:
+                    yield word
+                    time.sleep(0.2)
+                finished.set()
+            finally:
+                if not finished.is_set():
+                    stopped_early.set()
+
+    orchestrator = Orchestrator.__new__(Orchestrator)
+    orchestrator.explainer = SlowExplainer()
+
+    async def first_chunk_then_disconnect():
+        start = time.perf_counter()
+        stream = orchestrator.explain_query_stream("why?")
+        first = await stream.__anext__()
+        ttft = time.perf_counter() - start
+        await stream.aclose()
+        return first, ttft
+
+    first, ttft = asyncio.run(first_chunk_then_disconnect())
+    assert first == "one "
+    assert ttft < 0.2
+    # The worker notices the disconnect at the next chunk and drops the rest.
+    assert stopped_early.wait(2)
+    assert not finished.is_set()
+
+
+def test_latency_recorder_percentiles():
+    recorder = LatencyRecorder()
+    for i in range(1, 101):
+        recorder.record(ttft_ms=i, total_ms=10 * i)
+    recorder.record(ttft_ms=None, total_ms=5)
+    stats = recorder.stats()
+    assert stats["requests"] == 101
+    assert stats["ttft_ms"]["samples"] == 100
+    assert stats["ttft_ms"]["p50"] == 50.5
+    assert stats["total_ms"]["samples"] == 101
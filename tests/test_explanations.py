@@ -0,0 +1,120 @@
+import asyncio
+import json
+import re
+import time
+
+from backend import explanations
+from backend.agents import ExplanationAgent, RECS_MAP, REASONS_MAP, ValidationAgent
+from backend.explanations import parse_batch, render_explanation
+from backend.orchestrator import Orchestrator
+
+VALID = {"address_match": True, "income_match": True, "conflicts": [], "confidence": 0.95}
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _CountingModel:
+    def __init__(self, answer=None, fail=False):
+        self.prompts = []
+        self.answer = answer
+        self.fail = fail
+
+    def generate_content(self, contents, stream=False):
+        self.prompts.append(contents)
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        if self.answer is not None:
+            return _Response(self.answer)
+        n = re.search(r"JSON array of (\d+) strings", contents)
+        if n:
+            return _Response("```json\n" + json.dumps([f"prose {i}" for i in range(int(n.group(1)))]) + "\n```")
+        return _Response("prose")
+
+
+def _agent(model):
+    agent = ExplanationAgent.__new__(ExplanationAgent)
+    agent.model = model
+    return agent
+
+
+def test_templates_cover_every_decision_in_microseconds():
+    for decision in ("approve", "soft-decline", "reject"):
+        text = render_explanation(decision, 0.82, REASONS_MAP[decision], RECS_MAP[decision], VALID)
+        assert text.startswith(explanations.HEADLINES[decision])
+        assert "82% confident" in text and text.endswith(explanations.NEXT_STEPS[decision])
+    approve = render_explanation("approve", 0.9, REASONS_MAP["approve"], RECS_MAP["approve"], VALID)
+    assert "within the program's threshold and your income per family member is low" in approve
+    assert explanations.RECOMMENDATION_TEXT["job_match"] in approve
+
+    conflicted = render_explanation("reject", 0.6, [], [], {**VALID, "conflicts": ["income differs from statement"]})
+    assert "(income differs from statement)" in conflicted
+    assert render_explanation("review", 0.5, [], [], None).startswith("Your application was assessed with the result: review.")
+
+    start = time.perf_counter()
+    for _ in range(2000):
+        render_explanation("approve", 0.9, REASONS_MAP["approve"], RECS_MAP["approve"], VALID)
+    assert (time.perf_counter() - start) / 2000 < 100e-6
+
+
+def test_explain_uses_the_llm_only_when_asked(monkeypatch):
+    model = _CountingModel()
+    agent = _agent(model)
+    args = ({"app_id": "a1"}, {}, VALID, "soft-decline", 0.7, RECS_MAP["soft-decline"])
+
+    assert agent.explain(*args).startswith(explanations.HEADLINES["soft-decline"])
+    assert model.prompts == []
+    assert agent.explain(*args, rich=True) == "prose"
+    assert len(model.prompts) == 1
+
+    monkeypatch.setattr(explanations, "EXPLAIN_MODE", "llm")
+    assert agent.explain(*args) == "prose"
+    assert agent.explain(*args, rich=False) != "prose"
+    assert len(model.prompts) == 2
+
+
+def test_a_failed_llm_call_falls_back_to_the_template():
+    agent = _agent(_CountingModel(fail=True))
+    before = explanations.explanations_total.value(source="fallback")
+    text = agent.explain({"app_id": "a1"}, {}, VALID, "approve", 0.9, RECS_MAP["approve"], rich=True)
+    assert text.startswith(explanations.HEADLINES["approve"])
+    assert explanations.explanations_total.value(source="fallback") == before + 1
+
+
+def test_explain_many_is_one_request_and_fills_gaps_from_templates():
+    items = [({"app_id": f"a{i}"}, VALID, "approve", 0.9, RECS_MAP["approve"]) for i in range(3)]
+    model = _CountingModel()
+    assert _agent(model).explain_many(items) == ["prose 0", "prose 1", "prose 2"]
+    assert len(model.prompts) == 1 and "3. Application a2" in model.prompts[0]
+
+    short = _agent(_CountingModel(answer='["only one", 7]')).explain_many(items)
+    assert short[0] == "only one"
+    assert short[1] == short[2] == render_explanation("approve", 0.9, REASONS_MAP["approve"], RECS_MAP["approve"], VALID)
+    assert _agent(_CountingModel(fail=True)).explain_many(items)[0].startswith(explanations.HEADLINES["approve"])
+    assert _agent(model).explain_many([]) == []
+
+
+def test_parse_batch_tolerates_fences_and_rejects_non_arrays():
+    assert parse_batch('Here you go:\n```json\n["a", " b "]\n```', 2) == ["a", "b"]
+    assert parse_batch('{"a": 1}', 2) == [None, None]
+    assert parse_batch("[not json", 1) == [None]
+    assert parse_batch('["a", "b", "c"]', 2) == ["a", "b"]
+
+
+def test_batch_scoring_groups_llm_explanations(monkeypatch, eligibility_agent):
+    monkeypatch.setattr(explanations, "EXPLAIN_LLM_BATCH_SIZE", 4)
+    model = _CountingModel()
+    orchestrator = Orchestrator.__new__(Orchestrator)
+    orchestrator.validator = ValidationAgent()
+    orchestrator.eligibility = eligibility_agent
+    orchestrator.explainer = _agent(model)
+    applications = [{"app_id": f"a{i}", "family_size": 4, "reported_income": 500 + 300 * i, "age": 30} for i in range(10)]
+
+    templated = asyncio.run(orchestrator.process_batch_async(applications, explain=True))
+    assert model.prompts == [] and all(r["explanation"] for r in templated)
+
+    rich = asyncio.run(orchestrator.process_batch_async(applications, explain=True, rich=True))
+    assert len(model.prompts) == 3
+    assert [r["explanation"] for r in rich] == [f"prose {i % 4}" for i in range(10)]
@@ -0,0 +1,109 @@
+import time
+
+from backend import agents
+from backend.agents import DataExtractionAgent
+from backend.extraction_cache import ExtractionCache
+from backend.ledger import LedgerSummary
+
+FILES = [
+    "bank_statement.pdf",
+    "emirates_id.jpg",
+    "resume.pdf",
+    "credit_report.pdf",
+    "assets_liabilities.xlsx",
+]
+
+
+def _slow_agent(monkeypatch, delay=0.2, stuck=None):
+    agent = DataExtractionAgent()
+
+    def pdf_text(path):
+        time.sleep(1.5 if path == stuck else delay)
+        return {
+            "bank_statement.pdf": "Transfer from ACME LLC ref 5000",
+            "resume.pdf": "Software Engineer, 5 years experience",
+            "credit_report.pdf": "Credit Score: 720",
+        }[path]
+
+    def image_text(path):
+        time.sleep(delay)
+        return "Name: Aisha\nDOB: 1990-05-10"
+
+    def ledger(path):
+        time.sleep(delay)
+        summary = LedgerSummary(path)
+        summary.add("asset", "Cash", 35000.0)
+        summary.add("liability", "Loan", 10000.0)
+        return summary
+
+    monkeypatch.setattr(agent, "_extract_text_from_pdf", pdf_text)
+    monkeypatch.setattr(agent, "_extract_text_from_image", image_text)
+    monkeypatch.setattr(agent, "_parse_ledger", ledger)
+    monkeypatch.setattr(agent, "_extract_income_from_bank_statement", lambda text: 5000.0)
+    return agent
+
+
+def test_documents_run_concurrently_and_merge_in_upload_order(monkeypatch):
+    agent = _slow_agent(monkeypatch)
+    start = time.monotonic()
+    parsed = agent.extract({"files": FILES})
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.2 * len(FILES) * 0.6
+    assert [d["file_path"] for d in parsed["documents"]] == FILES
+    assert parsed["app_form"] == {
+        "reported_income": 5000.0,
+        "name": "Aisha",
+        "dob": "1990-05-10",
+        "employment_status": "employed",
+        "credit_score": 720,
+        "assets": 35000.0,
+        "liabilities": 10000.0,
+        "family_size": 4,
+    }
+
+
+def test_timed_out_document_is_recorded_as_partial_failure(monkeypatch):
+    monkeypatch.setattr(agents, "DOCUMENT_TIMEOUT", 0.5)
+    agent = _slow_agent(monkeypatch, delay=0.01, stuck="credit_report.pdf")
+    parsed = agent.extract({"files": FILES})
+
+    failed = [d for d in parsed["documents"] if "error" in d]
+    assert [d["file_path"] for d in failed] == ["credit_report.pdf"]
+    assert "timed out" in failed[0]["error"]
+    assert parsed["app_form"]["credit_score"] == 600
+    assert parsed["app_form"]["employment_status"] == "employed"
+
+
+def test_deferred_llm_points_at_bank_statement(monkeypatch):
+    agent = _slow_agent(monkeypatch, delay=0)
+    parsed = agent.extract({"files": FILES}, defer_llm=True)
+    assert parsed["deferred_llm"] == [{"field": "reported_income", "document": 0}]
+    assert parsed["app_form"]["reported_income"] == 0
+    parsed = agent.resolve_deferred_llm(parsed)
+    assert parsed["app_form"]["reported_income"] == 5000.0
+    assert "deferred_llm" not in parsed
+
+
+def test_a_timed_out_document_stops_reading_and_frees_its_thread(tmp_path, monkeypatch):
+    from reportlab.pdfgen import canvas
+
+    monkeypatch.setattr(agents, "DOCUMENT_TIMEOUT", 0.3)
+    monkeypatch.setattr(agents, "extraction_cache", ExtractionCache(tmp_path / "cache"))
+    path = tmp_path / "credit_report.pdf"
+    c = canvas.Canvas(str(path))
+    for page in range(50):
+        c.drawString(100, 750, f"Credit history page {page + 1}")
+        c.showPage()
+    c.save()
+
+    agent = DataExtractionAgent()
+    pages = []
+    # Each page check is slow, so reading all 50 pages would take 5 s.
+    monkeypatch.setattr(agent, "_has_credit_score", lambda text: pages.append(text) or time.sleep(0.1))
+    parsed = agent.extract({"files": [str(path)]})
+    assert "timed out" in parsed["documents"][0]["error"]
+
+    time.sleep(0.3)
+    assert len(pages) <= 5
+    assert agents.extraction_cache.get(agents.extraction_cache.key(str(path), "credit_report", agents.EXTRACTOR_VERSION))[0] is None
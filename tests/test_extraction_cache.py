@@ -0,0 +1,83 @@
+from backend import agents
+from backend.agents import DataExtractionAgent
+from backend.extraction_cache import ExtractionCache
+
+
+def test_memory_lru_falls_back_to_disk_tier(tmp_path):
+    cache = ExtractionCache(tmp_path, memory_items=2, disk_bytes=10 ** 6)
+    for i in range(3):
+        cache.put(f"key{i}", {"parsed_text": str(i)})
+
+    assert cache.get("key2") == ({"parsed_text": "2"}, "memory")
+    assert cache.get("key0") == ({"parsed_text": "0"}, "disk")
+    assert cache.get("missing") == (None, "miss")
+
+    cache.record([{"cache": "memory"}, {"cache": "disk"}, {"cache": "miss"}, {}])
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_disk_tier_is_size_bounded(tmp_path):
+    cache = ExtractionCache(tmp_path, memory_items=1, disk_bytes=2000)
+    for i in range(20):
+        cache.put(f"key{i:02d}", {"parsed_text": "x" * 200})
+
+    used = sum(p.stat().st_size for p in tmp_path.glob("*/*.json"))
+    assert used <= 2000
+    assert cache.get("key19", memory=False)[0] is not None
+    assert cache.get("key00", memory=False)[0] is None
+
+
+def test_overwriting_an_entry_does_not_inflate_disk_usage(tmp_path):
+    cache = ExtractionCache(tmp_path, memory_items=1, disk_bytes=2000)
+    for i in range(3):
+        cache.put(f"key{i}", {"parsed_text": "x" * 200})
+    # Resolving an entry's LLM fields rewrites it in place, many times over its life.
+    for _ in range(50):
+        cache.put("key0", {"parsed_text": "x" * 200, "pending_llm": []})
+    cache.put("key0", {"parsed_text": "x" * 100})
+
+    assert cache.stats()["disk_bytes"] == sum(p.stat().st_size for p in tmp_path.glob("*/*.json"))
+    assert cache.stats()["evicted"] == 0 and cache.get("key1", memory=False)[0] is not None
+
+
+def test_second_pass_over_same_bytes_skips_parsing_and_llm(tmp_path, monkeypatch):
+    monkeypatch.setattr(agents, "extraction_cache", ExtractionCache(tmp_path / "cache"))
+    calls = {"pdf": 0, "llm": 0}
+
+    def pdf_text(path):
+        calls["pdf"] += 1
+        return "Transfer from ACME LLC ref 5000"
+
+    def llm(text):
+        calls["llm"] += 1
+        return 5000.0
+
+    agent = DataExtractionAgent()
+    monkeypatch.setattr(agent, "_extract_text_from_pdf", pdf_text)
+    monkeypatch.setattr(agent, "_extract_income_from_bank_statement", llm)
+
+    first = tmp_path / "uploads" / "bank_statement.pdf"
+    second = tmp_path / "raw" / "bank_statement.pdf"
+    for path in (first, second):
+        path.parent.mkdir()
+        path.write_bytes(b"%PDF same bytes")
+
+    parsed = agent.resolve_deferred_llm(agent.extract({"files": [str(first)]}, defer_llm=True))
+    assert parsed["documents"][0]["cache"] == "miss"
+
+    parsed = agent.extract({"files": [str(second)]}, defer_llm=True)
+    assert parsed["documents"][0]["cache"] == "memory"
+    assert parsed["deferred_llm"] == []
+    assert parsed["app_form"]["reported_income"] == 5000.0
+    assert calls == {"pdf": 1, "llm": 1}
+
+
+def test_key_uses_digest_from_upload_without_rereading(tmp_path):
+    cache = ExtractionCache(tmp_path / "cache")
+    path = tmp_path / "resume.pdf"
+    path.write_bytes(b"resume bytes")
+    from_file = cache.key(str(path), "resume", "2")
+    digest = from_file.split("-")[0]
+    path.unlink()
+    assert cache.key(str(path), "resume", "2", digest=digest) == from_file
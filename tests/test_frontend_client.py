@@ -0,0 +1,94 @@
+import importlib.util
+from pathlib import Path
+
+import requests
+
+MODULE = Path(__file__).resolve().parents[1] / "app" / "client.py"
+spec = importlib.util.spec_from_file_location("frontend_client", MODULE)
+client = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(client)
+
+
+class _Upload:
+    """What st.file_uploader hands the page."""
+
+    def __init__(self, name, data, type="application/pdf"):
+        self.name, self.data, self.type = name, data, type
+
+    def getvalue(self):
+        return self.data
+
+
+class _Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+
+class _Session(requests.Session):
+    def __init__(self, answers):
+        super().__init__()
+        self.answers = answers
+        self.sent = []
+
+    def request(self, method, url, **kwargs):
+        self.sent.append((method, url, kwargs))
+        return self.answers.pop(0)
+
+
+def test_fingerprint_ignores_order_and_sees_content():
+    statement, card = _Upload("statement.pdf", b"%PDF-1"), _Upload("id.png", b"\x89PNG")
+    assert client.fingerprint([statement, card]) == client.fingerprint([card, statement])
+    assert client.fingerprint([statement, card]) != client.fingerprint([statement])
+    assert client.fingerprint([statement]) != client.fingerprint([_Upload("statement.pdf", b"%PDF-2")])
+    assert client.fingerprint([statement]) != client.fingerprint([_Upload("other.pdf", b"%PDF-1")])
+
+
+def test_submission_reuses_the_upload_session_and_resends_files_only_when_it_expired():
+    files = [_Upload("statement.pdf", b"%PDF-1")]
+    session = _Session([_Response(202, {"job_id": "job_1"})])
+    backend = client.BackendClient("http://api/", session=session)
+
+    assert backend.submit({"name": "A"}, upload_session="up_1", files=files).status_code == 202
+    method, url, kwargs = session.sent[0]
+    assert (method, url, kwargs["data"]["upload_session"]) == ("POST", "http://api/predict", "up_1")
+    assert "files" not in kwargs and kwargs["timeout"] == (client.CONNECT_TIMEOUT, client.SUBMIT_TIMEOUT)
+
+    session.answers = [_Response(410), _Response(202, {"job_id": "job_2"})]
+    assert backend.submit({"name": "A"}, upload_session="up_old", files=files).json() == {"job_id": "job_2"}
+    assert session.sent[-1][2]["files"] == [("files", ("statement.pdf", b"%PDF-1", "application/pdf"))]
+    assert "upload_session" not in session.sent[-1][2]["data"]
+    assert backend.calls == {"POST /predict": 3}
+
+
+def test_every_call_has_a_timeout_and_only_gets_are_retried():
+    session = _Session([_Response(200, {"fields": {}}), _Response(200, {"status": "queued"}), _Response(200)])
+    backend = client.BackendClient(session=session)
+    backend.extract([_Upload("id.png", b"\x89PNG", "image/png")])
+    assert backend.job("/jobs/job_1") == {"status": "queued"}
+    backend.explain_stream("why?", "app_1")
+
+    assert all(isinstance(kwargs["timeout"], tuple) for _, _, kwargs in session.sent)
+    assert session.sent[2][2]["stream"] is True
+    assert backend.calls == {"POST /extract": 1, "GET /jobs/{id}": 1, "POST /explain/stream": 1}
+
+    retry = session.get_adapter("http://localhost").max_retries
+    assert retry.is_retry("GET", 503) and not retry.is_retry("POST", 503)
+
+
+def test_sessions_count_their_own_requests_on_the_shared_client():
+    session = _Session([_Response(200, {"status": "queued"}), _Response(200, {"status": "done"})])
+    shared = client.BackendClient(session=session)
+    mine, theirs = client.Counter(), client.Counter()
+    shared.counting(mine).job("/jobs/job_1")
+    shared.counting(theirs).job("/jobs/job_2")
+
+    assert mine == theirs == {"GET /jobs/{id}": 1}
+    assert shared.calls == {} and shared.counting(mine).session is session
@@ -0,0 +1,224 @@
+import asyncio
+
+import pytest
+
+from backend import jobs
+from backend.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, QueueFull
+
+
+async def _drain(queue, handler, job_ids, timeout=5.0):
+    queue.start(handler)
+    try:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while any(queue.get(j)["status"] in (QUEUED, RUNNING) for j in job_ids):
+            assert asyncio.get_running_loop().time() < deadline, "jobs did not finish"
+            await asyncio.sleep(0.01)
+    finally:
+        await queue.stop()
+    return [queue.get(j) for j in job_ids]
+
+
+async def _score(application):
+    await asyncio.sleep(0.01)
+    return {"app_id": application["app_id"], "decision": "approve", "score": 0.9}
+
+
+def test_submitted_jobs_run_in_order_and_keep_their_result(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", workers=1)
+    accepted = [queue.submit({"app_id": f"app_{i}"}, app_id=f"app_{i}") for i in range(3)]
+    assert [a["position"] for a in accepted] == [1, 2, 3]
+    assert queue.get(accepted[2]["job_id"])["position"] == 3
+
+    jobs = asyncio.run(_drain(queue, _score, [a["job_id"] for a in accepted]))
+    assert [j["status"] for j in jobs] == [DONE] * 3
+    assert [j["result"]["app_id"] for j in jobs] == ["app_0", "app_1", "app_2"]
+    assert jobs[0]["finished_at"] <= jobs[1]["started_at"]
+    assert queue.get("job_missing") is None
+
+
+def test_full_queue_rejects_with_a_retry_after_estimate(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", max_depth=2, workers=2)
+    queue.submit({"app_id": "a"})
+    queue.submit({"app_id": "b"})
+    with pytest.raises(QueueFull) as full:
+        queue.check_capacity()
+    with pytest.raises(QueueFull):
+        queue.submit({"app_id": "c"})
+    assert full.value.depth == 2 and full.value.retry_after >= 1
+
+    queue._avg_seconds = 30.0
+    # One of the two workers has to finish a 30 s job before there is room.
+    assert queue.retry_after() == 15
+    assert queue.stats()["depth"] == 2
+
+
+def test_failing_job_records_the_error_and_the_worker_moves_on(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", workers=1)
+
+    async def handler(application):
+        if application["app_id"] == "bad":
+            raise ValueError("unreadable statement")
+        return await _score(application)
+
+    ids = [queue.submit({"app_id": a})["job_id"] for a in ("bad", "good")]
+    bad, good = asyncio.run(_drain(queue, handler, ids))
+    assert (bad["status"], bad["error"], bad["result"]) == (FAILED, "ValueError: unreadable statement", None)
+    assert good["status"] == DONE
+
+
+def test_jobs_interrupted_by_a_crash_resume_after_restart(tmp_path):
+    path = tmp_path / "jobs.db"
+    before = JobQueue(path)
+    waiting = before.submit({"app_id": "waiting"})["job_id"]
+    interrupted = before.submit({"app_id": "interrupted"})["job_id"]
+    # The process dies while `interrupted` is running: claimed, never finished.
+    before._execute("UPDATE jobs SET status = ?, attempts = 1 WHERE job_id = ?", (RUNNING, interrupted))
+
+    after = JobQueue(path)
+    jobs = asyncio.run(_drain(after, _score, [waiting, interrupted]))
+    assert after.recovered == 1
+    assert [j["status"] for j in jobs] == [DONE, DONE]
+    assert jobs[1]["attempts"] == 2 and jobs[1]["result"]["app_id"] == "interrupted"
+
+
+def test_another_process_takes_over_a_job_only_once_its_lease_lapses(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 60)
+    path = tmp_path / "jobs.db"
+    dead, sibling = JobQueue(path), JobQueue(path)
+    job_id = dead.submit({"app_id": "orphan"})["job_id"]
+    assert dead.claim()["job_id"] == job_id
+    # Still leased by a worker that may be alive.
+    assert sibling.claim() is None
+
+    dead._execute("UPDATE jobs SET lease_expires = lease_expires - 120 WHERE job_id = ?", (job_id,))
+    taken = sibling.claim()
+    assert taken["job_id"] == job_id and sibling.get(job_id)["attempts"] == 2
+
+
+def test_a_job_that_keeps_crashing_the_process_is_given_up(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", max_attempts=2)
+    job_id = queue.submit({"app_id": "poison"})["job_id"]
+    queue._execute("UPDATE jobs SET status = ?, attempts = 2 WHERE job_id = ?", (RUNNING, job_id))
+
+    assert queue.recover() == 0
+    job = queue.get(job_id)
+    assert job["status"] == FAILED and "giving up" in job["error"]
+
+
+def test_shutdown_puts_the_running_job_back_without_using_an_attempt(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", workers=1)
+    job_id = queue.submit({"app_id": "slow"})["job_id"]
+
+    async def run():
+        started = asyncio.Event()
+
+        async def handler(application):
+            started.set()
+            await asyncio.sleep(60)
+
+        queue.start(handler)
+        await asyncio.wait_for(started.wait(), 5)
+        assert queue.get(job_id)["status"] == RUNNING
+        await queue.stop()
+
+    asyncio.run(run())
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"], job["started_at"]) == (QUEUED, 0, None)
+
+
+def test_prune_removes_only_old_finished_jobs(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", retention=60)
+    old, recent, waiting = (queue.submit({"app_id": a})["job_id"] for a in ("old", "recent", "waiting"))
+    queue._finish(old, DONE, result={})
+    queue._finish(recent, FAILED, error="x")
+    queue._execute("UPDATE jobs SET finished_ts = finished_ts - 120 WHERE job_id = ?", (old,))
+
+    assert queue.prune() == 1
+    assert queue.get(old) is None
+    assert queue.get(recent)["status"] == FAILED and queue.get(waiting)["status"] == QUEUED
+
+
+def test_resubmitting_with_the_same_key_returns_the_first_job(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", workers=1)
+    first = queue.submit({"app_id": "a"}, app_id="a", idempotency_key="auto:h1", request_hash="h1")
+    again = queue.submit({"app_id": "b"}, app_id="b", idempotency_key="auto:h1", request_hash="h1")
+    assert again["duplicate"] and again["job_id"] == first["job_id"] and again["app_id"] == "a"
+    assert queue.depth() == 1
+
+    asyncio.run(_drain(queue, _score, [first["job_id"]]))
+    assert queue.find("auto:h1", "h1")["result"]["app_id"] == "a"
+    replayed = queue.submit({"app_id": "c"}, idempotency_key="auto:h1", request_hash="h1")
+    assert (replayed["job_id"], replayed["status"], replayed["duplicate"]) == (first["job_id"], DONE, True)
+    assert queue.find("auto:other") is None
+
+
+def test_a_client_key_reused_for_a_different_request_is_refused(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.submit({"app_id": "a"}, idempotency_key="client:k", request_hash="h1")
+    with pytest.raises(jobs.IdempotencyConflict):
+        queue.submit({"app_id": "b"}, idempotency_key="client:k", request_hash="h2")
+    with pytest.raises(jobs.IdempotencyConflict):
+        queue.find("client:k", "h2")
+    assert queue.depth() == 1
+
+
+def test_results_are_reused_only_within_the_window_and_never_after_a_failure(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    done = queue.submit({"app_id": "a"}, app_id="a", idempotency_key="k", request_hash="h", window=60, run_here=True)["job_id"]
+    assert queue.find("k", "h")["status"] == RUNNING
+    assert asyncio.run(queue.run_reserved(done, _score, {"app_id": "a"}))["decision"] == "approve"
+    assert queue.find("k", "h")["job_id"] == done and queue.get(done)["status"] == DONE
+    queue._execute("UPDATE jobs SET key_expires = key_expires - 120 WHERE job_id = ?", (done,))
+    assert queue.find("k", "h") is None
+
+    failed = queue.submit({"app_id": "b"}, idempotency_key="k2")["job_id"]
+    queue._finish(failed, FAILED, error="x")
+    assert queue.submit({"app_id": "b"}, idempotency_key="k2")["job_id"] != failed
+
+
+def test_concurrent_duplicates_from_two_processes_make_one_job(tmp_path):
+    path = tmp_path / "jobs.db"
+    queues = [JobQueue(path), JobQueue(path)]
+
+    async def submit_all():
+        return await asyncio.gather(*(asyncio.to_thread(queues[i % 2].submit, {"app_id": f"a{i}"}, None, "auto:h", "h") for i in range(8)))
+
+    accepted = asyncio.run(submit_all())
+    assert len({a["job_id"] for a in accepted}) == 1
+    assert sum(not a.get("duplicate") for a in accepted) == 1
+    assert queues[0].depth() == 1
+
+
+def test_submit_from_a_thread_wakes_the_workers(tmp_path):
+    # /predict submits from a threadpool thread; the worker should not have to wait for its 1 s poll.
+    queue = JobQueue(tmp_path / "jobs.db", workers=1)
+
+    async def run():
+        queue.start(_score)
+        try:
+            await asyncio.sleep(0.05)
+            start = asyncio.get_running_loop().time()
+            job = await asyncio.to_thread(queue.submit, {"app_id": "app_1"}, app_id="app_1")
+            while (await asyncio.to_thread(queue.get, job["job_id"]))["status"] != DONE:
+                await asyncio.sleep(0.01)
+            return asyncio.get_running_loop().time() - start
+        finally:
+            await queue.stop()
+
+    assert asyncio.run(run()) < 0.5
+
+
+def test_a_reserved_job_is_left_to_the_caller_and_requeued_if_it_is_cancelled(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", workers=1)
+    job = queue.submit({"app_id": "a"}, app_id="a", idempotency_key="k", request_hash="h", run_here=True)
+    assert queue.claim() is None
+
+    async def cancel_midway():
+        task = asyncio.create_task(queue.run_reserved(job["job_id"], lambda payload: asyncio.sleep(10), {"app_id": "a"}))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(cancel_midway())
+    assert queue.get(job["job_id"])["status"] == QUEUED and queue.get(job["job_id"])["attempts"] == 0
+    assert asyncio.run(_drain(queue, _score, [job["job_id"]]))[0]["result"]["app_id"] == "a"
@@ -0,0 +1,187 @@
+import tracemalloc
+import zipfile
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from backend import agents, ledger
+from backend.agents import DataExtractionAgent
+from backend.extraction_cache import ExtractionCache
+from backend.ledger import parse_ledger
+
+
+def _xlsx(path, rows):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Category", "Type", "Value"])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+def _csv(path, n):
+    with open(path, "w") as f:
+        f.write("Category,Type,Value\n")
+        for i in range(n):
+            f.write(f"cat{i % 50},{'Asset' if i % 3 else 'Liability'},{i % 997}\n")
+    return str(path)
+
+
+def test_data_creation_sheet_sums_match_the_pandas_result(tmp_path):
+    path = tmp_path / "assets_liabilities.xlsx"
+    pd.DataFrame({
+        "Category": ["Cash", "Car", "House Loan", "Credit Card", "Cash"],
+        "Type": ["Asset", "Asset", "Liability", "Liability", "asset"],
+        "Value": [5000, 20000, 15000, 5000, 250.5],
+    }).to_excel(path, index=False)
+
+    summary = parse_ledger(str(path))
+    assert (summary.assets, summary.liabilities, summary.rows, summary.malformed, summary.error) == (25250.5, 20000.0, 5, 0, None)
+    assert summary.categories == {"asset": {"Cash": 5250.5, "Car": 20000.0}, "liability": {"House Loan": 15000.0, "Credit Card": 5000.0}}
+
+
+def test_csv_reports_malformed_rows_instead_of_dropping_to_zero(tmp_path, monkeypatch):
+    path = tmp_path / "ledger.csv"
+    path.write_text(
+        "﻿Type,Value,Category\n"
+        " Assets ,\"1,200.50\",Savings\n"
+        "asset,AED 300,\n"
+        "\n"
+        "Liability,(200),Card\n"
+        "Income,900,Salary\n"
+        "Asset,n/a,Gold\n"
+        "Liability\n"
+    )
+    monkeypatch.setattr(ledger, "LEDGER_MAX_ISSUES", 2)
+    summary = parse_ledger(str(path))
+
+    assert summary.format == "csv"
+    assert (summary.assets, summary.liabilities) == (1500.5, -200.0)
+    assert summary.categories["asset"] == {"Savings": 1200.5, "uncategorized": 300.0}
+    assert (summary.rows, summary.malformed) == (6, 3)
+    assert summary.issues == [
+        {"row": 6, "reason": "unknown type", "values": ["Income", "900", "Salary"]},
+        {"row": 7, "reason": "value is not a number", "values": ["Asset", "n/a", "Gold"]},
+    ]
+
+
+def test_xlsx_rows_keep_sheet_row_numbers_and_column_positions(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Ledger"
+    ws.append(["Type", "Notes", "Value", "Category"])
+    ws.cell(row=4, column=1, value="Asset")
+    ws.cell(row=4, column=3, value=1500)
+    ws.cell(row=5, column=1, value="Liability")
+    ws.cell(row=5, column=3, value="=C4*2")
+    ws.cell(row=6, column=1, value="Liability")
+    ws.cell(row=6, column=3, value=True)
+    # Only the first sheet is read, like pd.read_excel did.
+    wb.create_sheet("Other").append(["Type", "Value"])
+    wb["Other"].append(["Asset", 999999])
+    wb.save(tmp_path / "ledger.xlsx")
+
+    summary = parse_ledger(str(tmp_path / "ledger.xlsx"))
+    assert (summary.assets, summary.liabilities, summary.rows) == (1500.0, 0.0, 3)
+    assert summary.categories["asset"] == {"uncategorized": 1500.0}
+    # The formula has no cached result (openpyxl never calculates), and a boolean is not an amount.
+    assert [(i["row"], i["reason"]) for i in summary.issues] == [(5, "value is not a number"), (6, "value is not a number")]
+
+
+@pytest.mark.parametrize("content, error", [
+    ("Category,Amount\nCash,5\n", "header row needs Type and Value columns"),
+    ("\n\n", "sheet is empty"),
+])
+def test_sheet_level_problems_are_reported(tmp_path, content, error):
+    path = tmp_path / "ledger.csv"
+    path.write_text(content)
+    assert parse_ledger(str(path)).error == error
+
+
+def test_unreadable_workbook_is_reported(tmp_path):
+    path = tmp_path / "assets.xlsx"
+    path.write_bytes(b"not a zip file")
+    summary = parse_ledger(str(path))
+    assert summary.error.startswith("BadZipFile")
+    assert (summary.assets, summary.liabilities) == (0.0, 0.0)
+
+
+def _peak(path):
+    tracemalloc.start()
+    try:
+        summary = parse_ledger(path)
+        return summary, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("kind, small, large", [("csv", 5000, 50000), ("xlsx", 1000, 10000)])
+def test_memory_stays_flat_as_the_sheet_grows(tmp_path, kind, small, large):
+    def build(n):
+        if kind == "csv":
+            return _csv(tmp_path / f"ledger_{n}.csv", n)
+        return _xlsx(tmp_path / f"ledger_{n}.xlsx", [[f"cat{i % 50}", "Asset" if i % 3 else "Liability", i % 997] for i in range(n)])
+
+    small_summary, small_peak = _peak(build(small))
+    large_summary, large_peak = _peak(build(large))
+    assert large_summary.rows == large and large_summary.malformed == 0
+    assert len(large_summary.categories["asset"]) == 50
+    # Ten times the rows, not ten times the memory.
+    assert large_peak < 2 * small_peak
+
+
+def test_agent_keeps_the_ledger_report_with_the_document(tmp_path, monkeypatch):
+    monkeypatch.setattr(agents, "extraction_cache", ExtractionCache(tmp_path / "cache"))
+    path = tmp_path / "assets_liabilities.csv"
+    path.write_text("Category,Type,Value\nCash,Asset,5000\nLoan,Liability,1200\nCar,Asset,abc\n")
+    parsed = DataExtractionAgent().extract({"files": [str(path)]})
+
+    assert (parsed["app_form"]["assets"], parsed["app_form"]["liabilities"]) == (5000.0, 1200.0)
+    report = parsed["documents"][0]["ledger"]
+    assert report["categories"] == {"asset": {"Cash": 5000.0}, "liability": {"Loan": 1200.0}}
+    assert report["malformed"] == 1 and report["issues"][0]["row"] == 4
+
+
+def _shared_strings_xlsx(path, rows):
+    """A workbook that keeps its text in sharedStrings.xml, as Excel does (openpyxl writes it inline)."""
+    main = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    rel = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+    strings, sheet = [], []
+    for number, row in enumerate(rows, start=1):
+        cells = []
+        for value in row:
+            if isinstance(value, str):
+                cells.append(f'<c t="s"><v>{len(strings)}</v></c>')
+                strings.append(f"<si><t>{value}</t></si>")
+            else:
+                cells.append(f"<c><v>{value}</v></c>")
+        sheet.append(f'<row r="{number}">{"".join(cells)}</row>')
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("xl/workbook.xml", f'<workbook {main} {rel}><sheets><sheet name="Ledger" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        zf.writestr("xl/_rels/workbook.xml.rels", '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                    '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>')
+        zf.writestr("xl/sharedStrings.xml", f'<sst {main}>{"".join(strings)}</sst>')
+        zf.writestr("xl/worksheets/sheet1.xml", f'<worksheet {main}><sheetData>{"".join(sheet)}</sheetData></worksheet>')
+    return str(path)
+
+
+def test_a_large_shared_string_table_is_moved_to_disk(tmp_path, monkeypatch):
+    # Unique text per row in a column the parser ignores: every string stays in the shared table.
+    def build(n):
+        rows = [[f"cat{i % 50}", "Asset" if i % 3 else "Liability", i % 997, f"note {i}: " + "x" * 40] for i in range(n)]
+        return _shared_strings_xlsx(tmp_path / f"notes_{n}.xlsx", [["Category", "Type", "Value", "Note"]] + rows)
+
+    small, large = build(1000), build(10000)
+    with zipfile.ZipFile(large) as zf, ledger._shared_strings(zf) as strings:
+        assert len(strings) == 30004 and not strings.spilled
+
+    monkeypatch.setattr(ledger, "LEDGER_STRINGS_IN_MEMORY", 16 * 1024)
+    with zipfile.ZipFile(large) as zf, ledger._shared_strings(zf) as strings:
+        assert strings.spilled and strings[len(strings) - 1].startswith("note 9999:")
+    small_summary, small_peak = _peak(small)
+    large_summary, large_peak = _peak(large)
+    assert large_summary.rows == 10000 and large_summary.malformed == 0
+    assert large_summary.assets == sum(i % 997 for i in range(10000) if i % 3)
+    assert large_peak < 2 * small_peak
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from backend import explanations, llm
+from backend.agents import ExplanationAgent
+from backend.llm import CircuitBreaker, LLMClient, LLMDeadlineExceeded, LLMTimeout, LLMUnavailable, StubModel
+
+
+def _client(model, **kwargs):
+    return LLMClient(model, **{"timeout": 1.0, "retries": 2, "backoff_base": 0.001, "backoff_max": 0.01, **kwargs})
+
+
+def test_transient_failures_are_retried_and_other_errors_are_not():
+    model = StubModel(failures=2)
+    client = _client(model)
+    assert client.generate("What is the salary deposit amount?") == "4000"
+    assert model.calls == 3 and client.stats()["counts"]["retries"] == 2
+
+    broken = StubModel(failures=1, error=lambda: ValueError("bad prompt"))
+    client = _client(broken)
+    with pytest.raises(ValueError):
+        client.generate("hi")
+    assert broken.calls == 1 and client.stats()["counts"]["error"] == 1
+
+
+def test_a_hung_attempt_is_abandoned_at_the_timeout():
+    client = _client(StubModel(latency_ms=2000), timeout=0.05, retries=0)
+    start = time.monotonic()
+    with pytest.raises(LLMTimeout):
+        client.generate("hi")
+    assert time.monotonic() - start < 0.5
+    assert client.stats()["counts"]["timeout"] == 1
+
+
+def test_breaker_opens_refuses_then_lets_one_trial_through():
+    model = StubModel(failures=3)
+    client = _client(model, retries=0, breaker=CircuitBreaker(failures=3, reset=0.1))
+    for _ in range(3):
+        with pytest.raises(llm.TransientLLMError):
+            client.generate("hi")
+    with pytest.raises(LLMUnavailable):
+        client.generate("hi")
+    assert model.calls == 3 and client.breaker.state == "open"
+
+    time.sleep(0.15)
+    assert client.generate("hi") and client.breaker.state == "closed"
+    assert client.stats()["breaker"]["times_opened"] == 1 and client.stats()["counts"]["rejected"] == 1
+
+
+def test_slot_waits_and_short_budgets_never_open_the_breaker():
+    model = StubModel(latency_ms=50)
+    client = _client(model, breaker=CircuitBreaker(failures=3, reset=30))
+    for _ in range(3):
+        with llm.budget(llm.deadline_in(0.01)), pytest.raises(LLMDeadlineExceeded):
+            client.generate("hi")
+    assert client.breaker.state == "closed" and client.breaker.consecutive == 0
+    assert client.stats()["counts"]["budget"] == 3 and client.stats()["counts"]["retries"] == 0
+
+    # One slow call holds the only slot; callers that cannot get it in time give up without blaming the model.
+    client = _client(StubModel(latency_ms=300), max_concurrency=1, breaker=CircuitBreaker(failures=1, reset=30))
+    holder = threading.Thread(target=client.generate, args=("hi",))
+    holder.start()
+    time.sleep(0.05)
+    for call in (client.generate, lambda prompt: list(client.stream(prompt))):
+        with llm.budget(llm.deadline_in(0.05)), pytest.raises(LLMDeadlineExceeded) as e:
+            call("hi")
+        assert e.value.outcome == "busy"
+    holder.join()
+    assert client.breaker.state == "closed" and client.stats()["counts"]["busy"] == 2 and client.stats()["counts"]["ok"] == 1
+
+
+def test_concurrency_is_capped_and_a_slow_request_is_hedged():
+    class Tracking(StubModel):
+        def __init__(self, latencies):
+            super().__init__()
+            self.latencies = list(latencies)
+            self.active = self.peak = 0
+
+        def generate_content(self, contents=None, stream=False, timeout=None):
+            with self._lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                delay = self.latencies.pop(0) if self.latencies else 0.05
+            time.sleep(delay)
+            with self._lock:
+                self.active -= 1
+            return llm.StubResponse(f"after {delay}")
+
+    model = Tracking([])
+    client = _client(model, max_concurrency=2)
+    threads = [threading.Thread(target=client.generate, args=("hi",)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert model.peak == 2 and client.stats()["counts"]["ok"] == 6
+
+    client = _client(Tracking([1.0, 0.01]), max_concurrency=2, hedge_after=0.05)
+    start = time.monotonic()
+    assert client.generate("hi") == "after 0.01"
+    assert time.monotonic() - start < 0.5
+    assert client.stats()["counts"]["hedges"] == client.stats()["counts"]["hedge_wins"] == 1
+
+
+def test_spent_budget_returns_the_template_explanation(monkeypatch):
+    model = StubModel(latency_ms=2000)
+    monkeypatch.setattr(llm, "_client", _client(model, timeout=5))
+    agent = ExplanationAgent.__new__(ExplanationAgent)
+    agent.model = model
+    report = {"address_match": True, "income_match": True, "conflicts": [], "confidence": 0.95}
+
+    start = time.monotonic()
+    text = llm.within(llm.deadline_in(0.1), agent.explain, {"app_id": "app_1"}, {}, report, "approve", 0.9, ["upskill"], rich=True)
+    assert time.monotonic() - start < 1
+    assert text == explanations.render_explanation("approve", 0.9, ["meets_income_threshold", "low_per_capita_income"], ["upskill"], report)
+    assert llm.get_llm_client().stats()["counts"]["budget"] == 1
+
+    # Nothing left of the budget: the model is not even asked.
+    calls = model.calls
+    with llm.budget(time.monotonic() - 1), pytest.raises(LLMDeadlineExceeded):
+        llm.get_llm_client().generate("hi")
+    assert model.calls == calls and llm.get_llm_client().stats()["counts"]["budget"] == 2
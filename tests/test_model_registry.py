@@ -0,0 +1,128 @@
+import os
+import threading
+
+import joblib
+import numpy as np
+import pytest
+
+from backend.agents import EligibilityAgent
+from backend import model_registry
+from backend.model_registry import ActiveModel, ModelRegistry, load_initial_model, preload_initial_model
+
+
+@pytest.fixture
+def registry(tmp_path, eligibility_pipeline):
+    path = tmp_path / "eligibility.joblib"
+    joblib.dump(eligibility_pipeline, path)
+    registry = ModelRegistry(tmp_path / "registry")
+    registry.register(str(path), version="v1", metrics={"accuracy": 0.9})
+    registry.register(str(path), version="v2")
+    return registry
+
+
+def test_register_writes_metadata_and_first_version_becomes_active(registry):
+    versions = {m["version"]: m for m in registry.versions()}
+    assert set(versions) == {"v1", "v2"}
+    assert versions["v1"]["metrics"] == {"accuracy": 0.9}
+    assert versions["v1"]["classes"] == ["approve", "reject", "soft-decline"]
+    assert "monthly_income" in versions["v1"]["features"]
+    assert registry.active_version() == "v1"
+    with pytest.raises(ValueError):
+        registry.register(str(registry.root / "v1" / "model.joblib"), version="v1")
+
+
+def test_loaded_model_is_memory_mapped_and_pipeline_is_lazy(registry):
+    model = registry.load("v1")
+    assert isinstance(model.engine.arrays["value"], np.memmap)
+    assert model._pipeline is None
+    assert model.classes == ["approve", "reject", "soft-decline"]
+
+
+def test_swap_keeps_in_flight_model_and_records_version(registry):
+    active = ActiveModel(registry, load_initial_model(registry, "missing.joblib"), refresh_interval=float("inf"))
+    agent = EligibilityAgent.__new__(EligibilityAgent)
+    agent.active_model = active
+
+    pinned = active.current()
+    active.swap("v2")
+    assert pinned.version == "v1"
+    assert active.current().version == "v2"
+    assert registry.active_version() == "v2"
+
+    version, (decision, _, _, _) = agent.assess_versioned({"family_size": 2, "reported_income": 300}, {}, {})
+    assert version == "v2"
+    with pytest.raises(KeyError):
+        active.swap("v9")
+
+
+def test_other_workers_pick_up_new_pointer_without_blocking_requests(registry, monkeypatch):
+    worker = ActiveModel(registry, registry.load("v1"), refresh_interval=0)
+    registry.set_active("v2")
+    os.utime(registry.root / "ACTIVE", (1, 1))
+    loading = threading.Event()
+    load = registry.load
+
+    def slow_load(version, compiled=True):
+        loading.wait(5)
+        return load(version, compiled=compiled)
+
+    monkeypatch.setattr(registry, "load", slow_load)
+    # The new version loads in the background; requests keep scoring with the old one meanwhile.
+    assert worker.current().version == "v1"
+    assert worker.current().version == "v1"
+    loading.set()
+    assert worker.wait_reloaded(5)
+    assert worker.current().version == "v2"
+
+
+def test_concurrent_scoring_during_swaps_never_fails(registry):
+    agent = EligibilityAgent.__new__(EligibilityAgent)
+    agent.active_model = ActiveModel(registry, registry.load("v1"), refresh_interval=float("inf"))
+    errors = []
+    seen = set()
+
+    def score():
+        for _ in range(50):
+            try:
+                version, _ = agent.assess_versioned({"family_size": 3, "reported_income": 900}, {}, {})
+                seen.add(version)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=score) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for version in ["v2", "v1", "v2"]:
+        agent.active_model.swap(version)
+    for t in threads:
+        t.join()
+    assert not errors
+    assert seen <= {"v1", "v2"}
+
+
+def test_fallback_to_legacy_joblib_when_registry_is_empty(tmp_path, eligibility_pipeline):
+    path = tmp_path / "eligibility_v1.joblib"
+    joblib.dump(eligibility_pipeline, path)
+    model = load_initial_model(ModelRegistry(tmp_path / "empty"), str(path))
+    assert model.version == "eligibility_v1"
+    assert model.engine is not None
+    with pytest.raises(FileNotFoundError):
+        load_initial_model(ModelRegistry(tmp_path / "empty"), str(tmp_path / "missing.joblib"))
+
+
+def test_preloaded_model_is_reused_by_forked_workers(registry, tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "_preloaded", {})
+    fallback = str(tmp_path / "missing.joblib")
+    model = preload_initial_model(registry, fallback)
+    assert model.version == "v1" and model._pipeline is not None
+
+    pid = os.fork()
+    if pid == 0:
+        # A worker must not read the model files again.
+        registry.load = joblib.load = None
+        ok = load_initial_model(registry, fallback) is model and model.engine.predict_proba([{}]).shape == (1, 3)
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # A different configuration is not served from the cache.
+    assert load_initial_model(registry, fallback, compiled=False) is not model
@@ -0,0 +1,173 @@
+import importlib.util
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytesseract
+import pytest
+from PIL import Image, ImageDraw
+
+from backend import ocr
+from backend.agents import DataExtractionAgent
+from backend.ocr import ID_CARD_REGIONS, OcrPool, crop_region, normalize, ocr_image, otsu_threshold
+
+
+def _card(path, scale=1, name="Aisha Khan", dob="1990-05-10"):
+    # Same layout as data_creation.py's Emirates ID images.
+    img = Image.new("RGB", (600, 300), "white")
+    ImageDraw.Draw(img).text((50, 50), f"Emirates ID\nName: {name}\nDOB: {dob}\nID: E7654321", fill="black")
+    if scale != 1:
+        img = img.resize((600 * scale, 300 * scale), Image.BICUBIC)
+    img.save(path)
+    return str(path)
+
+
+def _load_benchmark():
+    script = Path(__file__).resolve().parents[1] / "scripts" / "benchmark_ocr.py"
+    spec = importlib.util.spec_from_file_location("benchmark_ocr", script)
+    bench = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bench)
+    return bench
+
+
+def _tesseract_installed():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def _ink_lines(image):
+    rows = (np.asarray(image) < 128).any(axis=1)
+    return int(np.sum(rows[1:] & ~rows[:-1]) + rows[0])
+
+
+def test_normalize_scales_to_the_target_dpi_and_binarizes(tmp_path):
+    with Image.open(_card(tmp_path / "photo.jpg", scale=6)) as photo:
+        image = normalize(photo)
+    assert image.mode == "L" and image.width == int(ocr.ID_CARD_WIDTH_IN * ocr.OCR_TARGET_DPI)
+    assert set(np.unique(np.asarray(image))) <= {0, 255}
+
+    with Image.open(_card(tmp_path / "small.jpg")) as small:
+        # Small captures are enlarged, but never by more than OCR_MAX_UPSCALE.
+        assert normalize(small, target_width=5000).width == 600 * ocr.OCR_MAX_UPSCALE
+
+
+def test_otsu_separates_ink_from_paper():
+    gray = np.array([30] * 100 + [220] * 900, dtype=np.uint8)
+    assert 30 <= otsu_threshold(gray) < 220
+
+
+def test_name_dob_region_holds_exactly_those_two_lines(tmp_path):
+    with Image.open(_card(tmp_path / "emirates_id.jpg", scale=3)) as card:
+        image = normalize(card)
+    assert _ink_lines(image) == 4
+    assert _ink_lines(crop_region(image, ID_CARD_REGIONS["name_dob"])) == 2
+
+
+class FakeWorker:
+    created = 0
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, lang):
+        with FakeWorker.lock:
+            FakeWorker.created += 1
+
+    def recognize(self, image, psm):
+        with FakeWorker.lock:
+            FakeWorker.active += 1
+            FakeWorker.peak = max(FakeWorker.peak, FakeWorker.active)
+        time.sleep(0.005)
+        with FakeWorker.lock:
+            FakeWorker.active -= 1
+        # A region crop is a short, wide strip; the full card is about twice as wide as tall.
+        if image.width > 3 * image.height:
+            return "Name: Aisha Khan\nDOB: 1990-05-10" if psm == ocr.OCR_REGION_PSM else ""
+        return "Emirates ID\nName: Aisha Khan\nDOB: 1990-05-10\nID: E7654321"
+
+
+def test_pool_reuses_a_bounded_set_of_warm_workers(monkeypatch):
+    monkeypatch.setattr(ocr, "OcrWorker", FakeWorker)
+    FakeWorker.created = FakeWorker.peak = 0
+    pool = OcrPool(size=2)
+    assert pool.warm() is not None and FakeWorker.created == 2
+
+    blank = Image.new("L", (100, 100), 255)
+    threads = [threading.Thread(target=lambda: [pool.recognize(blank, 6) for _ in range(5)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert FakeWorker.created == 2 and FakeWorker.peak <= 2
+
+
+def test_region_first_reads_the_whole_card_only_when_fields_are_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr, "OcrWorker", FakeWorker)
+    pool = OcrPool(size=1)
+    path = _card(tmp_path / "emirates_id.jpg")
+
+    found = ocr_image(path, regions=["name_dob"], until=lambda t: "DOB" in t, pool=pool)
+    assert found.passes == ["name_dob"] and "Aisha Khan" in found.text
+
+    missing = ocr_image(path, regions=["name_dob"], until=lambda t: "ID: E" in t, pool=pool)
+    assert missing.passes == ["name_dob", "full"] and "E7654321" in missing.text
+    assert ocr_image(path, pool=pool).passes == ["full"]
+
+
+def test_agent_uses_regions_for_emirates_id_cards_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr, "ocr_pool", OcrPool(size=1))
+    monkeypatch.setattr(ocr, "OcrWorker", FakeWorker)
+    agent = DataExtractionAgent()
+    calls = []
+    original = ocr.ocr_pool.recognize
+    monkeypatch.setattr(ocr.ocr_pool, "recognize", lambda image, psm: calls.append(psm) or original(image, psm))
+
+    text = agent._extract_text_from_image(_card(tmp_path / "emirates_id.jpg"))
+    assert agent._extract_name_dob_from_text(text) == ("Aisha", "1990-05-10")
+    assert calls == [ocr.OCR_REGION_PSM]
+
+    calls.clear()
+    agent._extract_text_from_image(_card(tmp_path / "passport.png"))
+    assert calls == [ocr.OCR_FULL_PSM]
+
+
+def test_benchmark_measures_the_data_creation_cards(tmp_path):
+    bench = _load_benchmark()
+
+    cards = bench.generate_cards(tmp_path, scales=(1, 2))
+    assert [c["truth"] for c in cards[::2]] == [
+        {"name": "Ashish Agarwal", "dob": "1980-01-01"},
+        {"name": "Aisha Khan", "dob": "1990-05-10"},
+        {"name": "Omar Ali", "dob": "1975-09-22"},
+    ]
+    report = bench.main(scales=(1, 2), repeat=1, out=str(tmp_path / "ocr.json"))
+    assert report["results"]["preprocess"]["n"] == 6
+    if "ocr" not in report["meta"]["skipped"]:
+        assert {"name_accuracy", "dob_accuracy"} <= set(report["results"]["pipeline_region_first"])
+    else:
+        assert report["accuracy_check"] is None
+
+
+def test_accuracy_check_fails_below_the_threshold():
+    bench = _load_benchmark()
+    results = {"pipeline_region_first": {"name_accuracy": 1.0, "dob_accuracy": 0.5}}
+    assert bench.check_accuracy(results, {}, 0.9) == {"min_accuracy": 0.9, "passed": False, "failed": {"dob": 0.5}}
+    assert bench.check_accuracy(results, {}, 0.5)["passed"]
+    assert bench.check_accuracy({}, {"ocr": "tesseract is not installed"}) is None
+
+
+@pytest.mark.skipif(not _tesseract_installed(), reason="tesseract is not installed")
+def test_data_creation_cards_are_read_accurately(tmp_path):
+    report = _load_benchmark().main(scales=(1, 5), repeat=1, out=str(tmp_path / "ocr.json"))
+    assert report["accuracy_check"]["passed"], report["results"]["pipeline_region_first"]
+
+
+def test_no_ocr_pass_is_started_after_the_deadline(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr, "OcrWorker", FakeWorker)
+    path = _card(tmp_path / "emirates_id.jpg")
+    result = ocr_image(path, regions=["name_dob"], until=lambda t: "ID: E" in t, pool=OcrPool(size=1), deadline=time.monotonic() - 1)
+    assert result.timed_out and result.passes == []
@@ -0,0 +1,98 @@
+import re
+import time
+
+from reportlab.pdfgen import canvas
+
+from backend.agents import DataExtractionAgent
+from backend.pdf_text import extract_pdf_text, pdf_stats
+from backend.tracing import start_trace
+
+
+def _statement(path, pages=6, salary_page=0, blank=False):
+    c = canvas.Canvas(str(path))
+    for page in range(pages):
+        if not blank:
+            c.drawString(100, 750, f"Bank Statement - Page {page + 1}")
+            c.drawString(100, 730, "Date: 2025-10-08 | Description: Rent Payment | Amount: -2000 AED")
+            if page == salary_page:
+                c.drawString(100, 710, "Date: 2025-10-10 | Description: Salary Deposit | Amount: 5000 AED")
+        c.showPage()
+    c.save()
+    return str(path)
+
+
+def has_salary(text):
+    return "Salary Deposit" in text
+
+
+def test_fast_mode_stops_once_the_fields_are_found(tmp_path):
+    path = _statement(tmp_path / "bank_statement.pdf", pages=6, salary_page=1)
+    before = pdf_stats.snapshot()
+    result = extract_pdf_text(path, until=has_salary, mode="fast")
+
+    assert (len(result.pages), result.page_count, result.mode) == (2, 6, "fast")
+    assert result.early_exit and result.fallback is None
+    assert "Amount: 5000 AED" in result.text and "\r" not in result.text
+    assert result.to_dict()["ms_per_page"] == result.ms_per_page > 0
+    after = pdf_stats.snapshot()
+    assert (after["documents"] - before["documents"], after["pages"] - before["pages"]) == (1, 2)
+
+
+def test_page_limit_caps_the_pages_read(tmp_path):
+    path = _statement(tmp_path / "statement.pdf", pages=5)
+    result = extract_pdf_text(path, max_pages=2)
+    assert (len(result.pages), result.page_count, result.fallback) == (2, 5, None)
+    assert len(extract_pdf_text(path, max_pages=0).pages) == 5
+
+
+def test_fast_and_layout_modes_read_the_same_words(tmp_path):
+    path = _statement(tmp_path / "statement.pdf", pages=2)
+    fast = extract_pdf_text(path, mode="fast").text
+    layout = extract_pdf_text(path, mode="layout").text
+    assert re.sub(r"\s+", " ", fast).strip() == re.sub(r"\s+", " ", layout).strip()
+
+
+def test_layout_analysis_is_only_a_fallback(tmp_path):
+    # Fields missing from a healthy text layer: nothing is re-read, since layout analysis reads the same text.
+    path = _statement(tmp_path / "statement.pdf", pages=6, salary_page=-1)
+    result = extract_pdf_text(path, until=has_salary, max_pages=6)
+    assert (result.fallback, result.mode, len(result.pages), result.early_exit) == (None, "fast", 6, False)
+
+    # No text layer at all (e.g. a scan): re-read with layout analysis.
+    blank = extract_pdf_text(_statement(tmp_path / "scan.pdf", pages=2, blank=True))
+    assert (blank.fallback, blank.mode, blank.text.strip()) == ("sparse", "layout", "")
+
+    # Not a PDF: both readers fail, and the caller still gets empty text.
+    (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+    broken = extract_pdf_text(str(tmp_path / "broken.pdf"))
+    assert (broken.fallback, broken.text) == ("error", "")
+    assert broken.error is not None
+
+
+def test_agent_stops_reading_each_document_type_at_its_fields(tmp_path):
+    statement = _statement(tmp_path / "bank_statement.pdf", pages=8, salary_page=0)
+    c = canvas.Canvas(str(tmp_path / "credit_report.pdf"))
+    for score in (712, 0):
+        c.drawString(100, 750, f"Credit Score: {score}" if score else "Payment history ...")
+        c.showPage()
+    c.save()
+
+    agent = DataExtractionAgent()
+    with start_trace("extract") as trace:
+        text = agent._extract_text_from_pdf(statement)
+        report = agent._extract_text_from_pdf(str(tmp_path / "credit_report.pdf"))
+
+    assert "Salary Deposit" in text and agent._extract_credit_score(report) == 712
+    assert [(s["attrs"]["pages"], s["attrs"]["page_count"], s["attrs"]["early_exit"]) for s in trace.spans] == [(1, 8, True), (1, 2, True)]
+
+
+def test_no_page_is_started_after_the_deadline(tmp_path):
+    path = _statement(tmp_path / "statement.pdf", pages=6, salary_page=-1)
+
+    def slow_check(text):
+        time.sleep(0.1)
+        return False
+
+    result = extract_pdf_text(path, until=slow_check, deadline=time.monotonic() + 0.15)
+    assert result.timed_out and 1 <= len(result.pages) < 6
+    assert result.fallback is None and result.to_dict()["timed_out"]
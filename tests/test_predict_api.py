@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.jobs import JobQueue
+from backend.orchestrator import Orchestrator
+
+FORM = {"name": "Test Applicant", "dob": "1990-01-01", "address": "1 Main St", "family_size": "3", "income": "2500"}
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    # Imported with a stand-in orchestrator (no model on disk) and data/ under tmp_path.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Orchestrator, "__init__", lambda self: None)
+    from backend import main
+
+    calls = []
+    release = threading.Event()
+
+    async def run_prediction(application):
+        calls.append(application["app_id"])
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return {"app_id": application["app_id"], "decision": "approve", "score": 0.9, "reasons": [], "recommendations": []}
+
+    monkeypatch.setattr(main, "job_queue", JobQueue(tmp_path / "jobs.db", max_depth=2, workers=1))
+    monkeypatch.setattr(main, "run_prediction", run_prediction)
+    monkeypatch.setattr(main, "PREDICT_WAIT_TIMEOUT", 5)
+    # No `with`: the lifespan (warm-up, workers) does not run, and every request gets its own event loop, like separate processes.
+    client = TestClient(main.app)
+    client.calls, client.release, client.main = calls, release, main
+    return client
+
+
+def test_a_queued_request_is_accepted_and_resubmissions_get_the_same_job(api):
+    first = api.post("/predict", data=FORM)
+    assert first.status_code == 202 and first.headers["Location"] == first.json()["status_url"]
+    again = api.post("/predict", data=FORM)
+    assert again.status_code == 202 and again.json()["duplicate"] and again.json()["job_id"] == first.json()["job_id"]
+    assert api.get(first.json()["status_url"]).json()["status"] == "queued"
+
+
+def test_a_full_queue_is_refused_with_retry_after(api):
+    for income in ("1000", "2000"):
+        assert api.post("/predict", data={**FORM, "income": income}).status_code == 202
+    full = api.post("/predict", data={**FORM, "income": "3000"})
+    assert full.status_code == 429 and int(full.headers["Retry-After"]) >= 1
+
+
+def test_wait_scores_in_the_request_and_a_repeat_is_replayed(api):
+    api.release.set()
+    first = api.post("/predict", params={"wait": "true"}, data=FORM, headers={"Idempotency-Key": "k1"})
+    assert first.status_code == 200 and first.json()["decision"] == "approve"
+    assert "Idempotent-Replayed" not in first.headers
+
+    again = api.post("/predict", params={"wait": "true"}, data=FORM, headers={"Idempotency-Key": "k1"})
+    assert again.status_code == 200 and again.headers["Idempotent-Replayed"] == "true"
+    assert again.json() == first.json() and len(api.calls) == 1
+
+    conflict = api.post("/predict", data={**FORM, "income": "9999"}, headers={"Idempotency-Key": "k1"})
+    assert conflict.status_code == 422 and len(api.calls) == 1
+
+
+def test_concurrent_duplicates_wait_on_one_run(api):
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(api.post, "/predict", params={"wait": "true"}, data=FORM)
+        deadline = time.monotonic() + 5
+        while not api.calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        second = pool.submit(api.post, "/predict", params={"wait": "true"}, data=FORM)
+        api.release.set()
+        responses = [first.result(), second.result()]
+    assert [r.status_code for r in responses] == [200, 200]
+    assert len(api.calls) == 1 and responses[0].json()["app_id"] == responses[1].json()["app_id"] == api.calls[0]
+    assert responses[1].headers["Idempotent-Replayed"] == "true"
+
+
+def test_waiting_on_a_queued_duplicate_gives_up_after_the_timeout(api, monkeypatch):
+    monkeypatch.setattr(api.main, "PREDICT_WAIT_TIMEOUT", 0.2)
+    queued = api.post("/predict", data=FORM).json()
+    waited = api.post("/predict", params={"wait": "true"}, data=FORM)
+    assert waited.status_code == 202 and waited.json()["duplicate"] and waited.json()["job_id"] == queued["job_id"]
+    assert api.calls == []
+
+
+def test_a_malformed_applications_cursor_is_a_client_error(api):
+    response = api.get("/applications", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400 and "cursor" in response.json()["detail"]
@@ -0,0 +1,107 @@
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+from reportlab.pdfgen import canvas
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "preprocess_raw_data.py"
+spec = importlib.util.spec_from_file_location("preprocess_raw_data", SCRIPT)
+preprocess = importlib.util.module_from_spec(spec)
+# Registered so the process pool can pickle `process_folder` by name.
+sys.modules[spec.name] = preprocess
+sys.path.insert(0, str(SCRIPT.parent))
+spec.loader.exec_module(preprocess)
+
+
+def _applicant(raw, app_id, assets, credit_score):
+    folder = raw / app_id
+    folder.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({"Type": ["Asset", "Liability"], "Value": [assets, 1000]}).to_excel(folder / "assets_liabilities.xlsx", index=False)
+    c = canvas.Canvas(str(folder / "credit_report.pdf"))
+    c.drawString(100, 750, f"Credit Score: {credit_score}")
+    c.save()
+    return folder
+
+
+def _run(tmp_path, **kwargs):
+    return preprocess.main(
+        raw_dir=str(tmp_path / "raw"),
+        dataset_dir=str(tmp_path / "dataset"),
+        manifest_path=str(tmp_path / "manifest.json"),
+        workers=1,
+        **kwargs,
+    )
+
+
+def test_first_run_writes_parquet_partitioned_by_run(tmp_path):
+    for i in range(3):
+        _applicant(tmp_path / "raw", f"app_{i}", assets=10000 * (i + 1), credit_score=700 + i)
+
+    stats = _run(tmp_path)
+    assert stats["processed"] == 3
+    # One single-page credit report per applicant, stopped at the score.
+    assert stats["pdf_pages"] == 3 and stats["pdf_ms_per_page"] > 0
+    assert [p.name for p in (tmp_path / "dataset").iterdir()] == [f"run={stats['run_id']}"]
+
+    df = preprocess.read_dataset(str(tmp_path / "dataset")).sort_values("app_id")
+    assert list(df["assets"]) == [10000, 20000, 30000]
+    # The credit score regex actually matches the generated reports.
+    assert list(df["credit_score"]) == [700, 701, 702]
+    assert all("credit_score" not in filled for filled in df["defaults_filled"])
+
+
+def test_second_run_skips_unchanged_and_reprocesses_only_changed(tmp_path):
+    raw = tmp_path / "raw"
+    for i in range(3):
+        _applicant(raw, f"app_{i}", assets=10000, credit_score=650)
+    _run(tmp_path)
+
+    again = _run(tmp_path)
+    assert (again["processed"], again["skipped"], again["run_id"]) == (0, 3, None)
+
+    # Touching a file changes the mtime but not the bytes: hashed, not reparsed.
+    xlsx = raw / "app_0" / "assets_liabilities.xlsx"
+    os.utime(xlsx, ns=(xlsx.stat().st_atime_ns, xlsx.stat().st_mtime_ns + 10**9))
+    touched = _run(tmp_path)
+    assert (touched["processed"], touched["touched"], touched["skipped"]) == (0, 1, 2)
+
+    _applicant(raw, "app_1", assets=55555, credit_score=650)
+    changed = _run(tmp_path)
+    assert (changed["processed"], changed["skipped"]) == (1, 2)
+
+    latest = preprocess.read_dataset(str(tmp_path / "dataset")).set_index("app_id")
+    assert len(latest) == 3
+    assert latest.loc["app_1", "assets"] == 55555
+    assert latest.loc["app_1", "run"] == changed["run_id"]
+    assert len(preprocess.read_dataset(str(tmp_path / "dataset"), latest=False)) == 4
+
+
+def test_removed_folders_leave_the_manifest_and_force_reprocesses(tmp_path):
+    raw = tmp_path / "raw"
+    for i in range(2):
+        _applicant(raw, f"app_{i}", assets=1, credit_score=600)
+    _run(tmp_path)
+
+    for f in (raw / "app_1").iterdir():
+        f.unlink()
+    (raw / "app_1").rmdir()
+    stats = _run(tmp_path)
+    assert (stats["removed"], stats["pruned"]) == (1, 1)
+    assert set(preprocess.load_manifest(str(tmp_path / "manifest.json"))) == {"app_0"}
+    assert list(preprocess.read_dataset(str(tmp_path / "dataset"), latest=False)["app_id"]) == ["app_0"]
+
+    # Every run that held a record of a deleted applicant is rewritten; a run left empty goes away.
+    _applicant(raw, "app_0", assets=2, credit_score=600)
+    _applicant(raw, "app_2", assets=3, credit_score=600)
+    second = _run(tmp_path)
+    for f in (raw / "app_0").iterdir():
+        f.unlink()
+    (raw / "app_0").rmdir()
+    stats = _run(tmp_path)
+    assert (stats["removed"], stats["pruned"]) == (1, 2)
+    assert [p.name for p in (tmp_path / "dataset").iterdir()] == [f"run={second['run_id']}"]
+    assert list(preprocess.read_dataset(str(tmp_path / "dataset"), latest=False)["app_id"]) == ["app_2"]
+
+    assert _run(tmp_path, force=True)["processed"] == 1
@@ -0,0 +1,105 @@
+import numpy as np
+
+from backend.application_store import ApplicationStore
+from backend.retrieval import RetrievalIndex, embed
+
+
+def _record(app_id, decision, income, created_at, explanation=""):
+    return {
+        "app_id": app_id,
+        "decision": decision,
+        "reasons": {"approve": ["low_per_capita_income"], "reject": ["sufficient_income"]}[decision],
+        "recommendations": {"approve": ["upskill", "job_match"], "reject": []}[decision],
+        "explanation": explanation,
+        "created_at": created_at,
+        "application": {"reported_income": income, "family_size": 4},
+    }
+
+
+def test_embedding_is_deterministic_and_normalised():
+    terms, weights = embed("Why was my application rejected?")
+    assert terms.dtype == np.uint32 and weights.dtype == np.float32
+    assert np.isclose(np.linalg.norm(weights), 1.0)
+    again = embed("why was my application REJECTED")
+    np.testing.assert_array_equal(terms, again[0])
+    np.testing.assert_array_equal(weights, again[1])
+    assert len(embed("")[0]) == 0
+
+
+def test_search_ranks_related_documents_first(tmp_path):
+    index = RetrievalIndex(tmp_path / "index")
+    index.ensure_policies()
+    index.add_records([
+        _record("app_1", "approve", 900, "2026-10-01T00:00:00+00:00", "Low per capita income qualifies you for job matching."),
+        _record("app_2", "reject", 9000, "2026-10-02T00:00:00+00:00", "Your income is sufficient so support was rejected."),
+    ])
+
+    assert index.search("what is the per capita income threshold for soft-decline", k=1)[0]["id"] == "policy:soft-decline"
+    assert index.search("which documents are required", k=1)[0]["id"] == "policy:documents"
+    assert index.search("income sufficient rejected", k=1)[0]["id"] == "app_2"
+
+    # Re-saving an application replaces its vector instead of adding a duplicate.
+    count = len(index)
+    index.add_records([_record("app_1", "reject", 9000, "2026-10-03T00:00:00+00:00", "Re-scored as rejected.")])
+    assert len(index) == count
+    assert index.search("re-scored", k=1)[0]["id"] == "app_1"
+    assert index.search("job matching qualifies", k=5)[0]["id"] != "app_1"
+
+
+def test_index_persists_across_segments(tmp_path):
+    index = RetrievalIndex(tmp_path / "index", segment_postings=500)
+    index.add_records(_record(f"app_{i}", "approve", 500 + i, f"2026-10-01T00:00:{i % 60:02d}+00:00") for i in range(1500))
+    index.add_records([_record("app_x", "reject", 20000, "2026-10-02T00:00:00+00:00", "Overseas property holdings exceed the limit.")])
+    index.save()
+
+    assert index.stats()["segments"] > 1
+    reloaded = RetrievalIndex(tmp_path / "index")
+    assert len(reloaded) == 1501
+    assert reloaded.search("overseas property", k=1)[0]["id"] == "app_x"
+
+
+def test_store_writes_are_indexed_in_the_background(tmp_path):
+    store = ApplicationStore(tmp_path / "apps.db")
+    index = RetrievalIndex(tmp_path / "index")
+    store.add_listener(index.enqueue)
+
+    store.save(_record("app_new", "reject", 12000, None, "Income above the programme limit."))
+    store.flush()
+    index.flush()
+    assert index.search("programme limit", k=1)[0]["id"] == "app_new"
+
+    # A second worker catches up on records it never saw through its own writer.
+    other = RetrievalIndex(tmp_path / "other")
+    other.sync_from_store(store)
+    assert other.search("programme limit", k=1)[0]["id"] == "app_new"
+    assert other.high_water == store.get("app_new")["created_at"]
+
+
+def test_resyncing_and_rescoring_do_not_grow_the_index(tmp_path):
+    store = ApplicationStore(tmp_path / "apps.db")
+    for i in range(50):
+        store.save(_record(f"app_{i}", "approve", 500 + i, f"2026-10-01T00:00:{i:02d}+00:00"))
+    store.flush()
+    index = RetrievalIndex(tmp_path / "index", segment_postings=200)
+    store.add_listener(index.enqueue)
+    index.sync_from_store(store)
+    postings = index.stats()["postings"]
+
+    # Records this worker already indexed from its writer come round again on every sync.
+    index.high_water = ""
+    index.sync_from_store(store)
+    assert index.stats()["postings"] == postings and index.stats()["dead_documents"] == 0
+
+    # Re-scoring the same application over and over leaves only its latest postings behind.
+    for round_ in range(40):
+        index.add_records([_record("app_0", "reject", 9000 + round_, f"2026-10-02T00:{round_:02d}:00+00:00", f"Round {round_} rescore.")])
+    index.save()
+    assert len(index._doc_ids) <= 2 * len(index) and index.stats()["postings"] < 3 * postings
+    assert index.search("round 39 rescore", k=1)[0]["id"] == "app_0"
+    assert index.search("income 549", k=1)[0]["id"] == "app_49"
+
+    reloaded = RetrievalIndex(tmp_path / "index")
+    assert len(reloaded) == 50 and reloaded.search("round 39 rescore", k=1)[0]["id"] == "app_0"
+    dead = reloaded.stats()["dead_documents"]
+    reloaded.add_records([store.get("app_1")])
+    assert reloaded.stats()["dead_documents"] == dead
@@ -0,0 +1,48 @@
+from backend.salary_rules import SalaryRuleEngine
+
+APP_001 = "Bank Statement - Account: 123456789\nDate: 2025-10-10 | Description: Salary Deposit | Amount: 5000 AED\nDate: 2025-10-08 | Description: Rent Payment | Amount: -2000 AED\nClosing Balance: 3000 AED"
+APP_002 = "Bank Statement - Account: 987654321\nDate: 2025-01-01 | Salary Deposit | 7000 AED\nDate: 2025-01-05 | Loan EMI | -2500 AED\nClosing Balance: 4500 AED"
+APP_003 = "Bank Statement - Account: 555888999\nDate: 2025-01-02 | Business Income | 4000 AED\nDate: 2025-01-06 | Utilities | -2000 AED\nClosing Balance: 2000 AED"
+
+
+def test_generated_statement_formats_match_confidently():
+    engine = SalaryRuleEngine()
+    first = engine.confident_match(APP_001)
+    second = engine.confident_match(APP_002)
+    assert (first.amount, first.rule) == (5000.0, "labelled_columns")
+    assert (second.amount, second.rule) == (7000.0, "pipe_columns")
+    assert first.confidence >= engine.min_confidence
+
+
+def test_free_form_salary_line_with_thousands_separator():
+    match = SalaryRuleEngine().confident_match("10/01 SALARY CREDIT ACME LLC 12,500.50 AED\n12/01 ATM -500 AED")
+    assert match.amount == 12500.50
+    assert match.rule == "salary_line"
+
+
+def test_no_salary_line_falls_back_to_llm():
+    engine = SalaryRuleEngine()
+    assert engine.match(APP_003) is None
+    assert engine.confident_match(APP_003) is None
+
+
+def test_weak_or_conflicting_matches_are_not_confident():
+    engine = SalaryRuleEngine()
+    weak = engine.match("Salary for October was 4200")
+    assert weak.rule == "salary_keyword"
+    assert engine.confident_match("Salary for October was 4200") is None
+
+    conflicting = "Salary Deposit | 7000 AED\nSalary Deposit | 7500 AED"
+    assert engine.match(conflicting).amount == 7500.0
+    assert engine.confident_match(conflicting) is None
+
+
+def test_record_counts_sources_per_path():
+    engine = SalaryRuleEngine()
+    engine.record([
+        {"cache": "miss", "field_sources": {"reported_income": {"path": "rule"}}},
+        {"cache": "miss", "field_sources": {"reported_income": {"path": "llm"}}},
+        {"cache": "disk", "field_sources": {"reported_income": {"path": "llm"}}},
+        {"cache": "miss"},
+    ])
+    assert engine.stats() == {"rule": 1, "llm": 1, "cache": 1}
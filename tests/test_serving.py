@@ -0,0 +1,63 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from backend.serving import WorkerState, memory_usage
+
+
+async def _ok():
+    pass
+
+
+async def _broken():
+    raise RuntimeError("tesseract is not installed")
+
+
+def test_memory_usage_reports_this_process():
+    usage = memory_usage()
+    assert usage["rss_bytes"] > 10 * 1024 * 1024
+    if usage["pss_bytes"] is not None:
+        assert usage["pss_bytes"] <= usage["rss_bytes"]
+        assert usage["shared_bytes"] + usage["private_bytes"] == usage["rss_bytes"]
+
+
+def test_only_required_warmup_steps_gate_readiness(tmp_path):
+    state = WorkerState(tmp_path, required=["model"])
+    assert not state.readiness()["ready"]
+    assert asyncio.run(state.warm_up({"model": _ok, "ocr": _broken}))
+    assert state.warmup["ocr"]["error"] == "RuntimeError: tesseract is not installed"
+    assert "error" not in state.warmup["model"]
+
+    strict = WorkerState(tmp_path / "strict", required=["model", "ocr"])
+    assert not asyncio.run(strict.warm_up({"model": _ok, "ocr": _broken}))
+    assert not strict.readiness()["ready"]
+
+
+def test_ready_waits_for_every_worker_of_the_group(tmp_path):
+    sibling = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        state = WorkerState(tmp_path, expected=2, group="g1", required=["model"])
+        asyncio.run(state.warm_up({"model": _ok}))
+        report = state.readiness()
+        assert (report["ready"], report["ready_workers"]) == (False, 1)
+
+        def write(pid, group, ready):
+            (tmp_path / f"worker-{pid}.json").write_text(json.dumps({"pid": pid, "group": group, "ready": ready, "memory": {}}))
+
+        write(sibling.pid, "g2", True)
+        assert not state.readiness()["ready"]
+        write(sibling.pid, "g1", False)
+        assert not state.readiness()["ready"]
+        write(sibling.pid, "g1", True)
+        report = state.readiness()
+        assert report["ready"] and [w["pid"] for w in report["workers"]] == [os.getpid(), sibling.pid]
+    finally:
+        sibling.kill()
+        sibling.wait()
+    # A worker that has exited no longer counts, and its file is cleaned up.
+    assert not state.readiness()["ready"]
+    assert not (tmp_path / f"worker-{sibling.pid}.json").exists()
+    state.discard()
+    assert list(tmp_path.iterdir()) == []
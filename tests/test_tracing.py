@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend import tracing
+from backend.executors import StageExecutor
+from backend.tracing import SlowRequestLog, metrics, span, stage_errors, stage_seconds, start_trace
+
+
+def parse_document(name):
+    """Runs in an executor worker (thread or spawned process)."""
+    with span("test.parse", doc=name):
+        time.sleep(0.01)
+    return name.upper()
+
+
+def failing_document(name):
+    with span("test.failing"):
+        raise ValueError(f"cannot parse {name}")
+
+
+def test_spans_are_timed_counted_and_attached_to_the_trace():
+    before = stage_seconds.count(stage="test.unit")
+    with start_trace("POST /predict", app_id="app_1") as trace:
+        with span("test.unit", kind="pdf") as s:
+            s.set(pages=2)
+        with pytest.raises(KeyError):
+            with span("test.unit"):
+                raise KeyError("boom")
+        with span("test.handled") as s:
+            s.fail(OSError("tesseract missing"))
+
+    assert stage_seconds.count(stage="test.unit") == before + 2
+    assert stage_errors.value(stage="test.unit", error="KeyError") >= 1
+    assert stage_errors.value(stage="test.handled", error="OSError") >= 1
+    assert [(s["name"], s.get("error")) for s in trace.spans] == [("test.unit", None), ("test.unit", "KeyError"), ("test.handled", "OSError")]
+    assert trace.spans[0]["attrs"] == {"kind": "pdf", "pages": 2}
+    assert tracing.current_trace() is None
+
+
+def test_copied_context_carries_the_trace_into_document_threads():
+    with start_trace("extract") as trace:
+        with ThreadPoolExecutor(2) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, parse_document, n) for n in ["a", "b"]]
+            assert [f.result() for f in futures] == ["A", "B"]
+    assert sorted(s["attrs"]["doc"] for s in trace.spans) == ["a", "b"]
+
+
+@pytest.mark.parametrize("kind", ["inline", "thread", "process"])
+def test_executor_spans_are_merged_into_the_request_and_counted_once(kind):
+    stage = StageExecutor(f"test-{kind}", kind, 1)
+
+    async def request():
+        with start_trace("POST /predict", app_id="app_2") as trace:
+            result = await stage.run(parse_document, "doc")
+            with pytest.raises(ValueError, match="cannot parse bad"):
+                await stage.run(failing_document, "bad")
+        return result, trace
+
+    before = stage_seconds.count(stage="test.parse")
+    errors_before = stage_errors.value(stage="test.failing", error="ValueError")
+    try:
+        result, trace = asyncio.run(request())
+    finally:
+        stage.shutdown()
+
+    assert result == "DOC"
+    assert [(s["name"], s.get("error")) for s in trace.spans] == [("test.parse", None), ("test.failing", "ValueError")]
+    assert trace.spans[0]["ms"] >= 10
+    assert stage_seconds.count(stage="test.parse") == before + 1
+    assert stage_errors.value(stage="test.failing", error="ValueError") == errors_before + 1
+
+
+def test_prometheus_text_format():
+    text = metrics.render()
+    assert "# TYPE stage_duration_seconds histogram" in text
+    assert 'stage_duration_seconds_bucket{stage="test.unit",le="+Inf"}' in text
+    assert 'stage_duration_seconds_count{stage="test.unit"}' in text
+    assert "# TYPE stage_errors_total counter" in text
+    assert 'executor_queue_depth{stage="extraction"} 0' in text
+    assert 'executor_max_workers{stage="llm"}' in text
+    for line in text.splitlines():
+        assert line.startswith("#") or len(line.rsplit(" ", 1)) == 2
+
+
+def test_slow_request_log_keeps_the_stage_breakdown(tmp_path, capsys):
+    log = SlowRequestLog(threshold_ms=100, path=str(tmp_path / "slow.jsonl"), keep=5)
+    with start_trace("POST /predict", app_id="app_3") as trace:
+        trace.add({"name": "ocr", "ms": 900.0})
+        trace.add({"name": "pdf.text", "ms": 40.0})
+        trace.add({"name": "ocr", "ms": 300.0})
+    assert log.maybe_record(trace, 50) is None
+    entry = log.maybe_record(trace, 1300, status=200)
+
+    assert entry["app_id"] == "app_3"
+    assert entry["stages"] == {"ocr": 1200.0, "pdf.text": 40.0}
+    assert json.loads((tmp_path / "slow.jsonl").read_text())["stages"] == entry["stages"]
+    assert log.recent() == [entry]
+    assert "[SLOW] POST /predict app_id=app_3 1300 ms: ocr 1200 ms, pdf.text 40 ms" in capsys.readouterr().out
+
+
+def test_span_overhead_is_small_enough_to_leave_on():
+    n = 20000
+    with start_trace("overhead"):
+        start = time.perf_counter()
+        for _ in range(n):
+            with span("test.overhead"):
+                pass
+        per_span = (time.perf_counter() - start) / n
+        # Traces cap their span list, so a hot loop cannot grow memory without bound.
+        assert len(tracing.current_trace().spans) == tracing.TRACE_MAX_SPANS
+    assert per_span < 50e-6
@@ -0,0 +1,100 @@
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import pytest
+
+from backend.application_store import ApplicationStore
+from backend.model_registry import ModelRegistry
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "train_eligibility_model.py"
+sys.path.insert(0, str(SCRIPT.parent))
+spec = importlib.util.spec_from_file_location("train_eligibility_model", SCRIPT)
+train = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(train)
+
+
+def _main(tmp_path, **kwargs):
+    options = dict(
+        rows=600, n_jobs=1, repeat=20, batch_size=200,
+        model_path=str(tmp_path / "models" / "m.joblib"), compiled_path=str(tmp_path / "models" / "m_compiled"),
+        registry_dir=str(tmp_path / "registry"), csv_path=str(tmp_path / "synthetic.csv"),
+    )
+    options.update(kwargs)
+    return train.main(**options)
+
+
+def test_synthetic_rows_are_configurable_and_reproducible():
+    a, b = train.synthetic_dataset(300, seed=7), train.synthetic_dataset(300, seed=7)
+    assert len(a) == 300 and a.equals(b)
+    assert set(a["label"]) <= {"approve", "soft-decline", "reject"}
+
+
+def test_synthetic_rows_are_saved_to_csv_and_can_be_trained_on_again(tmp_path):
+    # The defaults reproduce the committed Synthetic_data.csv.
+    committed = pd.read_csv(SCRIPT.parents[1] / "Synthetic_data.csv")
+    pd.testing.assert_frame_equal(train.synthetic_dataset(2000, seed=42), committed, check_dtype=False)
+
+    csv_path = str(tmp_path / "rows.csv")
+    written = train.load_dataset("synthetic", rows=300, seed=7, csv_path=csv_path)
+    pd.testing.assert_frame_equal(train.load_dataset("csv", rows=0, csv_path=csv_path), written, check_dtype=False)
+    assert len(train.load_dataset("csv", rows=100, csv_path=csv_path)) == 100
+    pd.DataFrame({"age": [30]}).to_csv(tmp_path / "bad.csv", index=False)
+    with pytest.raises(ValueError):
+        train.load_dataset("csv", csv_path=str(tmp_path / "bad.csv"))
+
+
+def test_sweep_writes_report_next_to_model_and_registers_choice(tmp_path):
+    report = _main(tmp_path, trees=[5, 20], depths=[3, None])
+
+    assert len(report["sweep"]) == 4
+    for candidate in report["sweep"]:
+        assert candidate["joblib_bytes"] > 0 and candidate["compiled_bytes"] > 0
+        assert {"p50", "p95", "p99"} <= set(candidate["latency"]["single_row_ms"])
+        assert candidate["latency"]["batch_200_ms"]["rows_per_s"] > 0
+    assert json.loads((tmp_path / "models" / "m.report.json").read_text()) == report
+
+    chosen = report["chosen"]
+    model = joblib.load(tmp_path / "models" / "m.joblib")
+    classifier = model.named_steps["classifier"]
+    assert (classifier.n_estimators, classifier.max_depth) == (chosen["n_estimators"], chosen["max_depth"])
+    # Fitted in parallel, but saved to score each request on one thread.
+    assert classifier.n_jobs is None
+
+    registry = ModelRegistry(tmp_path / "registry")
+    metrics = registry.versions()[0]["metrics"]
+    assert metrics["macro_f1"] == chosen["metrics"]["macro_f1"]
+    assert metrics["single_row_p99_ms"] == chosen["latency"]["single_row_ms"]["p99"]
+
+
+def test_budget_excludes_slow_forests():
+    fast = {"n_estimators": 5, "joblib_bytes": 10, "metrics": {"macro_f1": 0.8}, "latency": {"single_row_ms": {"p99": 0.2}}}
+    slow = {"n_estimators": 500, "joblib_bytes": 1000, "metrics": {"macro_f1": 0.9}, "latency": {"single_row_ms": {"p99": 5.0}}}
+    assert train.choose([fast, slow]) is slow
+    assert train.choose([fast, slow], p99_budget_ms=1.0) is fast
+    assert train.choose([fast, slow], p99_budget_ms=0.01) is fast
+
+
+def test_trains_from_saved_applications(tmp_path):
+    store = ApplicationStore(str(tmp_path / "apps.db"))
+    frame = train.synthetic_dataset(200, seed=3)
+    store.save_many([
+        {"app_id": f"app_{i}", "decision": "approve", "application": {
+            "reported_income": row.monthly_income, "family_size": int(row.family_size), "age": int(row.age),
+            "employment_status": row.employment_status, "assets": row.assets, "liabilities": row.liabilities,
+            "credit_score": row.credit_score,
+        }}
+        for i, row in enumerate(frame.itertuples())
+    ])
+
+    df = train.load_dataset("applications", rows=0, db_path=str(tmp_path / "apps.db"))
+    assert len(df) == 200
+    assert list(df["label"]) == list(frame["label"])
+    assert set(train.load_dataset("applications", rows=50, db_path=str(tmp_path / "apps.db"), label_source="decision")["label"]) == {"approve"}
+
+    report = _main(tmp_path, source="applications", rows=0, db_path=str(tmp_path / "apps.db"), trees=[5], register=False)
+    assert report["data"] == {"source": "applications", "rows": 200, "train_rows": 160, "test_rows": 40, "seed": 42}
+    assert not (tmp_path / "registry").exists()
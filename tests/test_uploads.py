@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from backend.uploads import UploadSessions, UploadTooLarge, safe_filename, upload_digest, write_upload
+
+
+class _StreamingUpload:
+    """Stands in for UploadFile; produces `size` bytes on demand without holding them."""
+
+    def __init__(self, filename, size, block=b"0123456789abcdef"):
+        self.filename = filename
+        self.size = self.remaining = size
+        self.block = block
+
+    async def read(self, n=-1):
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        self.remaining -= n
+        return (self.block * (n // len(self.block) + 1))[:n]
+
+    async def seek(self, offset):
+        self.remaining = self.size - offset
+
+
+def _expected_sha256(size, block=b"0123456789abcdef", chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    while size:
+        n = min(chunk_size, size)
+        digest.update((block * (n // len(block) + 1))[:n])
+        size -= n
+    return digest.hexdigest()
+
+
+def test_write_upload_hashes_in_one_pass_with_constant_memory(tmp_path):
+    size = 48 * 1024 * 1024 + 123
+    tracemalloc.start()
+    saved = asyncio.run(write_upload(_StreamingUpload("statement.pdf", size), tmp_path, chunk_size=1024 * 1024, max_bytes=size))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert saved["size"] == size == os.path.getsize(saved["path"])
+    assert saved["sha256"] == _expected_sha256(size)
+    # A couple of 1 MiB chunks in flight, never the whole 48 MiB file.
+    assert peak < 4 * 1024 * 1024
+
+
+def test_write_upload_enforces_cap_and_removes_partial_file(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(write_upload(_StreamingUpload("big.pdf", 5000), tmp_path, chunk_size=1024, max_bytes=4096))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_digest_reads_in_place_and_rewinds(tmp_path):
+    upload = _StreamingUpload("statement.pdf", 3000)
+    digest = asyncio.run(upload_digest(upload, chunk_size=1024))
+    assert digest == _expected_sha256(3000)
+    assert list(tmp_path.iterdir()) == []
+    assert asyncio.run(write_upload(upload, tmp_path))["sha256"] == digest
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(upload_digest(_StreamingUpload("big.pdf", 5000), chunk_size=1024, max_bytes=4096))
+
+
+def test_same_filename_twice_in_one_request_does_not_overwrite(tmp_path):
+    first = asyncio.run(write_upload(_StreamingUpload("resume.pdf", 10), tmp_path))
+    second = asyncio.run(write_upload(_StreamingUpload("resume.pdf", 20), tmp_path))
+    assert (first["filename"], second["filename"]) == ("resume.pdf", "resume_1.pdf")
+    assert safe_filename("../../etc/passwd") == "passwd"
+    assert safe_filename("") == "upload"
+
+
+def test_sessions_are_isolated_renewed_and_expire(tmp_path):
+    sessions = UploadSessions(tmp_path, ttl=60)
+    a, b = sessions.create(), sessions.create()
+    asyncio.run(sessions.add_files(a, [_StreamingUpload("resume.pdf", 10)]))
+    asyncio.run(sessions.add_files(b, [_StreamingUpload("resume.pdf", 20)]))
+
+    manifest = sessions.get(a)
+    assert [f["size"] for f in manifest["files"]] == [10]
+    assert [f["size"] for f in sessions.get(b)["files"]] == [20]
+    assert manifest["files"][0]["sha256"] == _expected_sha256(10)
+
+    # Age session a past the TTL: it stops resolving and the sweep deletes it.
+    old = time.time() - 120
+    os.utime(tmp_path / a / "session.json", (old, old))
+    assert sessions.get(a) is None
+    assert sessions.sweep() == 1
+    assert not (tmp_path / a).exists()
+    assert sessions.get(b) is not None
+
+    with pytest.raises(KeyError):
+        sessions.get("../../etc")
+
+
+def test_request_cap_spans_all_files(tmp_path):
+    sessions = UploadSessions(tmp_path)
+    session_id = sessions.create()
+    uploads = [_StreamingUpload("a.pdf", 600), _StreamingUpload("b.pdf", 600)]
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(sessions.add_files(session_id, uploads, max_request_bytes=1000))